@@ -0,0 +1,250 @@
+"""branches and per-branch partitioning
+
+Agrega la tabla branches con la sucursal por defecto (id 1), la columna
+branch_id en todas las tablas del negocio y, en PostgreSQL, convierte
+orders y order_items en tablas particionadas por LIST (branch_id).
+
+Como PostgreSQL exige que la clave primaria de una tabla particionada
+incluya la clave de partición, la PK real pasa a ser (id, branch_id) y
+las FKs hacia orders pasan a ser compuestas.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 15:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BRANCH_TABLES = ('users', 'tables', 'products', 'payments')
+ROLLUP_TABLES = {
+    'sales_hourly_product': ['bucket', 'product_id'],
+    'sales_daily_category': ['day', 'category'],
+}
+
+# Para poder referirse por nombre a las constraints sin nombre que SQLite refleja
+NAMING_CONVENTION = {"uq": "uq_%(table_name)s_%(column_0_name)s"}
+
+ORDER_COLUMNS = [
+    'id', 'table_id', 'user_id', 'created_at', 'updated_at', 'status',
+    'total_amount', 'payment_status', 'notes', 'client_ref',
+]
+ORDER_ITEM_COLUMNS = [
+    'id', 'order_id', 'product_id', 'quantity', 'unit_price', 'notes', 'created_at',
+]
+
+
+def _orders_ddl(partitioned: bool) -> str:
+    keys = "PRIMARY KEY (id, branch_id), UNIQUE (client_ref, branch_id)" if partitioned \
+        else "PRIMARY KEY (id), UNIQUE (client_ref)"
+    return f"""
+        CREATE TABLE orders (
+            id integer NOT NULL DEFAULT nextval('orders_id_seq'),
+            {"branch_id integer NOT NULL DEFAULT 1 REFERENCES branches (id)," if partitioned else ""}
+            table_id integer REFERENCES tables (id),
+            user_id integer REFERENCES users (id),
+            created_at timestamp without time zone,
+            updated_at timestamp without time zone,
+            status orderstatus,
+            total_amount numeric(10, 2),
+            payment_status paymentstatus,
+            notes text,
+            client_ref varchar(64),
+            {keys}
+        ) {"PARTITION BY LIST (branch_id)" if partitioned else ""}
+    """
+
+
+def _order_items_ddl(partitioned: bool) -> str:
+    if partitioned:
+        keys = """PRIMARY KEY (id, branch_id),
+            FOREIGN KEY (order_id, branch_id) REFERENCES orders (id, branch_id) ON DELETE CASCADE"""
+    else:
+        keys = """PRIMARY KEY (id),
+            FOREIGN KEY (order_id) REFERENCES orders (id) ON DELETE CASCADE"""
+    return f"""
+        CREATE TABLE order_items (
+            id integer NOT NULL DEFAULT nextval('order_items_id_seq'),
+            {"branch_id integer NOT NULL DEFAULT 1 REFERENCES branches (id)," if partitioned else ""}
+            order_id integer,
+            product_id integer REFERENCES products (id),
+            quantity integer NOT NULL,
+            unit_price numeric(10, 2) NOT NULL,
+            notes text,
+            created_at timestamp without time zone,
+            {keys}
+        ) {"PARTITION BY LIST (branch_id)" if partitioned else ""}
+    """
+
+
+def _rebuild(table: str, ddl: str, columns, partitioned: bool, indexes) -> None:
+    """Recrea la tabla con el nuevo DDL y copia los datos de la anterior."""
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+    op.execute(f"ALTER TABLE {table}_legacy RENAME CONSTRAINT {table}_pkey TO {table}_legacy_pkey")
+    for index in indexes:
+        op.execute(f"DROP INDEX IF EXISTS {index}")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+
+    op.execute(ddl)
+    if partitioned:
+        op.execute(f"CREATE TABLE {table}_b1 PARTITION OF {table} FOR VALUES IN (1)")
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    column_list = ", ".join(columns)
+    if partitioned:
+        op.execute(
+            f"INSERT INTO {table} ({column_list}, branch_id) "
+            f"SELECT {column_list}, 1 FROM {table}_legacy"
+        )
+    else:
+        op.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {table}_legacy")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+
+def _partition_orders(partitioned: bool) -> None:
+    # Las FKs hacia orders se recrean después de reconstruir la tabla
+    op.execute("ALTER TABLE payments DROP CONSTRAINT IF EXISTS payments_order_id_fkey")
+    op.execute("ALTER TABLE payments DROP CONSTRAINT IF EXISTS payments_order_id_branch_id_fkey")
+    op.execute("ALTER TABLE order_items DROP CONSTRAINT IF EXISTS order_items_order_id_fkey")
+    op.execute("ALTER TABLE order_items DROP CONSTRAINT IF EXISTS order_items_order_id_branch_id_fkey")
+    op.execute("ALTER TABLE orders DROP CONSTRAINT IF EXISTS orders_client_ref_key")
+    op.execute("ALTER TABLE orders DROP CONSTRAINT IF EXISTS orders_client_ref_branch_id_key")
+
+    _rebuild('orders', _orders_ddl(partitioned), ORDER_COLUMNS, partitioned,
+             ['ix_orders_updated_at', 'ix_orders_branch_id'])
+    _rebuild('order_items', _order_items_ddl(partitioned), ORDER_ITEM_COLUMNS, partitioned,
+             ['ix_order_items_branch_id'])
+    op.execute("DROP TABLE order_items_legacy")
+    op.execute("DROP TABLE orders_legacy")
+
+    op.create_index('ix_orders_updated_at', 'orders', ['updated_at'])
+    if partitioned:
+        op.create_index('ix_orders_branch_id', 'orders', ['branch_id'])
+        op.create_index('ix_order_items_branch_id', 'order_items', ['branch_id'])
+        op.execute(
+            "ALTER TABLE payments ADD CONSTRAINT payments_order_id_branch_id_fkey "
+            "FOREIGN KEY (order_id, branch_id) REFERENCES orders (id, branch_id)"
+        )
+    else:
+        op.execute(
+            "ALTER TABLE payments ADD CONSTRAINT payments_order_id_fkey "
+            "FOREIGN KEY (order_id) REFERENCES orders (id)"
+        )
+
+
+def _rollup_columns(table: str):
+    if table == 'sales_hourly_product':
+        keys = [
+            sa.Column('bucket', sa.DateTime(), nullable=False),
+            sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id'), nullable=False),
+        ]
+    else:
+        keys = [
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('category', sa.String(length=50), nullable=False),
+        ]
+    return keys + [
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.DECIMAL(precision=12, scale=2), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+    ]
+
+
+def _alter_rollup(table: str, keys, with_branch: bool, is_postgres: bool) -> None:
+    """Agrega o quita branch_id de la clave primaria de una tabla de agregados."""
+    primary_key = ['branch_id', *keys] if with_branch else list(keys)
+    if not is_postgres:
+        # SQLite no permite cambiar la PK: se recrea la tabla y los agregados
+        # se reconstruyen con python -m app.reports.rollups
+        op.drop_table(table)
+        branch = [sa.Column('branch_id', sa.Integer(), sa.ForeignKey('branches.id'), nullable=False)] \
+            if with_branch else []
+        op.create_table(table, *branch, *_rollup_columns(table),
+                        sa.PrimaryKeyConstraint(*primary_key, name=f'{table}_pkey'))
+        return
+
+    if with_branch:
+        op.add_column(table, sa.Column('branch_id', sa.Integer(), nullable=False, server_default='1'))
+        op.create_foreign_key(f'fk_{table}_branch_id', table, 'branches', ['branch_id'], ['id'])
+    op.drop_constraint(f'{table}_pkey', table, type_='primary')
+    if not with_branch:
+        op.drop_constraint(f'fk_{table}_branch_id', table, type_='foreignkey')
+        op.drop_column(table, 'branch_id')
+    op.create_primary_key(f'{table}_pkey', table, primary_key)
+
+
+def upgrade() -> None:
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+
+    op.create_table('branches',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.execute(
+        "INSERT INTO branches (id, name, is_active, created_at) "
+        "VALUES (1, 'Principal', true, CURRENT_TIMESTAMP)"
+    )
+    if is_postgres:
+        op.execute("SELECT setval(pg_get_serial_sequence('branches', 'id'), 1)")
+
+    for table in BRANCH_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('branch_id', sa.Integer(), nullable=False, server_default='1'))
+            batch_op.create_foreign_key(f'fk_{table}_branch_id', 'branches', ['branch_id'], ['id'])
+            batch_op.create_index(f'ix_{table}_branch_id', ['branch_id'])
+
+    for table, keys in ROLLUP_TABLES.items():
+        _alter_rollup(table, keys, with_branch=True, is_postgres=is_postgres)
+
+    if is_postgres:
+        _partition_orders(partitioned=True)
+    else:
+        for table in ('orders', 'order_items'):
+            with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+                batch_op.add_column(sa.Column('branch_id', sa.Integer(), nullable=False, server_default='1'))
+                batch_op.create_foreign_key(f'fk_{table}_branch_id', 'branches', ['branch_id'], ['id'])
+                batch_op.create_index(f'ix_{table}_branch_id', ['branch_id'])
+                if table == 'orders':
+                    batch_op.drop_constraint('uq_orders_client_ref', type_='unique')
+                    batch_op.create_unique_constraint('uq_orders_client_ref_branch_id', ['client_ref', 'branch_id'])
+
+
+def downgrade() -> None:
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+
+    if is_postgres:
+        # Las particiones se borran junto con la tabla padre al reconstruir
+        _partition_orders(partitioned=False)
+    else:
+        for table in ('order_items', 'orders'):
+            with op.batch_alter_table(table) as batch_op:
+                if table == 'orders':
+                    batch_op.drop_constraint('uq_orders_client_ref_branch_id', type_='unique')
+                    batch_op.create_unique_constraint('uq_orders_client_ref', ['client_ref'])
+                batch_op.drop_index(f'ix_{table}_branch_id')
+                batch_op.drop_constraint(f'fk_{table}_branch_id', type_='foreignkey')
+                batch_op.drop_column('branch_id')
+
+    for table, keys in ROLLUP_TABLES.items():
+        _alter_rollup(table, keys, with_branch=False, is_postgres=is_postgres)
+
+    for table in reversed(BRANCH_TABLES):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_index(f'ix_{table}_branch_id')
+            batch_op.drop_constraint(f'fk_{table}_branch_id', type_='foreignkey')
+            batch_op.drop_column('branch_id')
+
+    op.drop_table('branches')
@@ -0,0 +1,234 @@
+"""monthly order partitions and archive tables
+
+En PostgreSQL cada partición de sucursal de orders y order_items pasa a
+estar subparticionada por RANGE (created_at) en meses, y se crean
+orders_archive y order_items_archive con la misma forma para recibir los
+meses archivados (python -m app.maintenance archive).
+
+La clave primaria real pasa a ser (id, branch_id, created_at). Se quitan
+las FKs de base de datos desde order_items y payments hacia orders: una FK
+hacia una tabla particionada impide hacer DETACH de sus particiones, y la
+integridad ya la garantiza el ORM. Los items toman el created_at de su
+orden para quedar siempre en el mismo mes.
+
+En otros motores solo se crean las tablas de archivo.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 18:05:00.000000
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+ORDER_COLUMNS = [
+    'id', 'branch_id', 'table_id', 'user_id', 'created_at', 'updated_at', 'status',
+    'total_amount', 'payment_status', 'notes', 'client_ref',
+]
+ORDER_ITEM_COLUMNS = [
+    'id', 'branch_id', 'order_id', 'product_id', 'quantity', 'unit_price', 'notes', 'created_at',
+]
+INDEXES = {
+    'orders': [('ix_orders_updated_at', 'updated_at'), ('ix_orders_branch_id', 'branch_id')],
+    'order_items': [('ix_order_items_branch_id', 'branch_id')],
+}
+
+
+def _orders_ddl(monthly: bool) -> str:
+    # Con particiones mensuales la clave única tiene que incluir created_at, así
+    # que deja de impedir un client_ref repetido: eso lo garantiza
+    # order_client_refs (0010)
+    keys = "PRIMARY KEY (id, branch_id, created_at), UNIQUE (client_ref, branch_id, created_at)" if monthly \
+        else "PRIMARY KEY (id, branch_id), UNIQUE (client_ref, branch_id)"
+    return f"""
+        CREATE TABLE orders (
+            id integer NOT NULL DEFAULT nextval('orders_id_seq'),
+            branch_id integer NOT NULL DEFAULT 1 REFERENCES branches (id),
+            table_id integer REFERENCES tables (id),
+            user_id integer REFERENCES users (id),
+            created_at timestamp without time zone {"NOT NULL" if monthly else ""},
+            updated_at timestamp without time zone,
+            status orderstatus,
+            total_amount numeric(10, 2),
+            payment_status paymentstatus,
+            notes text,
+            client_ref varchar(64),
+            {keys}
+        ) PARTITION BY LIST (branch_id)
+    """
+
+
+def _order_items_ddl(monthly: bool) -> str:
+    if monthly:
+        keys = "PRIMARY KEY (id, branch_id, created_at)"
+    else:
+        keys = """PRIMARY KEY (id, branch_id),
+            FOREIGN KEY (order_id, branch_id) REFERENCES orders (id, branch_id) ON DELETE CASCADE"""
+    return f"""
+        CREATE TABLE order_items (
+            id integer NOT NULL DEFAULT nextval('order_items_id_seq'),
+            branch_id integer NOT NULL DEFAULT 1 REFERENCES branches (id),
+            order_id integer,
+            product_id integer REFERENCES products (id),
+            quantity integer NOT NULL,
+            unit_price numeric(10, 2) NOT NULL,
+            notes text,
+            created_at timestamp without time zone {"NOT NULL" if monthly else ""},
+            {keys}
+        ) PARTITION BY LIST (branch_id)
+    """
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _rename_legacy(table: str) -> None:
+    """Renombra la tabla, sus particiones y sus índices con sufijo _legacy."""
+    conn = op.get_bind()
+    relations = conn.execute(sa.text(
+        "SELECT relid::regclass::text FROM pg_partition_tree(:table)"
+    ), {"table": table}).scalars().all()
+    for relation in relations:
+        indexes = conn.execute(sa.text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = :relation"
+        ), {"relation": relation}).scalars().all()
+        op.execute(f"ALTER TABLE {relation} RENAME TO {relation}_legacy")
+        for index in indexes:
+            op.execute(f"ALTER INDEX {index} RENAME TO {index}_legacy")
+
+
+def _create_partitions(table: str, monthly: bool, first_month: date) -> None:
+    branch_ids = op.get_bind().execute(sa.text("SELECT id FROM branches ORDER BY id")).scalars().all()
+    last_month = _add_months(date.today().replace(day=1), MONTHS_AHEAD)
+    for branch_id in branch_ids:
+        parent = f"{table}_b{branch_id}"
+        op.execute(
+            f"CREATE TABLE {parent} PARTITION OF {table} FOR VALUES IN ({branch_id})"
+            + (" PARTITION BY RANGE (created_at)" if monthly else "")
+        )
+        if not monthly:
+            continue
+        op.execute(f"CREATE TABLE {parent}_default PARTITION OF {parent} DEFAULT")
+        month = first_month
+        while month <= last_month:
+            op.execute(
+                f"CREATE TABLE {parent}_{month:%Y%m} PARTITION OF {parent} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+            )
+            month = _add_months(month, 1)
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+
+def _repartition(monthly: bool) -> None:
+    conn = op.get_bind()
+    op.execute("ALTER TABLE payments DROP CONSTRAINT IF EXISTS payments_order_id_branch_id_fkey")
+    op.execute("ALTER TABLE order_items DROP CONSTRAINT IF EXISTS order_items_order_id_branch_id_fkey")
+
+    oldest = conn.execute(sa.text("SELECT min(created_at) FROM orders")).scalar() or datetime.utcnow()
+    first_month = date(oldest.year, oldest.month, 1)
+
+    for table, ddl in (('orders', _orders_ddl(monthly)), ('order_items', _order_items_ddl(monthly))):
+        _rename_legacy(table)
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+        op.execute(ddl)
+        _create_partitions(table, monthly, first_month)
+
+    columns = ", ".join(ORDER_COLUMNS)
+    created_at = "coalesce(created_at, updated_at, now())" if monthly else "created_at"
+    op.execute(
+        f"INSERT INTO orders ({columns}) "
+        f"SELECT {columns.replace('created_at', created_at)} FROM orders_legacy"
+    )
+    item_columns = ", ".join(ORDER_ITEM_COLUMNS)
+    if monthly:
+        # Cada item queda en el mismo mes que su orden
+        selected = ", ".join(f"i.{c}" for c in ORDER_ITEM_COLUMNS[:-1]) + ", o.created_at"
+        op.execute(
+            f"INSERT INTO order_items ({item_columns}) SELECT {selected} "
+            "FROM order_items_legacy i "
+            "JOIN orders o ON o.id = i.order_id AND o.branch_id = i.branch_id"
+        )
+    else:
+        op.execute(f"INSERT INTO order_items ({item_columns}) SELECT {item_columns} FROM order_items_legacy")
+
+    op.execute("DROP TABLE order_items_legacy")
+    op.execute("DROP TABLE orders_legacy")
+    for table, indexes in INDEXES.items():
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+        for name, column in indexes:
+            op.create_index(name, table, [column])
+
+    if not monthly:
+        op.execute(
+            "ALTER TABLE payments ADD CONSTRAINT payments_order_id_branch_id_fkey "
+            "FOREIGN KEY (order_id, branch_id) REFERENCES orders (id, branch_id)"
+        )
+
+
+def _archive_columns(table: str):
+    if table == 'orders_archive':
+        return [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('branch_id', sa.Integer(), nullable=True),
+            sa.Column('table_id', sa.Integer(), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.Column('status', sa.Enum('PENDING', 'IN_PREPARATION', 'READY', 'DELIVERED', 'CANCELLED', name='orderstatus'), nullable=True),
+            sa.Column('total_amount', sa.DECIMAL(precision=10, scale=2), nullable=True),
+            sa.Column('payment_status', sa.Enum('PENDING', 'COMPLETED', 'FAILED', 'REFUNDED', name='paymentstatus'), nullable=True),
+            sa.Column('notes', sa.Text(), nullable=True),
+            sa.Column('client_ref', sa.String(length=64), nullable=True),
+        ]
+    return [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('branch_id', sa.Integer(), nullable=True),
+        sa.Column('order_id', sa.Integer(), nullable=True),
+        sa.Column('product_id', sa.Integer(), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=True),
+        sa.Column('unit_price', sa.DECIMAL(precision=10, scale=2), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    ]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        _repartition(monthly=True)
+        for table in ('orders', 'order_items'):
+            op.execute(f"CREATE TABLE {table}_archive (LIKE {table}) PARTITION BY LIST (branch_id)")
+            op.create_index(f'ix_{table}_archive_created_at', f'{table}_archive', ['created_at'])
+        return
+
+    for table in ('orders_archive', 'order_items_archive'):
+        op.create_table(table, *_archive_columns(table), sa.PrimaryKeyConstraint('id'))
+        op.create_index(op.f(f'ix_{table}_created_at'), table, ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    # Lo archivado vuelve a las tablas vivas antes de borrar el archivo
+    for table, columns in (('orders', ORDER_COLUMNS), ('order_items', ORDER_ITEM_COLUMNS)):
+        column_list = ", ".join(columns)
+        op.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {table}_archive")
+
+    for table in ('order_items_archive', 'orders_archive'):
+        op.drop_index(f'ix_{table}_created_at', table_name=table)
+        op.drop_table(table)
+
+    if is_postgres:
+        _repartition(monthly=False)
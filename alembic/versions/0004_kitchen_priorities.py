@@ -0,0 +1,33 @@
+"""kitchen priorities: takeaway orders and VIP tables
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 19:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tables', sa.Column('is_vip', sa.Boolean(), nullable=True, server_default=sa.false()))
+    # orders_archive debe tener las mismas columnas para poder adjuntarle particiones
+    for table in ('orders', 'orders_archive'):
+        op.add_column(table, sa.Column('is_takeaway', sa.Boolean(), nullable=True, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    for table in ('orders_archive', 'orders'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('is_takeaway')
+    with op.batch_alter_table('tables') as batch_op:
+        batch_op.drop_column('is_vip')
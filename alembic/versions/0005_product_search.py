@@ -0,0 +1,34 @@
+"""trigram indexes for product search
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 20:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_COLUMNS = ('name', 'category', 'description')
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in SEARCH_COLUMNS:
+        op.create_index(f'ix_products_{column}_trgm', 'products', [column],
+                        postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    # La extensión queda instalada: puede usarla algo más de la base
+    for column in reversed(SEARCH_COLUMNS):
+        op.drop_index(f'ix_products_{column}_trgm', table_name='products')
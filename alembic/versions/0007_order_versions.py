@@ -0,0 +1,30 @@
+"""optimistic concurrency version for orders
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 22:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('orders', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    # orders_archive debe tener las mismas columnas para poder adjuntarle particiones
+    op.add_column('orders_archive', sa.Column('version', sa.Integer(), nullable=True, server_default='1'))
+
+
+def downgrade() -> None:
+    for table in ('orders_archive', 'orders'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('version')
@@ -0,0 +1,85 @@
+"""kitchen stations and per-station tickets
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 22:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ticket_status = sa.Enum('PENDING', 'IN_PREPARATION', 'DONE', name='ticketstatus')
+
+
+def upgrade() -> None:
+    op.create_table('stations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('is_default', sa.Boolean(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['branch_id'], ['branches.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_stations_branch_id'), 'stations', ['branch_id'], unique=False)
+    op.create_table('station_categories',
+    sa.Column('branch_id', sa.Integer(), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('station_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['branch_id'], ['branches.id'], ),
+    sa.ForeignKeyConstraint(['station_id'], ['stations.id'], ),
+    sa.PrimaryKeyConstraint('branch_id', 'category')
+    )
+    op.create_index(op.f('ix_station_categories_station_id'), 'station_categories', ['station_id'], unique=False)
+    op.create_table('kitchen_tickets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('station_id', sa.Integer(), nullable=False),
+    sa.Column('status', ticket_status, nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['branch_id'], ['branches.id'], ),
+    sa.ForeignKeyConstraint(['station_id'], ['stations.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('order_id', 'station_id')
+    )
+    op.create_index(op.f('ix_kitchen_tickets_branch_id'), 'kitchen_tickets', ['branch_id'], unique=False)
+    op.create_index(op.f('ix_kitchen_tickets_order_id'), 'kitchen_tickets', ['order_id'], unique=False)
+    op.create_index(op.f('ix_kitchen_tickets_created_at'), 'kitchen_tickets', ['created_at'], unique=False)
+    op.create_index('ix_kitchen_tickets_station_id_status', 'kitchen_tickets', ['station_id', 'status'], unique=False)
+
+    with op.batch_alter_table('order_items') as batch_op:
+        batch_op.add_column(sa.Column('station_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('order_items_station_id_fkey', 'stations', ['station_id'], ['id'])
+    # order_items_archive debe tener las mismas columnas para poder adjuntarle particiones
+    op.add_column('order_items_archive', sa.Column('station_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    for table in ('order_items_archive', 'order_items'):
+        with op.batch_alter_table(table) as batch_op:
+            if table == 'order_items':
+                batch_op.drop_constraint('order_items_station_id_fkey', type_='foreignkey')
+            batch_op.drop_column('station_id')
+    op.drop_index('ix_kitchen_tickets_station_id_status', table_name='kitchen_tickets')
+    op.drop_index(op.f('ix_kitchen_tickets_created_at'), table_name='kitchen_tickets')
+    op.drop_index(op.f('ix_kitchen_tickets_order_id'), table_name='kitchen_tickets')
+    op.drop_index(op.f('ix_kitchen_tickets_branch_id'), table_name='kitchen_tickets')
+    op.drop_table('kitchen_tickets')
+    ticket_status.drop(op.get_bind(), checkfirst=True)
+    op.drop_index(op.f('ix_station_categories_station_id'), table_name='station_categories')
+    op.drop_table('station_categories')
+    op.drop_index(op.f('ix_stations_branch_id'), table_name='stations')
+    op.drop_table('stations')
@@ -0,0 +1,52 @@
+"""order search indexes and order totals
+
+Índices para /orders/search: created_at, (table_id, created_at) y
+(user_id, created_at), con el resto de las columnas filtrables en INCLUDE
+para que PostgreSQL pueda contar con index-only scans. En orders
+particionada se crean en cada partición.
+
+total_amount no se calculaba al crear la orden; se completa a partir de
+los items.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 23:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ('ix_orders_search_created_at', ['created_at'],
+     ['table_id', 'user_id', 'status', 'payment_status', 'total_amount']),
+    ('ix_orders_search_table_id', ['table_id', 'created_at'],
+     ['user_id', 'status', 'payment_status', 'total_amount']),
+    ('ix_orders_search_user_id', ['user_id', 'created_at'],
+     ['table_id', 'status', 'payment_status', 'total_amount']),
+)
+
+
+def upgrade() -> None:
+    op.execute(
+        "UPDATE orders SET total_amount = coalesce(("
+        "SELECT sum(order_items.quantity * order_items.unit_price) FROM order_items "
+        "WHERE order_items.order_id = orders.id AND order_items.branch_id = orders.branch_id"
+        "), 0)"
+    )
+    for name, columns, include in INDEXES:
+        op.create_index(name, 'orders', columns, postgresql_include=include)
+
+
+def downgrade() -> None:
+    # Los totales calculados se conservan
+    for name, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='orders')
@@ -0,0 +1,46 @@
+"""dedupe table for offline order client_refs
+
+En PostgreSQL la restricción única de orders es (client_ref, branch_id,
+created_at) por el particionado mensual, así que no evita que un reintento
+del POS cree otra orden. order_client_refs, sin particionar, guarda un
+client_ref por sucursal y es lo que /sync/orders inserta junto con la orden.
+
+Se completa con los client_ref existentes (si hay repetidos, el de la
+primera orden).
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 23:55:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('order_client_refs',
+    sa.Column('branch_id', sa.Integer(), nullable=False),
+    sa.Column('client_ref', sa.String(length=64), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['branch_id'], ['branches.id'], ),
+    sa.PrimaryKeyConstraint('branch_id', 'client_ref')
+    )
+    op.execute(
+        "INSERT INTO order_client_refs (branch_id, client_ref, order_id, created_at) "
+        "SELECT branch_id, client_ref, min(id), min(created_at) FROM orders "
+        "WHERE client_ref IS NOT NULL GROUP BY branch_id, client_ref"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('order_client_refs')
@@ -0,0 +1,36 @@
+"""explicit preparation start for orders
+
+updated_at cambia con cualquier modificación (notas, pagos), así que no
+sirve para medir el tiempo de preparación. started_at se fija cuando la
+orden pasa a en preparación; las órdenes en preparación existentes toman
+su updated_at como inicio.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-20 00:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('orders', sa.Column('started_at', sa.DateTime(), nullable=True))
+    # orders_archive debe tener las mismas columnas para poder adjuntarle particiones
+    op.add_column('orders_archive', sa.Column('started_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE orders SET started_at = updated_at WHERE status = 'IN_PREPARATION'")
+
+
+def downgrade() -> None:
+    for table in ('orders_archive', 'orders'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('started_at')
@@ -0,0 +1,53 @@
+"""unique product key per branch
+
+/products/import usa nombre + categoría como clave del producto en la
+sucursal y hace INSERT ... ON CONFLICT sobre este índice. Los duplicados
+existentes se conservan (pueden tener órdenes) pero se desactivan y se
+renombran con su id; queda el de menor id.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-20 00:25:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0012'
+down_revision: Union[str, None] = '0011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    products = sa.table(
+        'products',
+        sa.column('id', sa.Integer()),
+        sa.column('branch_id', sa.Integer()),
+        sa.column('name', sa.String()),
+        sa.column('category', sa.String()),
+        sa.column('is_active', sa.Boolean()),
+    )
+    first = (
+        sa.select(sa.func.min(products.c.id))
+        .group_by(products.c.branch_id, products.c.name, products.c.category)
+    )
+    op.execute(
+        products.update()
+        .where(products.c.id.not_in(first))
+        .values(
+            name=sa.func.substr(products.c.name, 1, 90) + ' #' + sa.cast(products.c.id, sa.String()),
+            is_active=False,
+        )
+    )
+    op.create_index('ix_products_branch_name_category', 'products',
+                    ['branch_id', 'name', 'category'], unique=True)
+
+
+def downgrade() -> None:
+    # Los duplicados renombrados se conservan
+    op.drop_index('ix_products_branch_name_category', table_name='products')
@@ -0,0 +1,229 @@
+"""Control de admisión: rechaza rápido en vez de encolar sobre el pool de la DB.
+
+- Capacidad global (ADMISSION_CAPACITY, por defecto el pool de SQLAlchemy:
+  5 + 10 de overflow). Las rutas de cocina pueden usarla completa; el resto
+  deja libres ADMISSION_KITCHEN_RESERVED lugares para que los cocineros
+  nunca queden sin atender.
+- Límite de concurrencia por ruta (ADMISSION_ROUTE_LIMITS, "POST /orders=8,...").
+  Con ORDER_INTAKE_BATCHING activado, POST /orders espera en la cola del
+  ingreso de órdenes, que escribe con una sola conexión: no ocupa capacidad
+  global y su límite por defecto es dos lotes (2 x ORDER_INTAKE_MAX_BATCH),
+  uno confirmándose y otro juntándose, para que los lotes puedan llenarse.
+- Token bucket por usuario en esas mismas rutas (ADMISSION_USER_RATE por
+  segundo, ADMISSION_USER_BURST de ráfaga). Un bucket que estuvo quieto lo
+  suficiente para volver a llenarse es igual a uno nuevo y se descarta; además
+  nunca hay más de ADMISSION_MAX_BUCKETS (se descartan los menos usados).
+
+Lo que excede responde 503 (sin capacidad) o 429 (usuario) con Retry-After.
+Todo corre en el event loop, por lo que los contadores no necesitan locks.
+"""
+import math
+import os
+import time
+from collections import Counter
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from jose import JWTError, jwt
+from starlette.responses import JSONResponse
+
+from .auth.utils import ALGORITHM, SECRET_KEY
+from .database import engine
+from .orders import intake
+
+KITCHEN_PREFIXES = ("/kitchen", "/orders/kitchen")
+
+RouteKey = Tuple[str, str]
+
+# Capacidad si el pool no informa su tamaño
+DEFAULT_CAPACITY = 15
+
+
+def pool_capacity(pool) -> int:
+    """Conexiones que puede abrir el pool de SQLAlchemy: tamaño más overflow."""
+    try:
+        return pool.size() + max(0, pool._max_overflow)
+    except AttributeError:  # Pools sin tamaño fijo (SQLite en memoria, NullPool)
+        return DEFAULT_CAPACITY
+
+
+def parse_route_limits(value: str) -> Dict[RouteKey, int]:
+    """Convierte "POST /orders=8,POST /sync/orders=4" en {("POST", "/orders"): 8, ...}."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        route, limit = entry.rsplit("=", 1)
+        method, path = route.split()
+        limits[(method.upper(), path.rstrip("/") or "/")] = int(limit)
+    return limits
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> Optional[float]:
+        """Consume un token; si no hay devuelve los segundos hasta el próximo."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return None
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        capacity: int,
+        kitchen_reserved: int,
+        route_limits: Dict[RouteKey, int],
+        user_rate: float,
+        user_burst: int,
+        max_buckets: int = 10000,
+        queued_routes: FrozenSet[RouteKey] = frozenset(),
+    ):
+        self.capacity = capacity
+        self.kitchen_reserved = kitchen_reserved
+        self.route_limits = route_limits
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_buckets = max_buckets
+        # Rutas limitadas que esperan en una cola propia sin tomar conexiones
+        # del pool: solo cuentan para su límite de ruta
+        self.queued_routes = queued_routes
+        self.reset()
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        if intake.ENABLED:
+            order_limit, queued_routes = 2 * intake.MAX_BATCH, frozenset({("POST", "/orders")})
+        else:
+            order_limit, queued_routes = 8, frozenset()
+        return cls(
+            capacity=int(os.getenv("ADMISSION_CAPACITY") or pool_capacity(engine.pool)),
+            kitchen_reserved=int(os.getenv("ADMISSION_KITCHEN_RESERVED", "3")),
+            route_limits=parse_route_limits(
+                os.getenv("ADMISSION_ROUTE_LIMITS", f"POST /orders={order_limit},POST /sync/orders=4")
+            ),
+            user_rate=float(os.getenv("ADMISSION_USER_RATE", "5")),
+            user_burst=int(os.getenv("ADMISSION_USER_BURST", "20")),
+            max_buckets=int(os.getenv("ADMISSION_MAX_BUCKETS", "10000")),
+            queued_routes=queued_routes,
+        )
+
+    def reset(self) -> None:
+        self.in_flight = 0
+        self.route_in_flight: Counter = Counter()
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.counters: Counter = Counter()
+
+    def metrics(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "capacity": self.capacity,
+            "kitchen_reserved": self.kitchen_reserved,
+            "routes": {f"{method} {path}": self.route_in_flight[(method, path)]
+                       for method, path in self.route_limits},
+            "buckets": len(self.buckets),
+            **self.counters,
+        }
+
+    def _user_key(self, headers: dict, client) -> str:
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and token:
+            try:
+                return "user:" + str(jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub"))
+            except JWTError:
+                pass
+        return "ip:" + (client[0] if client else "unknown")
+
+    def admit(self, method: str, path: str, headers: dict, client):
+        """Devuelve (ruta limitada o None, None) si se admite o (None, respuesta de rechazo)."""
+        route = (method, path.rstrip("/") or "/")
+        route_limit = self.route_limits.get(route)
+        queued = route_limit is not None and route in self.queued_routes
+        is_kitchen = path.startswith(KITCHEN_PREFIXES)
+        limit = self.capacity if is_kitchen else self.capacity - self.kitchen_reserved
+        if not queued and self.in_flight >= limit:
+            self.counters["rejected_capacity"] += 1
+            return None, self._reject(503, "Servicio saturado, reintentar más tarde", 1)
+
+        if route_limit is not None:
+            if self.route_in_flight[route] >= route_limit:
+                self.counters["rejected_route"] += 1
+                return None, self._reject(503, "Servicio saturado, reintentar más tarde", 1)
+            bucket = self._bucket(self._user_key(headers, client))
+            wait = bucket.take()
+            if wait is not None:
+                self.counters["rejected_user"] += 1
+                return None, self._reject(429, "Demasiadas solicitudes, reintentar más tarde", wait)
+            self.route_in_flight[route] += 1
+        else:
+            route = None
+
+        if not queued:
+            self.in_flight += 1
+        self.counters["admitted"] += 1
+        return route, None
+
+    def _bucket(self, key: str) -> TokenBucket:
+        # El dict queda ordenado por último uso: el usado ahora va al final
+        bucket = self.buckets.pop(key, None)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate, self.user_burst)
+        self.buckets[key] = bucket
+        self._evict(time.monotonic())
+        return bucket
+
+    def _evict(self, now: float) -> None:
+        refill = self.user_burst / self.user_rate if self.user_rate > 0 else math.inf
+        while len(self.buckets) > 1:
+            key, oldest = next(iter(self.buckets.items()))
+            if len(self.buckets) <= self.max_buckets and now - oldest.updated < refill:
+                break
+            del self.buckets[key]
+
+    def release(self, route: Optional[RouteKey]) -> None:
+        if route not in self.queued_routes:
+            self.in_flight -= 1
+        if route is not None:
+            self.route_in_flight[route] -= 1
+
+    @staticmethod
+    def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+        return JSONResponse(
+            status_code=status_code,
+            content={"detail": detail},
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI que aplica el AdmissionController a cada request HTTP."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route, rejection = self.controller.admit(
+            scope["method"], scope["path"], dict(scope["headers"]), scope.get("client")
+        )
+        if rejection is not None:
+            await rejection(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route)
+
+
+admission = AdmissionController.from_env()
@@ -1,17 +1,21 @@
 from fastapi import Depends, HTTPException, status
 from typing import List, Callable
 from .utils import oauth2_scheme, verify_token
+from ..models import DEFAULT_BRANCH_ID
 
 def check_permissions(allowed_roles: List[str]) -> Callable:
     """
     Crea un middleware para verificar permisos basados en roles.
 
+    Devuelve el payload del token, con branch_id siempre presente (los
+    tokens emitidos antes de la multi-sucursal usan la sucursal por defecto).
+
     Uso:
     @router.get("/ruta-protegida")
     async def ruta_protegida(
-        _: None = Depends(check_permissions(["admin", "cashier"]))
+        principal: dict = Depends(check_permissions(["admin", "cashier"]))
     ):
-        return {"message": "Acceso permitido"}
+        return {"branch_id": principal["branch_id"]}
     """
     async def permission_checker(token: str = Depends(oauth2_scheme)):
         payload = await verify_token(token)
@@ -22,6 +26,7 @@ def check_permissions(allowed_roles: List[str]) -> Callable:
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No tienes permiso para acceder a este recurso"
             )
+        payload.setdefault("branch_id", DEFAULT_BRANCH_ID)
         return payload
 
     return permission_checker
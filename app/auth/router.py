@@ -2,16 +2,20 @@ from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from typing import Annotated
+from sqlalchemy import select
+from typing import Annotated, Optional
 
+from .. import queries
 from ..database import get_db
-from ..models import User
+from ..models import Branch, DEFAULT_BRANCH_ID, User, UserRole
+from ..background import job_runner
 from .utils import (
     verify_password,
     create_access_token,
     get_password_hash,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     oauth2_scheme,
+    optional_oauth2_scheme,
     verify_token
 )
 from .schemas import Token, User as UserSchema, UserCreate, UserLogin
@@ -37,7 +41,7 @@ async def get_current_user(
     if username is None:
         raise credentials_exception
 
-    user = db.query(User).filter(User.username == username).first()
+    user = queries.get_user(db, username)
     if user is None:
         raise credentials_exception
 
@@ -49,7 +53,7 @@ async def login(
     db: Session = Depends(get_db)
 ):
     """Login endpoint que retorna un token JWT."""
-    user = db.query(User).filter(User.username == user_data.username).first()
+    user = queries.get_user(db, user_data.username)
     if not user or not verify_password(user_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -57,13 +61,15 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Actualizar último login
-    user.last_login = datetime.utcnow()
-    db.commit()
+    # Actualizar último login (en lote, fuera del request si el runner está activo)
+    if job_runner.running:
+        job_runner.submit_batched("last_login", user.id, datetime.utcnow())
+    else:
+        user.last_login = datetime.utcnow()
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username, "role": user.role},
+        data={"sub": user.username, "role": user.role, "branch_id": user.branch_id},
         expires_delta=access_token_expires
     )
 
@@ -72,12 +78,48 @@ async def login(
 @router.post("/register", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
 async def register_user(
     user_data: UserCreate,
+    token: Optional[str] = Depends(optional_oauth2_scheme),
     db: Session = Depends(get_db)
 ):
-    """Registra un nuevo usuario."""
+    """Registra un nuevo usuario (solo admins).
+
+    El usuario queda en la sucursal del admin; solo los admins de la sucursal
+    por defecto pueden registrar usuarios en otra. Mientras no hay ningún
+    usuario se permite registrar sin token al primer admin.
+    """
+    if token:
+        principal = await verify_token(token)
+        if principal.get("role") != UserRole.ADMIN.value:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tienes permiso para acceder a este recurso"
+            )
+        admin_branch_id = principal.get("branch_id", DEFAULT_BRANCH_ID)
+        branch_id = admin_branch_id if user_data.branch_id is None else user_data.branch_id
+        if branch_id != admin_branch_id and admin_branch_id != DEFAULT_BRANCH_ID:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tienes permiso para acceder a este recurso"
+            )
+    elif user_data.role == UserRole.ADMIN and db.execute(select(User.id).limit(1)).first() is None:
+        branch_id = DEFAULT_BRANCH_ID if user_data.branch_id is None else user_data.branch_id
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    branch = db.get(Branch, branch_id)
+    if branch is None or not branch.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Sucursal no encontrada"
+        )
+
     try:
         # Verificar si el usuario ya existe
-        db_user = db.query(User).filter(User.username == user_data.username).first()
+        db_user = queries.get_user(db, user_data.username)
         if db_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -89,16 +131,15 @@ async def register_user(
             username=user_data.username,
             password_hash=get_password_hash(user_data.password),
             role=user_data.role,
+            branch_id=branch_id,
             is_active=True
         )
 
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        db.flush()
 
         return new_user
     except Exception as e:
-        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -15,6 +15,7 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
     role: Optional[UserRole] = None
+    branch_id: Optional[int] = None
 
 class UserLogin(BaseModel):
     username: str
@@ -23,10 +24,12 @@ class UserLogin(BaseModel):
 class UserBase(BaseModel):
     username: str
     role: UserRole
+    branch_id: int = 1
     is_active: bool = True
 
 class UserCreate(UserBase):
     password: str
+    branch_id: Optional[int] = None  # Por defecto, la sucursal del admin que registra
 
 class User(UserBase):
     id: int
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[Session], None]
+BatchFlusher = Callable[[Session, Dict[Hashable, object]], None]
+
+
+class JobRunner:
+    """Ejecuta trabajos diferibles fuera del request en una tarea de fondo.
+
+    - submit(job): encola un trabajo suelto; si la cola está llena se
+      descarta y se cuenta en las métricas.
+    - submit_batched(kind, key, value): acumula valores por clave (el último
+      gana) que se escriben juntos con el flusher registrado para ese tipo.
+
+    Cada vuelta del worker ejecuta lo acumulado en una sola sesión y
+    transacción, en un hilo aparte para no bloquear el event loop. Si la
+    transacción falla entera (por ejemplo, se cae la conexión) los trabajos
+    sueltos se cuentan como fallidos y los lotes vuelven a acumularse para
+    la próxima vuelta; el worker sigue corriendo.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        maxsize: int = 1000,
+        max_batch: int = 100,
+        flush_interval: float = 0.5,
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._flushers: Dict[str, BatchFlusher] = {}
+        self._batches: Dict[str, dict] = defaultdict(dict)
+        self._task = None
+        self._stopping = False
+        self._metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "dropped": 0,
+            "coalesced": 0,
+            "flushes": 0,
+            "retried": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def register_batch(self, kind: str, flusher: BatchFlusher) -> None:
+        self._flushers[kind] = flusher
+
+    def submit(self, job: Job) -> bool:
+        """Encola job; devuelve False si la cola está llena o el runner no arrancó."""
+        if self._queue is None:
+            self._metrics["dropped"] += 1
+            return False
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._metrics["dropped"] += 1
+            return False
+        self._metrics["submitted"] += 1
+        return True
+
+    def submit_batched(self, kind: str, key: Hashable, value) -> None:
+        batch = self._batches[kind]
+        if key in batch:
+            self._metrics["coalesced"] += 1
+        batch[key] = value
+        self._metrics["submitted"] += 1
+
+    def metrics(self) -> dict:
+        return {
+            **self._metrics,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "pending_batched": sum(len(batch) for batch in self._batches.values()),
+        }
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._stopping = False
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._task = asyncio.create_task(self._worker())
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Drena la cola y los lotes pendientes antes de terminar."""
+        if not self.running:
+            return
+        self._stopping = True
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Se cancelaron trabajos de fondo sin terminar: %s", self.metrics())
+            self._task.cancel()
+        self._task = None
+
+    async def _worker(self) -> None:
+        while True:
+            jobs = []
+            try:
+                jobs.append(await asyncio.wait_for(self._queue.get(), self.flush_interval))
+                while len(jobs) < self.max_batch and not self._queue.empty():
+                    jobs.append(self._queue.get_nowait())
+            except asyncio.TimeoutError:
+                pass
+
+            batches, self._batches = self._batches, defaultdict(dict)
+            if jobs or batches:
+                try:
+                    await asyncio.to_thread(self._run, jobs, batches)
+                except Exception:
+                    logger.exception("Falló una vuelta de trabajos de fondo")
+                    self._metrics["failed"] += len(jobs)
+                    self._metrics["retried"] += sum(len(items) for items in batches.values())
+                    self._requeue(batches)
+
+            if self._stopping and self._queue.empty() and not self._batches:
+                return
+
+    def _requeue(self, batches: Dict[str, dict]) -> None:
+        # Lo acumulado mientras tanto es más nuevo y gana
+        for kind, items in batches.items():
+            pending = self._batches[kind]
+            for key, value in items.items():
+                pending.setdefault(key, value)
+
+    def _run(self, jobs, batches) -> None:
+        # Las métricas se cuentan recién al confirmar; si falla la transacción
+        # entera las cuenta el worker
+        completed = failed = flushes = 0
+        with self.session_factory() as db:
+            for job in jobs:
+                try:
+                    with db.begin_nested():
+                        job(db)
+                    completed += 1
+                except Exception:
+                    logger.exception("Falló un trabajo de fondo")
+                    failed += 1
+
+            for kind, items in batches.items():
+                try:
+                    with db.begin_nested():
+                        self._flushers[kind](db, items)
+                    completed += len(items)
+                    flushes += 1
+                except Exception:
+                    logger.exception("Falló la escritura en lote de %s", kind)
+                    failed += len(items)
+
+            db.commit()
+        self._metrics["completed"] += completed
+        self._metrics["failed"] += failed
+        self._metrics["flushes"] += flushes
+
+
+def flush_last_login(db: Session, logins: Dict[Hashable, object]) -> None:
+    """Actualiza last_login de varios usuarios en un solo UPDATE por lotes."""
+    db.execute(
+        update(User),
+        [{"id": user_id, "last_login": at} for user_id, at in logins.items()]
+    )
+
+
+job_runner = JobRunner()
+job_runner.register_batch("last_login", flush_last_login)
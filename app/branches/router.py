@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List
+
+from ..database import get_db
+from ..models import Branch as BranchModel
+from ..partitions import create_branch_partitions
+from .schemas import Branch, BranchCreate
+from ..auth.middleware import check_permissions
+
+router = APIRouter(
+    prefix="/branches",
+    tags=["branches"]
+)
+
+@router.post("/", response_model=Branch, status_code=status.HTTP_201_CREATED)
+async def create_branch(
+    branch: BranchCreate,
+    db: Session = Depends(get_db),
+    _=Depends(check_permissions(["admin"]))
+):
+    """Crear una sucursal junto con sus particiones de órdenes."""
+    if db.query(BranchModel).filter(BranchModel.name == branch.name).first():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ya existe una sucursal con ese nombre"
+        )
+
+    db_branch = BranchModel(name=branch.name)
+    db.add(db_branch)
+    db.flush()
+    create_branch_partitions(db, db_branch.id)
+    return db_branch
+
+@router.get("/", response_model=List[Branch])
+async def get_branches(
+    db: Session = Depends(get_db),
+    _=Depends(check_permissions(["admin"]))
+):
+    """Obtener todas las sucursales."""
+    return db.query(BranchModel).order_by(BranchModel.id).all()
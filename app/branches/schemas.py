@@ -0,0 +1,13 @@
+from pydantic import BaseModel, constr
+from datetime import datetime
+
+class BranchCreate(BaseModel):
+    name: constr(min_length=1, max_length=100)
+
+class Branch(BranchCreate):
+    id: int
+    is_active: bool
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
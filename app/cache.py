@@ -0,0 +1,192 @@
+import json
+import logging
+import select
+import threading
+import time
+import uuid
+from threading import Lock
+from typing import Any, Callable, Hashable, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy import select as sql_select
+from sqlalchemy.orm import Session
+
+from .database import run_after_commit
+
+logger = logging.getLogger(__name__)
+
+_caches: List["LocalCache"] = []
+
+
+class LocalCache:
+    """Cache en memoria del proceso, invalidada por nombre de entidad.
+
+    Cada cache declara de qué entidades depende ("tables", "orders", ...);
+    cualquier escritura sobre ellas la vacía por completo.
+    """
+
+    def __init__(self, name: str, depends_on: List[str], ttl: Optional[float] = None):
+        self.name = name
+        self.depends_on = set(depends_on)
+        self.ttl = ttl
+        self._data = {}
+        self._generation = 0
+        self._lock = Lock()
+        _caches.append(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return default
+        return value
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Devuelve el valor cacheado o lo calcula con loader.
+
+        Si hubo una invalidación mientras se calculaba, el valor se devuelve
+        pero no se guarda, para no cachear datos ya viejos.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+
+        generation = self._generation
+        value = loader()
+        with self._lock:
+            if generation == self._generation:
+                expires_at = time.monotonic() + self.ttl if self.ttl else None
+                self._data[key] = (value, expires_at)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+
+def _invalidate_local(entities: Iterable[str]) -> None:
+    changed = set(entities)
+    for cache in _caches:
+        if cache.depends_on & changed:
+            cache.clear()
+
+
+class InvalidationBus:
+    """Reparte las invalidaciones de cache entre los workers.
+
+    El proceso que escribe siempre invalida en memoria al confirmar. Con
+    PostgreSQL además publica las entidades con NOTIFY y cada worker las
+    escucha (start() en el lifespan) con una conexión dedicada en un hilo.
+    Los mensajes llevan el id del proceso para ignorar los propios.
+
+    Las estructuras en memoria que se actualizan solas al confirmar (no se
+    vacían) se suscriben con subscribe() para enterarse de los cambios
+    hechos por otros workers.
+    """
+
+    CHANNEL = "cache_invalidation"
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self.subscribers: List[Callable[[Optional[set]], None]] = []
+        self._engine = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def listening(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def subscribe(self, callback: Callable[[Optional[set]], None]) -> None:
+        """Registra un callback que recibe las entidades invalidadas por otros workers.
+
+        Recibe None cuando no se sabe qué cambió (al reconectar) y hay que
+        descartar todo.
+        """
+        self.subscribers.append(callback)
+
+    def payload(self, entities: Iterable[str]) -> str:
+        return json.dumps({"origin": self.origin, "entities": sorted(set(entities))})
+
+    def publish(self, entities: Iterable[str], db: Optional[Session] = None) -> None:
+        """Publica a los demás workers.
+
+        Con una sesión el NOTIFY va dentro de su transacción, y PostgreSQL
+        solo lo entrega si se confirma.
+        """
+        statement = sql_select(func.pg_notify(self.CHANNEL, self.payload(entities)))
+        if db is not None:
+            if db.get_bind().dialect.name == "postgresql":
+                db.execute(statement)
+        elif self._engine is not None and self._engine.dialect.name == "postgresql":
+            with self._engine.begin() as conn:
+                conn.execute(statement)
+
+    def start(self, engine) -> None:
+        self._engine = engine
+        if engine.dialect.name != "postgresql" or self.listening:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _listen(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with self._engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    conn.exec_driver_sql(f"LISTEN {self.CHANNEL}")
+                    # Lo que cambió mientras no se escuchaba no llegó: se vacía todo
+                    self._resync()
+                    raw = conn.connection.driver_connection
+                    while not self._stop.is_set():
+                        if select.select([raw], [], [], 1.0) == ([], [], []):
+                            continue
+                        raw.poll()
+                        while raw.notifies:
+                            self.receive(raw.notifies.pop(0).payload)
+            except Exception:
+                logger.exception("Se perdió la conexión del bus de invalidación, reintentando")
+                self._stop.wait(5)
+
+    def _resync(self) -> None:
+        clear_all()
+        for callback in list(self.subscribers):
+            callback(None)
+
+    def receive(self, payload: str) -> None:
+        message = json.loads(payload)
+        if message["origin"] != self.origin:
+            _invalidate_local(message["entities"])
+            for callback in list(self.subscribers):
+                callback(set(message["entities"]))
+
+
+bus = InvalidationBus()
+
+
+def invalidate(*entities: str) -> None:
+    """Vacía las caches que dependen de alguna de las entidades, en todos los workers."""
+    _invalidate_local(entities)
+    bus.publish(entities)
+
+
+def invalidate_on_commit(db: Session, *entities: str) -> None:
+    """Invalida las entidades cuando se confirme la transacción de la sesión."""
+    bus.publish(entities, db)
+    run_after_commit(db, lambda: _invalidate_local(entities))
+
+
+def clear_all() -> None:
+    for cache in _caches:
+        cache.clear()
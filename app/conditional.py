@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import HTTPException, Response, status
+
+
+def weak_etag(*parts) -> str:
+    """Arma un ETag débil a partir de las partes que identifican la versión."""
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def http_date(value: datetime) -> str:
+    """Formatea un datetime UTC naive como fecha HTTP (RFC 7231)."""
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(
+    etag: str,
+    if_none_match: Optional[str],
+    last_modified: Optional[datetime] = None,
+    if_modified_since: Optional[str] = None,
+) -> bool:
+    """Evalúa las precondiciones de un GET condicional.
+
+    If-None-Match tiene prioridad; If-Modified-Since solo se usa si el
+    cliente no envió ETags (comparación débil, como pide la RFC para GET).
+    """
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        return _opaque(etag) in {_opaque(tag) for tag in if_none_match.split(",")}
+
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+        return modified <= since
+
+    return False
+
+
+def check_version(
+    etag: str,
+    version: int,
+    if_match: Optional[str] = None,
+    expected_version: Optional[int] = None,
+) -> None:
+    """Precondiciones de una escritura con control de concurrencia optimista.
+
+    El cliente indica qué versión modificó con If-Match (el ETag del GET) o
+    con expected_version; si ya no es la actual se responde 409 con el ETag
+    vigente para que vuelva a leer.
+    """
+    stale = expected_version is not None and expected_version != version
+    if if_match and if_match.strip() != "*":
+        stale = stale or _opaque(etag) not in {_opaque(tag) for tag in if_match.split(",")}
+    if stale:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="El recurso fue modificado por otro usuario, volver a cargarlo",
+            headers={"ETag": etag},
+        )
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    headers = {"ETag": etag}
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers=validator_headers(etag, last_modified)
+    )
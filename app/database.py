@@ -1,8 +1,10 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, SessionTransaction, sessionmaker, declarative_base
 from sqlalchemy.ext.declarative import declarative_base
 from dotenv import load_dotenv
 import os
+from contextlib import contextmanager
+from typing import Optional
 
 load_dotenv()
 
@@ -12,16 +14,109 @@ SQLALCHEMY_DATABASE_URL = os.getenv(
 )
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Los requests confirman después de serializar la respuesta (ver UnitOfWork);
+# no expirar al confirmar evita recargar objetos que ya no se leen
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 Base = declarative_base()
 
-# Dependency
-def get_db():
-    db = SessionLocal()
+def run_after_commit(db: Session, callback) -> None:
+    """Ejecuta callback cuando la transacción de la sesión se confirme.
+
+    Dentro de un savepoint el callback queda atado a él: al liberarse pasa a
+    la transacción que lo contiene y recién corre con el commit de la
+    transacción raíz. Si el savepoint o la transacción se revierten, el
+    callback se descarta.
+    """
+    pending = db.info.setdefault("after_commit", {})
+    pending.setdefault(db.get_nested_transaction(), []).append(callback)
+
+def run_after_commit_on(db: Session, loop) -> None:
+    """Corre los callbacks de run_after_commit en loop (sesiones usadas desde
+    otro hilo, como asyncio.to_thread): el estado en memoria que modifican
+    solo se toca desde el event loop."""
+    db.info["after_commit_loop"] = loop
+
+def _savepoint(transaction) -> Optional[SessionTransaction]:
+    # Savepoint más cercano que contiene a transaction; None es la raíz
+    while transaction is not None and not transaction.nested:
+        transaction = transaction.parent
+    return transaction
+
+def _run_callbacks(callbacks) -> None:
+    for callback in callbacks:
+        callback()
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit_callbacks(session):
+    # En SQLAlchemy 2.0 after_commit también se emite al liberar un savepoint
+    pending = session.info.get("after_commit")
+    if not pending:
+        return
+    nested = session.get_nested_transaction()
+    if nested is not None:
+        callbacks = pending.pop(nested, [])
+        if callbacks:
+            pending.setdefault(_savepoint(nested.parent), []).extend(callbacks)
+        return
+
+    callbacks = pending.pop(None, [])
+    loop = session.info.get("after_commit_loop")
+    if loop is not None and callbacks:
+        loop.call_soon_threadsafe(_run_callbacks, callbacks)
+    else:
+        _run_callbacks(callbacks)
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_after_commit_callbacks(session, transaction):
+    # Lo que queda al cerrar un savepoint o la raíz no se confirmó
+    if transaction.nested or transaction.parent is None:
+        pending = session.info.get("after_commit")
+        if pending:
+            pending.pop(transaction if transaction.nested else None, None)
+
+class UnitOfWork:
+    """Sesión de un request que recién se crea cuando el handler la usa.
+
+    Delega todo en la Session. Los handlers no confirman: hacen flush si
+    necesitan ids o versiones generadas y la transacción se confirma una sola
+    vez al terminar el request. Si el handler falla, se revierte al cerrar.
+    Los requests rechazados por permisos o servidos desde memoria no llegan a
+    crear la sesión.
+    """
+
+    def __init__(self, session_factory):
+        self._session_factory = session_factory
+        self._session: Optional[Session] = None
+
+    @property
+    def session(self) -> Session:
+        if self._session is None:
+            self._session = self._session_factory()
+        return self._session
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+@contextmanager
+def unit_of_work(session_factory):
+    db = UnitOfWork(session_factory)
     try:
         yield db
+        if db.opened:
+            db.session.commit()
     finally:
-        db.close()
+        if db.opened:
+            db.session.close()
 
 
+# Dependency: asíncrona para que FastAPI corra el cierre (el commit y sus
+# callbacks sobre el estado en memoria) en el event loop y no en un hilo
+async def get_db():
+    with unit_of_work(SessionLocal) as db:
+        yield db
@@ -0,0 +1,71 @@
+"""Tiempo de preparación estimado por producto y por categoría.
+
+Se mantiene un promedio móvil exponencial (EWMA) de los segundos por unidad,
+actualizado cada vez que la cocina completa una orden: el tiempo entre el
+inicio y el fin de la preparación se reparte entre las unidades de la orden.
+Un producto sin historial usa el promedio de su categoría y, si tampoco lo
+hay, DEFAULT_ITEM_SECONDS.
+
+El estado vive en memoria del proceso y arranca vacío.
+"""
+import os
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..database import run_after_commit
+
+# Peso de la última observación
+ALPHA = float(os.getenv("KITCHEN_EWMA_ALPHA", "0.2"))
+
+# Estimación por unidad mientras no haya historial de preparación
+DEFAULT_ITEM_SECONDS = 60
+
+Items = Iterable[Tuple[int, str, int]]  # (product_id, category, quantity)
+
+
+class PrepTimeEstimator:
+    def __init__(self, alpha: float = ALPHA, default: float = DEFAULT_ITEM_SECONDS):
+        self.alpha = alpha
+        self.default = default
+        self.per_product: Dict[int, float] = {}
+        self.per_category: Dict[str, float] = {}
+
+    def reset(self) -> None:
+        self.per_product = {}
+        self.per_category = {}
+
+    def unit_seconds(self, product_id: int, category: str) -> float:
+        value = self.per_product.get(product_id)
+        if value is None:
+            value = self.per_category.get(category, self.default)
+        return value
+
+    def estimate(self, items: Items) -> float:
+        """Segundos estimados para preparar todas las unidades de una orden."""
+        return sum(quantity * self.unit_seconds(product_id, category)
+                   for product_id, category, quantity in items)
+
+    def _update(self, averages: dict, key, observation: float) -> None:
+        previous = averages.get(key)
+        averages[key] = observation if previous is None \
+            else self.alpha * observation + (1 - self.alpha) * previous
+
+    def observe(self, items: Items, seconds: float) -> None:
+        """Registra una orden completada en seconds."""
+        items = list(items)
+        units = sum(quantity for _, _, quantity in items)
+        if units <= 0 or seconds < 0:
+            return
+        per_unit = seconds / units
+        for product_id, category, _ in items:
+            self._update(self.per_product, product_id, per_unit)
+        for category in {category for _, category, _ in items}:
+            self._update(self.per_category, category, per_unit)
+
+    def observe_on_commit(self, db: Session, items: Items, seconds: float) -> None:
+        items = list(items)
+        run_after_commit(db, lambda: self.observe(items, seconds))
+
+
+prep_times = PrepTimeEstimator()
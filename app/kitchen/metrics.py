@@ -0,0 +1,159 @@
+"""Métricas en vivo de la cocina sobre una ventana deslizante.
+
+Por sucursal se guarda un buffer circular de WINDOW_SECONDS contadores por
+segundo (órdenes que entran y que salen listas) y, por cada minuto de la
+ventana, un sketch de cuantiles de la espera hasta empezar la preparación y
+del tiempo hasta quedar lista. Consultar recorre a lo sumo la ventana, sin
+leer la base: el tamaño no depende de la cantidad de órdenes.
+
+Cada worker cuenta lo que pasa por él; el estado vive en memoria y arranca
+vacío.
+"""
+import math
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from ..database import run_after_commit
+from ..models import Order, OrderStatus
+
+WINDOW_MINUTES = 15
+WINDOW_SECONDS = WINDOW_MINUTES * 60
+
+# Error relativo máximo de los cuantiles
+SKETCH_ACCURACY = 0.02
+
+
+class QuantileSketch:
+    """Histograma con bins logarítmicos: cada valor cae en el bin i tal que
+    gamma**(i-1) < valor <= gamma**i, así que cualquier cuantil se estima con
+    error relativo SKETCH_ACCURACY. Los sketches se pueden sumar."""
+
+    gamma = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+
+    def __init__(self):
+        self.bins: Counter = Counter()
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        # Todo lo que dura hasta un segundo comparte el bin 0
+        index = math.ceil(math.log(value, self.gamma)) if value > 1 else 0
+        self.bins[index] += 1
+        self.count += 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        self.bins.update(other.bins)
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                break
+        return 2 * self.gamma ** index / (self.gamma + 1) if index else 1.0
+
+
+class SlidingWindow:
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.second_of = [-1] * WINDOW_SECONDS
+        self.orders_in = [0] * WINDOW_SECONDS
+        self.orders_out = [0] * WINDOW_SECONDS
+        self.minute_of = [-1] * WINDOW_MINUTES
+        self.wait = [QuantileSketch() for _ in range(WINDOW_MINUTES)]
+        self.lead = [QuantileSketch() for _ in range(WINDOW_MINUTES)]
+
+    def _second(self) -> int:
+        # Slot del segundo actual; se reutiliza si quedó de una vuelta anterior
+        second = int(self.clock())
+        slot = second % WINDOW_SECONDS
+        if self.second_of[slot] != second:
+            self.second_of[slot] = second
+            self.orders_in[slot] = 0
+            self.orders_out[slot] = 0
+        return slot
+
+    def _minute(self) -> int:
+        minute = int(self.clock()) // 60
+        slot = minute % WINDOW_MINUTES
+        if self.minute_of[slot] != minute:
+            self.minute_of[slot] = minute
+            self.wait[slot] = QuantileSketch()
+            self.lead[slot] = QuantileSketch()
+        return slot
+
+    def order_in(self) -> None:
+        self.orders_in[self._second()] += 1
+
+    def order_started(self, wait_seconds: float) -> None:
+        self.wait[self._minute()].add(wait_seconds)
+
+    def order_out(self, lead_seconds: float) -> None:
+        self.orders_out[self._second()] += 1
+        self.lead[self._minute()].add(lead_seconds)
+
+    def snapshot(self, minutes: int = WINDOW_MINUTES) -> dict:
+        now = int(self.clock())
+        first_second = now - minutes * 60 + 1
+        orders_in = orders_out = 0
+        for slot, second in enumerate(self.second_of):
+            if first_second <= second <= now:
+                orders_in += self.orders_in[slot]
+                orders_out += self.orders_out[slot]
+
+        # Los sketches son por minuto: se toman los minutes minutos más recientes
+        first_minute = now // 60 - minutes + 1
+        wait, lead = QuantileSketch(), QuantileSketch()
+        for slot, minute in enumerate(self.minute_of):
+            if first_minute <= minute:
+                wait.merge(self.wait[slot])
+                lead.merge(self.lead[slot])
+
+        return {
+            "window_minutes": minutes,
+            "orders_in": orders_in,
+            "orders_out": orders_out,
+            "orders_in_per_minute": round(orders_in / minutes, 2),
+            "orders_out_per_minute": round(orders_out / minutes, 2),
+            "wait_p50_seconds": wait.quantile(0.5),
+            "wait_p90_seconds": wait.quantile(0.9),
+            "ready_p90_seconds": lead.quantile(0.9),
+        }
+
+
+class KitchenMetrics:
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._branches: Dict[int, SlidingWindow] = {}
+
+    def reset(self) -> None:
+        self._branches = {}
+
+    def window(self, branch_id: int) -> SlidingWindow:
+        window = self._branches.get(branch_id)
+        if window is None:
+            window = self._branches[branch_id] = SlidingWindow(self.clock)
+        return window
+
+    def order_in_on_commit(self, db: Session, order: Order) -> None:
+        branch_id = order.branch_id
+        run_after_commit(db, lambda: self.window(branch_id).order_in())
+
+    def transition_on_commit(self, db: Session, order: Order) -> None:
+        """Registra el inicio o el fin de la preparación de order al confirmar."""
+        branch_id = order.branch_id
+        elapsed = max(0.0, (datetime.utcnow() - order.created_at).total_seconds())
+        if order.status == OrderStatus.IN_PREPARATION:
+            run_after_commit(db, lambda: self.window(branch_id).order_started(elapsed))
+        elif order.status == OrderStatus.READY:
+            run_after_commit(db, lambda: self.window(branch_id).order_out(elapsed))
+
+
+kitchen_metrics = KitchenMetrics()
@@ -1,39 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, delete, insert, or_, select, update
+from collections import defaultdict
 
+from .. import queries
+from ..cache import invalidate_on_commit
+from ..conditional import check_version
 from ..database import get_db
-from ..models import Order, OrderItem, Product
-from ..orders.schemas import Order as OrderSchema, OrderStatus
+from ..models import KitchenTicket, Order, OrderItem, Product, Station, StationCategory, TicketStatus
+from ..orders.schemas import Order as OrderSchema, OrderStatus, PartialOrder
 from ..auth.middleware import check_permissions
+from ..orders.fields import Fields, order_fields, project
+from ..orders.reads import ITEM_COLUMNS, order_etag
+from ..orders.store import open_orders
+from ..responses import ORJSONResponse
+from .estimates import prep_times
+from .metrics import WINDOW_MINUTES, kitchen_metrics
+from .scheduler import KITCHEN_STATUSES, kitchen_scheduler
+from .schemas import KitchenLiveMetrics, KitchenTicket as KitchenTicketSchema, Station as StationSchema, StationCreate, StationUpdate
+from .stations import complete_order_tickets, complete_ticket, start_ticket
 
 router = APIRouter(
     prefix="/kitchen",
     tags=["kitchen"]
 )
 
-@router.get("/orders/queue", response_model=List[OrderSchema])
+# Lo que necesita la pantalla de cocina: sin datos de cobro
+QUEUE_SUMMARY_FIELDS = ("table_id", "status", "notes", "is_takeaway", "created_at", "version", "items")
+
+@router.get("/orders/queue", response_model=List[PartialOrder], response_class=ORJSONResponse)
 async def get_kitchen_queue(
+    fields: Fields = Depends(order_fields(QUEUE_SUMMARY_FIELDS)),
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["cook"]))
+    principal=Depends(check_permissions(["cook"]))
 ):
-    """Obtener la cola de órdenes pendientes y en preparación, ordenadas por tiempo de espera."""
-    orders = db.query(Order).filter(
-        Order.status.in_([OrderStatus.PENDING, OrderStatus.IN_PREPARATION])
-    ).order_by(Order.created_at.asc()).all()
-    return orders
+    """Obtener la cola de órdenes en preparación y pendientes, según la prioridad del scheduler.
+
+    Soporta fields= y view=summary (sin datos de cobro).
+    """
+    branch_id = principal["branch_id"]
+    orders = []
+    for order_id in kitchen_scheduler.ranked(db, branch_id):
+        entry = open_orders.get(db, branch_id, order_id)
+        if entry is not None and entry.data["status"] in KITCHEN_STATUSES:
+            orders.append(project(entry.data, fields))
+    return ORJSONResponse(orders)
 
 @router.get("/orders/next", response_model=OrderSchema)
 async def get_next_order(
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["cook"]))
+    principal=Depends(check_permissions(["cook"]))
 ):
-    """Obtener la siguiente orden pendiente más antigua."""
-    order = db.query(Order).filter(
-        Order.status == OrderStatus.PENDING
-    ).order_by(Order.created_at.asc()).first()
+    """Obtener la siguiente orden pendiente con mayor prioridad."""
+    branch_id = principal["branch_id"]
+    order = None
+    for _ in range(2):
+        order_id = kitchen_scheduler.next_pending(db, branch_id)
+        if order_id is None:
+            break
+        order = db.query(Order).filter(
+            Order.id == order_id,
+            Order.branch_id == branch_id,
+            Order.status == OrderStatus.PENDING
+        ).first()
+        if order is not None:
+            break
+        # El estado en memoria quedó viejo: se recarga y se reintenta una vez
+        kitchen_scheduler.reset()
 
     if not order:
         raise HTTPException(
@@ -45,16 +80,19 @@ async def get_next_order(
 @router.post("/orders/{order_id}/start", response_model=OrderSchema)
 async def start_order_preparation(
     order_id: int,
+    if_match: Optional[str] = Header(None),
+    expected_version: Optional[int] = Query(None, description="Versión que el cliente modificó"),
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["cook"]))
+    principal=Depends(check_permissions(["cook"]))
 ):
-    """Marcar una orden como 'en preparación'."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    """Marcar una orden como 'en preparación' (soporta If-Match / expected_version)."""
+    order = queries.get_order(db, order_id, principal["branch_id"])
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Orden no encontrada"
         )
+    check_version(order_etag(order.id, order.version), order.version, if_match, expected_version)
 
     if order.status != OrderStatus.PENDING:
         raise HTTPException(
@@ -63,23 +101,30 @@ async def start_order_preparation(
         )
 
     order.status = OrderStatus.IN_PREPARATION
-    db.commit()
-    db.refresh(order)
+    order.started_at = datetime.utcnow()
+    kitchen_scheduler.set_status_on_commit(db, order)
+    kitchen_metrics.transition_on_commit(db, order)
+    invalidate_on_commit(db, "orders")
+    open_orders.track_on_commit(db, order)
+    db.flush()
     return order
 
 @router.post("/orders/{order_id}/complete", response_model=OrderSchema)
 async def complete_order(
     order_id: int,
+    if_match: Optional[str] = Header(None),
+    expected_version: Optional[int] = Query(None, description="Versión que el cliente modificó"),
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["cook"]))
+    principal=Depends(check_permissions(["cook"]))
 ):
-    """Marcar una orden como 'lista'."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    """Marcar una orden como 'lista' (soporta If-Match / expected_version)."""
+    order = queries.get_order(db, order_id, principal["branch_id"])
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Orden no encontrada"
         )
+    check_version(order_etag(order.id, order.version), order.version, if_match, expected_version)
 
     if order.status != OrderStatus.IN_PREPARATION:
         raise HTTPException(
@@ -87,27 +132,42 @@ async def complete_order(
             detail="La orden no está en preparación"
         )
 
+    if order.started_at is not None:
+        items = db.execute(
+            select(OrderItem.product_id, Product.category, OrderItem.quantity)
+            .join(Product, Product.id == OrderItem.product_id)
+            .where(OrderItem.order_id == order.id, OrderItem.branch_id == order.branch_id)
+        ).all()
+        prep_times.observe_on_commit(db, items, (datetime.utcnow() - order.started_at).total_seconds())
+
     order.status = OrderStatus.READY
-    db.commit()
-    db.refresh(order)
+    complete_order_tickets(db, order)
+    kitchen_scheduler.set_status_on_commit(db, order)
+    kitchen_metrics.transition_on_commit(db, order)
+    invalidate_on_commit(db, "orders")
+    open_orders.track_on_commit(db, order)
+    db.flush()
     return order
 
 @router.get("/orders/stats")
 async def get_kitchen_stats(
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["cook", "admin"]))
+    principal=Depends(check_permissions(["cook", "admin"]))
 ):
     """Obtener estadísticas de la cocina."""
+    branch_id = principal["branch_id"]
     current_time = datetime.utcnow()
     today_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
 
     # Órdenes del día
     total_orders = db.query(Order).filter(
+        Order.branch_id == branch_id,
         Order.created_at >= today_start
     ).count()
 
     pending_orders = db.query(Order).filter(
         and_(
+            Order.branch_id == branch_id,
             Order.status == OrderStatus.PENDING,
             Order.created_at >= today_start
         )
@@ -115,6 +175,7 @@ async def get_kitchen_stats(
 
     in_preparation = db.query(Order).filter(
         and_(
+            Order.branch_id == branch_id,
             Order.status == OrderStatus.IN_PREPARATION,
             Order.created_at >= today_start
         )
@@ -122,6 +183,7 @@ async def get_kitchen_stats(
 
     completed_orders = db.query(Order).filter(
         and_(
+            Order.branch_id == branch_id,
             Order.status == OrderStatus.READY,
             Order.created_at >= today_start
         )
@@ -130,6 +192,7 @@ async def get_kitchen_stats(
     # Calcular tiempo promedio de preparación
     completed_orders_data = db.query(Order).filter(
         and_(
+            Order.branch_id == branch_id,
             Order.status == OrderStatus.READY,
             Order.created_at >= today_start
         )
@@ -150,3 +213,241 @@ async def get_kitchen_stats(
         "completed_orders": completed_orders,
         "avg_preparation_time": round(avg_preparation_time / 60, 2),  # en minutos
     }
+
+@router.get("/live-metrics", response_model=KitchenLiveMetrics)
+async def get_live_metrics(
+    minutes: int = Query(WINDOW_MINUTES, ge=1, le=WINDOW_MINUTES, description="Ventana en minutos"),
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["cook", "admin"]))
+):
+    """Órdenes que entran y salen por minuto, backlog actual y esperas recientes (p50/p90).
+
+    Se calcula en memoria sobre las transiciones que vio este worker.
+    """
+    branch_id = principal["branch_id"]
+    return {
+        **kitchen_metrics.window(branch_id).snapshot(minutes),
+        "backlog": len(kitchen_scheduler.ranked(db, branch_id)),
+    }
+
+def _station_rows(db: Session, branch_id: int, station_id: Optional[int] = None) -> List[dict]:
+    query = select(Station.id, Station.name, Station.is_default, Station.is_active, Station.created_at) \
+        .where(Station.branch_id == branch_id)
+    if station_id is not None:
+        query = query.where(Station.id == station_id)
+    stations = [dict(row, categories=[]) for row in db.execute(query.order_by(Station.id)).mappings()]
+    by_id = {station["id"]: station for station in stations}
+    for category, owner in db.execute(
+        select(StationCategory.category, StationCategory.station_id)
+        .where(StationCategory.branch_id == branch_id, StationCategory.station_id.in_(list(by_id)))
+        .order_by(StationCategory.category)
+    ):
+        by_id[owner]["categories"].append(category)
+    return stations
+
+def _assign_categories(db: Session, station: Station, categories: List[str]) -> None:
+    """Deja a la estación con exactamente esas categorías, quitándoselas a otras."""
+    categories = list(dict.fromkeys(categories))
+    db.execute(delete(StationCategory).where(
+        StationCategory.branch_id == station.branch_id,
+        or_(StationCategory.station_id == station.id, StationCategory.category.in_(categories))
+    ))
+    if categories:
+        db.execute(insert(StationCategory), [
+            {"branch_id": station.branch_id, "category": category, "station_id": station.id}
+            for category in categories
+        ])
+
+def _make_default(db: Session, station: Station) -> None:
+    db.execute(
+        update(Station)
+        .where(Station.branch_id == station.branch_id, Station.id != station.id)
+        .values(is_default=False)
+    )
+
+@router.post("/stations", response_model=StationSchema, status_code=status.HTTP_201_CREATED)
+async def create_station(
+    station: StationCreate,
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["admin"]))
+):
+    """Crear una estación de cocina con las categorías que prepara."""
+    db_station = Station(name=station.name, is_default=station.is_default, branch_id=principal["branch_id"])
+    db.add(db_station)
+    db.flush()
+    _assign_categories(db, db_station, station.categories)
+    if station.is_default:
+        _make_default(db, db_station)
+    invalidate_on_commit(db, "stations")
+    db.flush()
+    return _station_rows(db, principal["branch_id"], db_station.id)[0]
+
+@router.get("/stations", response_model=List[StationSchema])
+async def get_stations(
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["admin", "cook"]))
+):
+    """Obtener las estaciones de la sucursal con sus categorías."""
+    return _station_rows(db, principal["branch_id"])
+
+@router.patch("/stations/{station_id}", response_model=StationSchema)
+async def update_station(
+    station_id: int,
+    station_update: StationUpdate,
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["admin"]))
+):
+    """Actualizar una estación; categories reemplaza la lista completa.
+
+    Los cambios de categorías aplican a las órdenes nuevas.
+    """
+    db_station = db.query(Station).filter(
+        Station.id == station_id,
+        Station.branch_id == principal["branch_id"]
+    ).first()
+    if db_station is None:
+        raise HTTPException(status_code=404, detail="Estación no encontrada")
+
+    update_data = station_update.dict(exclude_unset=True)
+    categories = update_data.pop("categories", None)
+    for key, value in update_data.items():
+        setattr(db_station, key, value)
+    if categories is not None:
+        _assign_categories(db, db_station, categories)
+    if station_update.is_default:
+        _make_default(db, db_station)
+    invalidate_on_commit(db, "stations")
+    db.flush()
+    return _station_rows(db, principal["branch_id"], db_station.id)[0]
+
+@router.get("/stations/{station_id}/queue", response_model=List[KitchenTicketSchema], response_class=ORJSONResponse)
+async def get_station_queue(
+    station_id: int,
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["cook"]))
+):
+    """Obtener los tickets abiertos de una estación, según la prioridad del scheduler.
+
+    Cada ticket trae solo los items que prepara la estación.
+    """
+    branch_id = principal["branch_id"]
+    exists_station = db.execute(
+        select(Station.id).where(Station.id == station_id, Station.branch_id == branch_id)
+    ).scalar_one_or_none()
+    if exists_station is None:
+        raise HTTPException(status_code=404, detail="Estación no encontrada")
+
+    tickets = [dict(row) for row in db.execute(
+        select(
+            KitchenTicket.id, KitchenTicket.order_id, KitchenTicket.station_id, KitchenTicket.status,
+            KitchenTicket.created_at, KitchenTicket.started_at,
+            Order.table_id, Order.is_takeaway, Order.notes,
+        )
+        .join(Order, (Order.id == KitchenTicket.order_id) & (Order.branch_id == branch_id))
+        .where(
+            KitchenTicket.branch_id == branch_id,
+            KitchenTicket.station_id == station_id,
+            KitchenTicket.status != TicketStatus.DONE,
+            Order.status.in_(KITCHEN_STATUSES)
+        )
+    ).mappings()]
+    if not tickets:
+        return ORJSONResponse([])
+
+    items_by_order = defaultdict(list)
+    for item in db.execute(
+        select(*ITEM_COLUMNS).where(
+            OrderItem.branch_id == branch_id,
+            OrderItem.order_id.in_([ticket["order_id"] for ticket in tickets]),
+            OrderItem.station_id == station_id
+        ).order_by(OrderItem.id)
+    ).mappings():
+        item = dict(item)
+        items_by_order[item.pop("order_id")].append(item)
+
+    ranking = {order_id: rank for rank, order_id in enumerate(kitchen_scheduler.ranked(db, branch_id))}
+    for ticket in tickets:
+        ticket["items"] = items_by_order[ticket["order_id"]]
+    tickets.sort(key=lambda ticket: (
+        ticket["status"] != TicketStatus.IN_PREPARATION,
+        ranking.get(ticket["order_id"], len(ranking)),
+        ticket["id"],
+    ))
+    return ORJSONResponse(tickets)
+
+def _load_ticket(db: Session, ticket_id: int, branch_id: int):
+    ticket = db.query(KitchenTicket).filter(
+        KitchenTicket.id == ticket_id,
+        KitchenTicket.branch_id == branch_id
+    ).first()
+    if ticket is None:
+        raise HTTPException(status_code=404, detail="Ticket no encontrado")
+    # Los tickets de una orden se serializan sobre la fila de la orden: quien
+    # espera el lock relee su ticket y ve los que otra estación ya cerró
+    order = queries.get_order(db, ticket.order_id, branch_id, for_update=True)
+    db.refresh(ticket)
+    if order is None or order.status not in KITCHEN_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La orden del ticket ya no está en cocina"
+        )
+    return ticket, order
+
+def _ticket_response(db: Session, ticket: KitchenTicket, order: Order) -> dict:
+    items = db.execute(
+        select(*ITEM_COLUMNS).where(
+            OrderItem.branch_id == ticket.branch_id,
+            OrderItem.order_id == ticket.order_id,
+            OrderItem.station_id == ticket.station_id
+        ).order_by(OrderItem.id)
+    ).mappings()
+    return {
+        "id": ticket.id,
+        "order_id": ticket.order_id,
+        "station_id": ticket.station_id,
+        "status": ticket.status,
+        "table_id": order.table_id,
+        "is_takeaway": order.is_takeaway,
+        "notes": order.notes,
+        "created_at": ticket.created_at,
+        "started_at": ticket.started_at,
+        "items": [dict(item) for item in items],
+    }
+
+@router.post("/tickets/{ticket_id}/start", response_model=KitchenTicketSchema)
+async def start_station_ticket(
+    ticket_id: int,
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["cook"]))
+):
+    """Marcar un ticket como 'en preparación'; la orden pasa a preparación con el primero."""
+    ticket, order = _load_ticket(db, ticket_id, principal["branch_id"])
+    if ticket.status != TicketStatus.PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El ticket no está en estado pendiente"
+        )
+
+    start_ticket(db, ticket, order)
+    invalidate_on_commit(db, "orders")
+    open_orders.track_on_commit(db, order)
+    return _ticket_response(db, ticket, order)
+
+@router.post("/tickets/{ticket_id}/complete", response_model=KitchenTicketSchema)
+async def complete_station_ticket(
+    ticket_id: int,
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["cook"]))
+):
+    """Marcar un ticket como terminado; la orden queda lista con el último."""
+    ticket, order = _load_ticket(db, ticket_id, principal["branch_id"])
+    if ticket.status != TicketStatus.IN_PREPARATION:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El ticket no está en preparación"
+        )
+
+    complete_ticket(db, ticket, order)
+    invalidate_on_commit(db, "orders")
+    open_orders.track_on_commit(db, order)
+    return _ticket_response(db, ticket, order)
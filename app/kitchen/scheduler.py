@@ -0,0 +1,208 @@
+"""Cola de prioridad de la cocina, en memoria y por sucursal.
+
+Cada orden pendiente o en preparación recibe un puntaje fijo al entrar:
+
+    created_at + KITCHEN_PREP_WEIGHT * tiempo estimado - bonificaciones
+
+Menor puntaje sale primero. Como todas las órdenes envejecen al mismo ritmo,
+el orden relativo no cambia con el tiempo y no hace falta reordenar: un
+heap alcanza para la siguiente orden. Una orden grande queda detrás de las
+rápidas a lo sumo KITCHEN_PREP_WEIGHT veces su tiempo estimado, así que
+nunca se posterga indefinidamente.
+
+El estado se carga de la base la primera vez que se consulta una sucursal y
+después se actualiza al confirmar cada transición. Los cambios hechos por
+otros workers llegan por el bus de invalidación y fuerzan una recarga.
+
+Con el tiempo estimado de cada orden y el orden de la cola también se
+calcula cuándo va a estar lista cada una (etas), sin consultar la base.
+La cola ordenada se arma una vez y se reutiliza hasta la próxima transición.
+"""
+import heapq
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..cache import bus
+from ..database import run_after_commit
+from ..models import Order, OrderItem, OrderStatus, Product, Table
+from .estimates import Items, prep_times
+
+KITCHEN_STATUSES = (OrderStatus.PENDING, OrderStatus.IN_PREPARATION)
+
+# Peso del tiempo estimado frente al tiempo de espera
+PREP_WEIGHT = float(os.getenv("KITCHEN_PREP_WEIGHT", "0.5"))
+# Segundos de ventaja que se le dan a cada tipo de orden
+TAKEAWAY_BONUS = float(os.getenv("KITCHEN_TAKEAWAY_BONUS", "120"))
+VIP_BONUS = float(os.getenv("KITCHEN_VIP_BONUS", "300"))
+# Órdenes que la cocina prepara en paralelo, para calcular las ETAs
+COOKS = int(os.getenv("KITCHEN_COOKS", "1"))
+
+
+class _BranchQueue:
+    def __init__(self):
+        self.entries: Dict[int, Tuple[float, OrderStatus]] = {}
+        self.pending: List[Tuple[float, int]] = []  # heap (score, order_id)
+        self.prep_seconds: Dict[int, float] = {}
+        self.started_at: Dict[int, datetime] = {}
+        self._ranked: Optional[List[int]] = None
+
+    def put(self, order_id: int, score: float, status: OrderStatus) -> None:
+        self.entries[order_id] = (score, status)
+        self._ranked = None
+        if status == OrderStatus.PENDING:
+            heapq.heappush(self.pending, (score, order_id))
+
+    def remove(self, order_id: int) -> None:
+        self._ranked = None
+        self.entries.pop(order_id, None)
+        self.prep_seconds.pop(order_id, None)
+        self.started_at.pop(order_id, None)
+
+    def ranked(self) -> List[int]:
+        """Ids en preparación y luego pendientes, por puntaje; no modificar."""
+        if self._ranked is None:
+            entries = sorted((status != OrderStatus.IN_PREPARATION, score, order_id)
+                             for order_id, (score, status) in self.entries.items())
+            self._ranked = [order_id for _, _, order_id in entries]
+        return self._ranked
+
+    def is_current(self, score: float, order_id: int) -> bool:
+        return self.entries.get(order_id) == (score, OrderStatus.PENDING)
+
+    def compact(self) -> None:
+        # Las entradas que dejaron de estar pendientes se descartan al llegar
+        # al tope; si se acumulan demasiadas se reconstruye el heap
+        if len(self.pending) > 2 * len(self.entries) + 64:
+            self.pending = [entry for entry in self.pending if self.is_current(*entry)]
+            heapq.heapify(self.pending)
+
+
+class KitchenScheduler:
+    def __init__(self, estimator=prep_times.estimate):
+        self.estimator = estimator
+        self._branches: Dict[int, _BranchQueue] = {}
+
+    def reset(self) -> None:
+        """Descarta todo el estado; cada sucursal se recarga en la próxima consulta."""
+        self._branches = {}
+
+    def score(self, created_at: datetime, prep_seconds: float, is_takeaway: bool, is_vip: bool) -> float:
+        # created_at es UTC sin zona: timestamp() lo tomaría como hora local
+        score = created_at.replace(tzinfo=timezone.utc).timestamp() + PREP_WEIGHT * prep_seconds
+        if is_takeaway:
+            score -= TAKEAWAY_BONUS
+        if is_vip:
+            score -= VIP_BONUS
+        return score
+
+    def _queue(self, db: Session, branch_id: int) -> _BranchQueue:
+        queue = self._branches.get(branch_id)
+        if queue is None:
+            queue = self._load(db, branch_id)
+            self._branches[branch_id] = queue
+        return queue
+
+    def _load(self, db: Session, branch_id: int) -> _BranchQueue:
+        rows = db.execute(
+            select(Order.id, Order.created_at, Order.started_at, Order.status,
+                   Order.is_takeaway, Table.is_vip)
+            .outerjoin(Table, Table.id == Order.table_id)
+            .where(Order.branch_id == branch_id, Order.status.in_(KITCHEN_STATUSES))
+        ).all()
+        items = defaultdict(list)
+        if rows:
+            for order_id, product_id, category, quantity in db.execute(
+                select(OrderItem.order_id, OrderItem.product_id, Product.category, OrderItem.quantity)
+                .join(Product, Product.id == OrderItem.product_id)
+                .where(
+                    OrderItem.branch_id == branch_id,
+                    OrderItem.order_id.in_([row.id for row in rows])
+                )
+            ):
+                items[order_id].append((product_id, category, quantity))
+
+        queue = _BranchQueue()
+        for row in rows:
+            prep_seconds = self.estimator(items[row.id])
+            queue.put(row.id, self.score(row.created_at, prep_seconds, row.is_takeaway, row.is_vip), row.status)
+            queue.prep_seconds[row.id] = prep_seconds
+            if row.status == OrderStatus.IN_PREPARATION:
+                queue.started_at[row.id] = row.started_at
+        return queue
+
+    def ranked(self, db: Session, branch_id: int) -> List[int]:
+        """Ids de la cola: primero las órdenes en preparación, luego las pendientes."""
+        return self._queue(db, branch_id).ranked()
+
+    def next_pending(self, db: Session, branch_id: int) -> Optional[int]:
+        queue = self._queue(db, branch_id)
+        while queue.pending and not queue.is_current(*queue.pending[0]):
+            heapq.heappop(queue.pending)
+        return queue.pending[0][1] if queue.pending else None
+
+    def etas(self, db: Session, branch_id: int, now: Optional[datetime] = None) -> Dict[int, float]:
+        """Segundos hasta que cada orden de la cola esté lista.
+
+        Reparte la cola, en el orden del scheduler, entre COOKS preparaciones
+        simultáneas: cada orden toma al primero que se libera.
+        """
+        queue = self._queue(db, branch_id)
+        now = now or datetime.utcnow()
+        free_at = [0.0] * max(1, COOKS)
+        etas = {}
+        for order_id in self.ranked(db, branch_id):
+            remaining = queue.prep_seconds.get(order_id, 0.0)
+            started_at = queue.started_at.get(order_id)
+            if started_at is not None:
+                remaining = max(0.0, remaining - (now - started_at).total_seconds())
+            etas[order_id] = heapq.heappop(free_at) + remaining
+            heapq.heappush(free_at, etas[order_id])
+        return etas
+
+    def track(self, branch_id: int, order_id: int, created_at: datetime, items: Items,
+              is_takeaway: bool = False, is_vip: bool = False) -> None:
+        queue = self._branches.get(branch_id)
+        if queue is not None:
+            prep_seconds = self.estimator(items)
+            queue.put(order_id, self.score(created_at, prep_seconds, is_takeaway, is_vip), OrderStatus.PENDING)
+            queue.prep_seconds[order_id] = prep_seconds
+
+    def set_status(self, branch_id: int, order_id: int, status: OrderStatus,
+                   at: Optional[datetime] = None) -> None:
+        queue = self._branches.get(branch_id)
+        if queue is None:
+            return
+        entry = queue.entries.get(order_id)
+        if status not in KITCHEN_STATUSES:
+            queue.remove(order_id)
+            queue.compact()
+        elif entry is None:
+            # Vuelve a la cocina una orden que no tenemos: se recarga la sucursal
+            self._branches.pop(branch_id, None)
+        elif entry[1] != status:
+            queue.put(order_id, entry[0], status)
+            if status == OrderStatus.IN_PREPARATION:
+                queue.started_at[order_id] = at or datetime.utcnow()
+            else:
+                queue.started_at.pop(order_id, None)
+
+    def track_on_commit(self, db: Session, order: Order, items: Items, is_vip: bool) -> None:
+        values = (order.branch_id, order.id, order.created_at, list(items), order.is_takeaway, is_vip)
+        run_after_commit(db, lambda: self.track(*values))
+
+    def set_status_on_commit(self, db: Session, order: Order) -> None:
+        values = (order.branch_id, order.id, order.status)
+        run_after_commit(db, lambda: self.set_status(*values))
+
+    def on_remote_change(self, entities: Optional[set]) -> None:
+        if entities is None or "orders" in entities:
+            self.reset()
+
+
+kitchen_scheduler = KitchenScheduler()
+bus.subscribe(kitchen_scheduler.on_remote_change)
@@ -0,0 +1,56 @@
+from pydantic import BaseModel, constr
+from typing import List, Optional
+from datetime import datetime
+from enum import Enum
+
+from ..orders.schemas import OrderItem
+
+class TicketStatus(str, Enum):
+    PENDING = 'pending'
+    IN_PREPARATION = 'in_preparation'
+    DONE = 'done'
+
+class StationBase(BaseModel):
+    name: constr(strip_whitespace=True, min_length=1, max_length=50)
+    categories: List[constr(strip_whitespace=True, min_length=1, max_length=50)] = []
+    is_default: bool = False  # Recibe los items de categorías sin estación
+
+class StationCreate(StationBase):
+    pass
+
+class StationUpdate(BaseModel):
+    name: Optional[constr(strip_whitespace=True, min_length=1, max_length=50)] = None
+    categories: Optional[List[constr(strip_whitespace=True, min_length=1, max_length=50)]] = None
+    is_default: Optional[bool] = None
+    is_active: Optional[bool] = None
+
+class Station(StationBase):
+    id: int
+    is_active: bool
+    created_at: datetime
+
+class KitchenLiveMetrics(BaseModel):
+    window_minutes: int
+    orders_in: int
+    orders_out: int  # Órdenes que quedaron listas
+    orders_in_per_minute: float
+    orders_out_per_minute: float
+    backlog: int  # Pendientes y en preparación
+    wait_p50_seconds: Optional[float]  # Desde que se crea hasta que empieza la preparación
+    wait_p90_seconds: Optional[float]
+    ready_p90_seconds: Optional[float]  # Desde que se crea hasta que queda lista
+
+class KitchenTicket(BaseModel):
+    id: int
+    order_id: int
+    station_id: int
+    status: TicketStatus
+    table_id: int
+    is_takeaway: bool = False
+    notes: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    items: List[OrderItem]  # Solo los de la estación
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,121 @@
+"""Ruteo de las órdenes a las estaciones de la cocina.
+
+Al crear una orden cada item se asigna a la estación de su categoría (o a la
+estación por defecto) y se crea un ticket por estación. Cada pantalla lee
+solo sus tickets. La orden pasa a IN_PREPARATION con el primer ticket
+empezado y a READY cuando se completa el último.
+
+Una sucursal sin estaciones sigue trabajando con la orden completa.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import exists, select, update
+from sqlalchemy.orm import Session
+
+from ..cache import LocalCache
+from ..models import KitchenTicket, Order, OrderItem, OrderStatus, Product, Station, StationCategory, TicketStatus
+from .estimates import prep_times
+from .metrics import kitchen_metrics
+from .scheduler import kitchen_scheduler
+
+# (estación de cada categoría, estación por defecto) por sucursal
+routing_cache = LocalCache("station_routing", depends_on=["stations"])
+
+Routing = Tuple[Dict[str, int], int]
+
+
+def _load_routing(db: Session, branch_id: int) -> Optional[Routing]:
+    stations = db.execute(
+        select(Station.id, Station.is_default)
+        .where(Station.branch_id == branch_id, Station.is_active == True)
+        .order_by(Station.is_default.desc(), Station.id)
+    ).all()
+    if not stations:
+        return None
+    active = {station.id for station in stations}
+    categories = {
+        category: station_id
+        for category, station_id in db.execute(
+            select(StationCategory.category, StationCategory.station_id)
+            .where(StationCategory.branch_id == branch_id)
+        )
+        if station_id in active
+    }
+    return categories, stations[0].id
+
+
+def station_routing(db: Session, branch_id: int) -> Optional[Routing]:
+    return routing_cache.get_or_load(branch_id, lambda: _load_routing(db, branch_id))
+
+
+def route_to_stations(db: Session, order: Order, items: Iterable[Tuple[OrderItem, str]]) -> None:
+    """Asigna cada (item, categoría) a una estación y crea los tickets de la orden."""
+    routing = station_routing(db, order.branch_id)
+    if routing is None:
+        return
+    categories, default = routing
+    stations = set()
+    for item, category in items:
+        item.station_id = categories.get(category, default)
+        stations.add(item.station_id)
+    for station_id in sorted(stations):
+        db.add(KitchenTicket(
+            branch_id=order.branch_id,
+            order_id=order.id,
+            station_id=station_id,
+            status=TicketStatus.PENDING,
+            created_at=order.created_at
+        ))
+
+
+def start_ticket(db: Session, ticket: KitchenTicket, order: Order) -> None:
+    ticket.status = TicketStatus.IN_PREPARATION
+    ticket.started_at = datetime.utcnow()
+    if order.status == OrderStatus.PENDING:
+        order.status = OrderStatus.IN_PREPARATION
+        order.started_at = ticket.started_at
+        kitchen_scheduler.set_status_on_commit(db, order)
+        kitchen_metrics.transition_on_commit(db, order)
+
+
+def complete_ticket(db: Session, ticket: KitchenTicket, order: Order) -> None:
+    """Completa el ticket y, si era el último de la orden, la marca como lista."""
+    now = datetime.utcnow()
+    ticket.status = TicketStatus.DONE
+    ticket.completed_at = now
+    # Siempre se escribe la orden: con version_id_col dos estaciones que
+    # cierran sus últimos tickets a la vez chocan (409) en lugar de dejarla
+    # en preparación con todos los tickets terminados
+    order.updated_at = now
+    if ticket.started_at is not None:
+        items = db.execute(
+            select(OrderItem.product_id, Product.category, OrderItem.quantity)
+            .join(Product, Product.id == OrderItem.product_id)
+            .where(
+                OrderItem.order_id == order.id,
+                OrderItem.branch_id == order.branch_id,
+                OrderItem.station_id == ticket.station_id
+            )
+        ).all()
+        prep_times.observe_on_commit(db, items, (now - ticket.started_at).total_seconds())
+
+    pending = db.execute(select(exists().where(
+        KitchenTicket.order_id == order.id,
+        KitchenTicket.id != ticket.id,
+        KitchenTicket.status != TicketStatus.DONE
+    ))).scalar()
+    if not pending and order.status in (OrderStatus.PENDING, OrderStatus.IN_PREPARATION):
+        order.status = OrderStatus.READY
+        kitchen_scheduler.set_status_on_commit(db, order)
+        kitchen_metrics.transition_on_commit(db, order)
+
+
+def complete_order_tickets(db: Session, order: Order) -> None:
+    """Cierra los tickets abiertos de una orden que se completó entera."""
+    db.execute(
+        update(KitchenTicket)
+        .where(KitchenTicket.order_id == order.id, KitchenTicket.status != TicketStatus.DONE)
+        .values(status=TicketStatus.DONE, completed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
@@ -1,12 +1,38 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm.exc import StaleDataError
+from .admission import AdmissionMiddleware, admission
+from .background import job_runner
+from .cache import bus as cache_bus
+from .database import engine
+from .orders import intake
+from .auth.middleware import check_permissions
 from .auth.router import router as auth_router
+from .branches.router import router as branches_router
 from .tables.router import router as tables_router
 from .products.router import router as products_router
 from .orders.router import router as orders_router
 from .kitchen.router import router as kitchen_router
+from .reports.router import router as reports_router
+from .sync.router import router as sync_router
 
-app = FastAPI(title="Café System API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    cache_bus.start(engine)
+    await job_runner.start()
+    if intake.ENABLED:
+        await intake.order_intake.start()
+    yield
+    await intake.order_intake.stop()
+    await job_runner.stop()
+    cache_bus.stop()
+
+app = FastAPI(title="Café System API", lifespan=lifespan)
+
+# Queda por dentro de CORS para que los rechazos también lleven sus headers
+app.add_middleware(AdmissionMiddleware, controller=admission)
 
 # Configuración de CORS
 app.add_middleware(
@@ -17,13 +43,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request: Request, exc: StaleDataError):
+    # El UPDATE con WHERE version = ... no encontró la fila: otra request la
+    # modificó entre la lectura y la escritura (ver app/conditional.check_version)
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": "El recurso fue modificado por otro usuario, volver a cargarlo"}
+    )
+
 # Incluir routers
 app.include_router(auth_router)
+app.include_router(branches_router)
 app.include_router(tables_router)
 app.include_router(products_router)
 app.include_router(orders_router)
 app.include_router(kitchen_router)
+app.include_router(reports_router)
+app.include_router(sync_router)
 
 @app.get("/")
 async def root():
     return {"message": "Café System API"}
+
+@app.get("/metrics/jobs")
+async def jobs_metrics(_=Depends(check_permissions(["admin"]))):
+    """Métricas de la cola de trabajos de fondo."""
+    return job_runner.metrics()
+
+@app.get("/metrics/intake")
+async def intake_metrics(_=Depends(check_permissions(["admin"]))):
+    """Métricas del ingreso de órdenes en lote."""
+    return intake.order_intake.metrics()
+
+@app.get("/metrics/admission")
+async def admission_metrics(_=Depends(check_permissions(["admin"]))):
+    """Métricas del control de admisión."""
+    return admission.metrics()
@@ -0,0 +1,46 @@
+"""Tareas de mantenimiento de particiones, pensadas para correr con cron.
+
+    python -m app.maintenance create-partitions --months 3
+    python -m app.maintenance archive --older-than 12
+"""
+import argparse
+from datetime import datetime
+
+from .cache import invalidate_on_commit
+from .database import SessionLocal
+from .partitions import MONTHS_AHEAD, add_months, archive_closed_orders, ensure_future_partitions, month_start
+
+# Meses que se conservan en las tablas vivas antes de archivar
+ARCHIVE_AFTER_MONTHS = 12
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser("create-partitions", help="Crear las particiones de los próximos meses")
+    create.add_argument("--months", type=int, default=MONTHS_AHEAD)
+
+    archive = commands.add_parser("archive", help="Archivar los meses viejos sin órdenes abiertas")
+    archive.add_argument("--older-than", type=int, default=ARCHIVE_AFTER_MONTHS,
+                         help="Antigüedad mínima en meses")
+
+    args = parser.parse_args(argv)
+    with SessionLocal() as db:
+        if args.command == "create-partitions":
+            result = ensure_future_partitions(db, args.months)
+            label = "Particiones creadas"
+        else:
+            before = add_months(month_start(datetime.utcnow()), -args.older_than)
+            result = archive_closed_orders(db, before)
+            # Los workers descartan sus órdenes abiertas en memoria
+            invalidate_on_commit(db, "orders")
+            label = f"Archivado anterior a {before.isoformat()}"
+        db.commit()
+    print(f"{label}: {len(result)}")
+    for name in result:
+        print(f"  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Enum, DECIMAL
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Text, Enum, DECIMAL, Index, UniqueConstraint
+from sqlalchemy import Table as DbTable
 from sqlalchemy.orm import relationship
 import enum
 from .database import Base
@@ -16,6 +17,11 @@ class OrderStatus(str, enum.Enum):
     DELIVERED = 'delivered'
     CANCELLED = 'cancelled'
 
+class TicketStatus(str, enum.Enum):
+    PENDING = 'pending'
+    IN_PREPARATION = 'in_preparation'
+    DONE = 'done'
+
 class PaymentStatus(str, enum.Enum):
     PENDING = 'pending'
     COMPLETED = 'completed'
@@ -35,10 +41,28 @@ class UserRole(str, enum.Enum):
 # Definiciones de ENUM como strings para PostgreSQL
 table_status = Enum(TableStatus)
 order_status = Enum(OrderStatus)
+ticket_status = Enum(TicketStatus)
 payment_status = Enum(PaymentStatus)
 payment_method = Enum(PaymentMethod)
 user_role = Enum(UserRole)
 
+# Sucursal que se asume para datos y tokens anteriores a la multi-sucursal
+DEFAULT_BRANCH_ID = 1
+
+def branch_column():
+    return Column(
+        Integer, ForeignKey('branches.id'), nullable=False,
+        default=DEFAULT_BRANCH_ID, index=True
+    )
+
+class Branch(Base):
+    __tablename__ = 'branches'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), unique=True, nullable=False)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class User(Base):
     __tablename__ = 'users'
 
@@ -46,6 +70,7 @@ class User(Base):
     username = Column(String(50), unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
     role = Column(user_role, nullable=False)
+    branch_id = branch_column()
     created_at = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=True)
     last_login = Column(DateTime)
@@ -56,17 +81,24 @@ class Table(Base):
     __tablename__ = 'tables'
 
     id = Column(Integer, primary_key=True)
+    branch_id = branch_column()
     status = Column(table_status, default=TableStatus.FREE)
     capacity = Column(Integer, nullable=False)
     is_active = Column(Boolean, default=True)
+    is_vip = Column(Boolean, default=False)  # Prioridad en la cola de cocina
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    version = Column(Integer, nullable=False, default=1)  # Se incrementa en cada UPDATE
 
     orders = relationship("Order", back_populates="table")
 
+    __mapper_args__ = {"version_id_col": version}
+
 class Product(Base):
     __tablename__ = 'products'
 
     id = Column(Integer, primary_key=True)
+    branch_id = branch_column()
     name = Column(String(100), nullable=False)
     price = Column(DECIMAL(10, 2), nullable=False)
     category = Column(String(50), nullable=False)
@@ -74,47 +106,162 @@ class Product(Base):
     is_active = Column(Boolean, default=True)
     description = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     order_items = relationship("OrderItem", back_populates="product")
 
+    # Índices de trigramas para /products/search (en SQLite quedan como índices comunes)
+    # y la clave de la importación CSV: nombre + categoría dentro de la sucursal
+    __table_args__ = tuple(
+        Index(f'ix_products_{column}_trgm', column,
+              postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+        for column in ('name', 'category', 'description')
+    ) + (
+        Index('ix_products_branch_name_category', 'branch_id', 'name', 'category', unique=True),
+    )
+
+class StockAdjustment(Base):
+    """Ajuste de stock registrado por el conteo de inventario (PATCH /products/stock)."""
+    __tablename__ = 'stock_adjustments'
+
+    id = Column(Integer, primary_key=True)
+    branch_id = branch_column()
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'))
+    previous_stock = Column(Integer, nullable=False)
+    new_stock = Column(Integer, nullable=False)
+    reason = Column(String(255))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Order(Base):
+    """Orden. En PostgreSQL la tabla está particionada por lista de branch_id y
+    cada sucursal por mes de created_at (ver app/partitions.py), por lo que su
+    clave primaria real es (id, branch_id, created_at)."""
     __tablename__ = 'orders'
 
     id = Column(Integer, primary_key=True)
+    branch_id = branch_column()
     table_id = Column(Integer, ForeignKey('tables.id'))
     user_id = Column(Integer, ForeignKey('users.id'))
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     status = Column(order_status, default=OrderStatus.PENDING)
     total_amount = Column(DECIMAL(10, 2), default=0)
     payment_status = Column(payment_status, default=PaymentStatus.PENDING)
     notes = Column(Text)
-
+    client_ref = Column(String(64))  # Id generado por el POS para órdenes offline
+    is_takeaway = Column(Boolean, default=False)
+    started_at = Column(DateTime)  # Inicio de la preparación en cocina
+    version = Column(Integer, nullable=False, default=1)  # Se incrementa en cada UPDATE
 
     table = relationship("Table", back_populates="orders")
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
     payments = relationship("Payment", back_populates="order")
 
+    # Índices de /orders/search: rango de fechas solo, por mesa o por usuario,
+    # con las columnas filtrables incluidas (en SQLite INCLUDE se ignora)
+    __table_args__ = (
+        UniqueConstraint('client_ref', 'branch_id'),
+        Index('ix_orders_search_created_at', 'created_at',
+              postgresql_include=['table_id', 'user_id', 'status', 'payment_status', 'total_amount']),
+        Index('ix_orders_search_table_id', 'table_id', 'created_at',
+              postgresql_include=['user_id', 'status', 'payment_status', 'total_amount']),
+        Index('ix_orders_search_user_id', 'user_id', 'created_at',
+              postgresql_include=['table_id', 'status', 'payment_status', 'total_amount']),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+class OrderClientRef(Base):
+    """client_ref ya recibidos por sucursal (POST /sync/orders).
+
+    Con orders particionada por mes la restricción única de orders incluye
+    created_at y no impide repetir un client_ref; esta tabla sin particionar
+    es la que garantiza que una orden offline se aplique una sola vez.
+    """
+    __tablename__ = 'order_client_refs'
+
+    branch_id = Column(Integer, ForeignKey('branches.id'), primary_key=True)
+    client_ref = Column(String(64), primary_key=True)
+    order_id = Column(Integer, nullable=False)  # Sin FK: orders está particionada
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class OrderItem(Base):
+    """Item de una orden, particionado igual que orders. created_at es el de
+    la orden para que ambos queden en el mismo mes."""
     __tablename__ = 'order_items'
 
     id = Column(Integer, primary_key=True)
+    branch_id = branch_column()
     order_id = Column(Integer, ForeignKey('orders.id', ondelete='CASCADE'))
     product_id = Column(Integer, ForeignKey('products.id'))
     quantity = Column(Integer, nullable=False)
     unit_price = Column(DECIMAL(10, 2), nullable=False)
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    station_id = Column(Integer, ForeignKey('stations.id'))  # Estación que lo prepara, si hay
 
     order = relationship("Order", back_populates="items")
     product = relationship("Product", back_populates="order_items")
 
+class Station(Base):
+    """Estación de la cocina (barra, parrilla, ...). Prepara los items de sus
+    categorías; la estación por defecto recibe además los que no tienen una."""
+    __tablename__ = 'stations'
+
+    id = Column(Integer, primary_key=True)
+    branch_id = branch_column()
+    name = Column(String(50), nullable=False)
+    is_default = Column(Boolean, default=False)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class StationCategory(Base):
+    """Categoría de producto asignada a una estación (una por sucursal)."""
+    __tablename__ = 'station_categories'
+
+    branch_id = Column(Integer, ForeignKey('branches.id'), primary_key=True)
+    category = Column(String(50), primary_key=True)
+    station_id = Column(Integer, ForeignKey('stations.id'), nullable=False, index=True)
+
+class KitchenTicket(Base):
+    """Parte de una orden que prepara una estación: los items de la orden con
+    el mismo station_id. La orden queda lista cuando todos sus tickets lo están.
+
+    order_id no tiene FK porque orders está particionada; created_at es el de
+    la orden, para archivar los tickets junto con ella."""
+    __tablename__ = 'kitchen_tickets'
+
+    id = Column(Integer, primary_key=True)
+    branch_id = branch_column()
+    order_id = Column(Integer, nullable=False, index=True)
+    station_id = Column(Integer, ForeignKey('stations.id'), nullable=False)
+    status = Column(ticket_status, default=TicketStatus.PENDING)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+
+    __table_args__ = (
+        UniqueConstraint('order_id', 'station_id'),
+        Index('ix_kitchen_tickets_station_id_status', 'station_id', 'status'),
+    )
+
+def archive_table(name: str, model) -> DbTable:
+    """Tabla de archivo con las mismas columnas que model, sin FKs."""
+    return DbTable(name, Base.metadata, *[
+        Column(c.name, c.type, primary_key=c.primary_key, index=c.name == 'created_at')
+        for c in model.__table__.columns
+    ])
+
+# Meses archivados de orders y order_items (ver app/partitions.py)
+orders_archive = archive_table('orders_archive', Order)
+order_items_archive = archive_table('order_items_archive', OrderItem)
+
 class Payment(Base):
     __tablename__ = 'payments'
 
     id = Column(Integer, primary_key=True)
+    branch_id = branch_column()
     order_id = Column(Integer, ForeignKey('orders.id'))
     method = Column(payment_method, nullable=False)
     amount = Column(DECIMAL(10, 2), nullable=False)
@@ -123,3 +270,25 @@ class Payment(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     order = relationship("Order", back_populates="payments")
+
+class SalesHourlyProduct(Base):
+    """Ventas agregadas por hora y producto (se actualiza al entregar/cancelar órdenes)."""
+    __tablename__ = 'sales_hourly_product'
+
+    branch_id = Column(Integer, ForeignKey('branches.id'), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # Inicio de la hora
+    product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(12, 2), nullable=False, default=0)
+    order_count = Column(Integer, nullable=False, default=0)
+
+class SalesDailyCategory(Base):
+    """Ventas agregadas por día y categoría."""
+    __tablename__ = 'sales_daily_category'
+
+    branch_id = Column(Integer, ForeignKey('branches.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    category = Column(String(50), primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(12, 2), nullable=False, default=0)
+    order_count = Column(Integer, nullable=False, default=0)
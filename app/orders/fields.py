@@ -0,0 +1,47 @@
+"""Campos parciales (fields=) y vistas (view=) de los listados de órdenes.
+
+Cada listado define su vista resumida con los campos que usa su pantalla;
+fields= permite pedir cualquier combinación. Los campos que no se piden no se
+seleccionan ni se serializan, y sin items no se consulta order_items.
+"""
+from typing import Callable, Optional, Tuple
+
+from fastapi import HTTPException, Query, status
+
+from .reads import ORDER_FIELDS
+from .schemas import OrderView
+
+Fields = Optional[Tuple[str, ...]]  # None: todos los campos
+
+
+def order_fields(summary: Tuple[str, ...]) -> Callable:
+    """Crea la dependencia que resuelve los campos a devolver.
+
+    fields tiene prioridad sobre view. id se incluye siempre.
+    """
+    async def resolve_fields(
+        fields: Optional[str] = Query(None, description="Campos a devolver, separados por coma"),
+        view: OrderView = Query(OrderView.FULL, description="Vista resumida o completa"),
+    ) -> Fields:
+        if fields:
+            requested = {name.strip() for name in fields.split(",") if name.strip()}
+            unknown = requested - set(ORDER_FIELDS)
+            if unknown:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Campos desconocidos: {', '.join(sorted(unknown))}"
+                )
+        elif view == OrderView.SUMMARY:
+            requested = set(summary)
+        else:
+            return None
+        return tuple(name for name in ORDER_FIELDS if name == "id" or name in requested)
+
+    return resolve_fields
+
+
+def project(order: dict, fields: Fields) -> dict:
+    """Recorta una orden ya armada (por ejemplo, de memoria) a los campos pedidos."""
+    if fields is None:
+        return order
+    return {name: order[name] for name in fields}
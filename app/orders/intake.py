@@ -0,0 +1,179 @@
+"""Ingreso de órdenes con group commit.
+
+Con ORDER_INTAKE_BATCHING activado, POST /orders no escribe en la sesión
+del request: encola la orden y espera. Una única tarea escritora junta lo
+que llega en una ventana corta (ORDER_INTAKE_WINDOW_MS, o hasta
+ORDER_INTAKE_MAX_BATCH órdenes) y lo confirma en una sola transacción, con
+un savepoint por orden para que una inválida no arrastre a las demás. Así
+el costo del commit (fsync) se reparte entre todas las órdenes del lote.
+
+Sin la tarea corriendo (desactivado, o en los tests donde no corre el
+lifespan) el router crea la orden en línea como siempre.
+"""
+import asyncio
+import logging
+import os
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+
+from ..database import SessionLocal, run_after_commit_on
+from .schemas import Order as OrderSchema, OrderCreate
+from .service import place_order
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("ORDER_INTAKE_BATCHING", "false").lower() in ("1", "true", "yes")
+MAX_BATCH = int(os.getenv("ORDER_INTAKE_MAX_BATCH", "50"))
+WINDOW = float(os.getenv("ORDER_INTAKE_WINDOW_MS", "5")) / 1000
+QUEUE_SIZE = int(os.getenv("ORDER_INTAKE_QUEUE", "1000"))
+
+
+class OrderIntake:
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        max_batch: int = MAX_BATCH,
+        window: float = WINDOW,
+        maxsize: int = QUEUE_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.window = window
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._task = None
+        self._metrics = {
+            "submitted": 0,
+            "created": 0,
+            "rejected": 0,
+            "failed": 0,
+            "dropped": 0,
+            "batches": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def metrics(self) -> dict:
+        return {
+            **self._metrics,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._task = asyncio.create_task(self._worker())
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Confirma las órdenes ya encoladas antes de terminar."""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Se canceló el ingreso de órdenes sin terminar: %s", self.metrics())
+            self._task.cancel()
+        self._task = None
+
+    async def submit(self, order: OrderCreate, user_id: int, branch_id: int) -> dict:
+        """Encola la orden y devuelve su representación una vez confirmada.
+
+        Lanza la HTTPException de validación de place_order, o 503 si la cola
+        está llena.
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((order, user_id, branch_id, future))
+        except asyncio.QueueFull:
+            self._metrics["dropped"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servicio saturado, reintentar más tarde",
+                headers={"Retry-After": "1"}
+            )
+        self._metrics["submitted"] += 1
+        return await future
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), max(0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+
+            try:
+                outcomes = await asyncio.to_thread(self._run, [entry[:3] for entry in batch], loop)
+            except Exception as e:
+                logger.exception("Falló el lote de órdenes")
+                outcomes = [HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))] * len(batch)
+            self._metrics["batches"] += 1
+            for (*_, future), outcome in zip(batch, outcomes):
+                if future.done():  # El cliente se desconectó
+                    continue
+                if isinstance(outcome, Exception):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+
+    def _run(self, requests, loop=None) -> List[object]:
+        """Crea las órdenes del lote en una transacción; devuelve dict o excepción por orden.
+
+        Los callbacks de run_after_commit (store, cocina, métricas, caches)
+        corren en loop después del commit del lote, nunca en este hilo.
+        """
+        outcomes = []
+        with self.session_factory() as db:
+            if loop is not None:
+                run_after_commit_on(db, loop)
+            for order, user_id, branch_id in requests:
+                savepoint = db.begin_nested()
+                try:
+                    db_order = place_order(db, order, user_id, branch_id)
+                    savepoint.commit()
+                except HTTPException as e:
+                    savepoint.rollback()
+                    self._metrics["rejected"] += 1
+                    outcomes.append(e)
+                    continue
+                except Exception as e:
+                    savepoint.rollback()
+                    logger.exception("No se pudo crear una orden del lote")
+                    self._metrics["failed"] += 1
+                    outcomes.append(HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+                    ))
+                    continue
+                outcomes.append(OrderSchema.from_orm(db_order).dict())
+
+            created = sum(not isinstance(outcome, Exception) for outcome in outcomes)
+            try:
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.exception("No se pudo confirmar el lote de órdenes")
+                self._metrics["failed"] += created
+                error = HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+                return [error if not isinstance(outcome, Exception) else outcome for outcome in outcomes]
+        self._metrics["created"] += created
+        return outcomes
+
+
+order_intake = OrderIntake()
@@ -0,0 +1,90 @@
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from ..conditional import weak_etag
+from ..models import Order, OrderItem, OrderStatus, PaymentStatus
+
+# Estados en los que una orden sigue "abierta" en la mesa (además de las
+# entregadas que aún no se pagaron)
+OPEN_ORDER_STATUSES = (OrderStatus.PENDING, OrderStatus.IN_PREPARATION, OrderStatus.READY)
+
+# Columnas que expone el esquema Order (sin pasar por el ORM)
+ORDER_COLUMNS = (
+    Order.id,
+    Order.table_id,
+    Order.user_id,
+    Order.status,
+    Order.total_amount,
+    Order.payment_status,
+    Order.notes,
+    Order.is_takeaway,
+    Order.created_at,
+    Order.version,
+)
+
+# Campos que se pueden pedir con fields= (ver fields.order_fields)
+ORDER_FIELDS = tuple(column.key for column in ORDER_COLUMNS) + ("items",)
+
+ITEM_COLUMNS = (
+    OrderItem.id,
+    OrderItem.order_id,
+    OrderItem.product_id,
+    OrderItem.quantity,
+    OrderItem.notes,
+    OrderItem.unit_price,
+    OrderItem.created_at,
+)
+
+
+def order_etag(order_id: int, version: int) -> str:
+    return weak_etag("order", order_id, version)
+
+
+def open_orders_clause():
+    """Condición SQL de orden abierta: sin terminar o entregada sin pagar."""
+    return or_(
+        Order.status.in_(OPEN_ORDER_STATUSES),
+        and_(
+            Order.status == OrderStatus.DELIVERED,
+            Order.payment_status != PaymentStatus.COMPLETED,
+        ),
+    )
+
+
+def select_orders(*criteria, fields: Optional[Tuple[str, ...]] = None):
+    """Select de las columnas de órdenes para usar con fetch_orders.
+
+    Con fields se seleccionan solo esas columnas (id tiene que estar incluido).
+    """
+    columns = ORDER_COLUMNS if fields is None else [column for column in ORDER_COLUMNS if column.key in fields]
+    return select(*columns).where(*criteria)
+
+
+def fetch_orders(db: Session, query, branch_id: Optional[int] = None, items: bool = True) -> List[dict]:
+    """Ejecuta un select de órdenes y devuelve dicts con la forma del esquema Order.
+
+    Los items se cargan en una sola consulta adicional para todas las órdenes;
+    con branch_id esa consulta se limita a la partición de la sucursal. Con
+    items=False no se cargan.
+    """
+    orders = [dict(row) for row in db.execute(query).mappings()]
+    if not orders or not items:
+        return orders
+
+    items_by_order = defaultdict(list)
+    items_query = select(*ITEM_COLUMNS).where(
+        OrderItem.order_id.in_([order["id"] for order in orders])
+    )
+    if branch_id is not None:
+        items_query = items_query.where(OrderItem.branch_id == branch_id)
+    items = db.execute(items_query.order_by(OrderItem.id)).mappings()
+    for item in items:
+        item = dict(item)
+        items_by_order[item.pop("order_id")].append(item)
+
+    for order in orders:
+        order["items"] = items_by_order[order["id"]]
+    return orders
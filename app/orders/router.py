@@ -1,19 +1,113 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Response
+from fastapi.responses import StreamingResponse
+from pydantic import condecimal
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from sqlalchemy import and_
+from sqlalchemy import and_, select
+from datetime import date, datetime, time, timedelta
+import csv
+import io
+import json
 
+from .. import queries
 from ..database import get_db
 from ..models import Order, OrderItem, Product, Table
-from .schemas import OrderCreate, Order as OrderSchema, OrderUpdate, OrderStatus
+from .schemas import (
+    OrderCreate, Order as OrderSchema, OrderEta, OrderSearchResult, OrderUpdate, OrderStatus, PartialOrder, PaymentStatus,
+    ExportFormat,
+)
 from ..auth.middleware import check_permissions
 from ..auth.router import get_current_user
+from ..reports import rollups
+from ..cache import invalidate_on_commit
+from ..kitchen.metrics import kitchen_metrics
+from ..kitchen.scheduler import KITCHEN_STATUSES, kitchen_scheduler
+from ..responses import ORJSONResponse
+from ..conditional import check_version, is_not_modified, not_modified, validator_headers
+from .fields import Fields, order_fields
+from .reads import fetch_orders, order_etag, select_orders
+from .intake import order_intake
+from .search import count_orders, search_criteria
+from .service import place_order
+from .store import open_orders
 
 router = APIRouter(
     prefix="/orders",
     tags=["orders"]
 )
 
+# Lo que necesita el listado de caja: sin items ni notas
+LIST_SUMMARY_FIELDS = (
+    "table_id", "user_id", "status", "total_amount", "payment_status", "is_takeaway", "created_at", "version"
+)
+
+# Filas que el cursor del servidor trae por cada viaje a la base
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    Order.id.label("order_id"),
+    Order.created_at,
+    Order.table_id,
+    Order.user_id,
+    Order.status,
+    Order.payment_status,
+    Order.total_amount,
+    OrderItem.id.label("item_id"),
+    OrderItem.product_id,
+    Product.name.label("product_name"),
+    OrderItem.quantity,
+    OrderItem.unit_price,
+]
+
+def _export_value(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, "value"):  # Enums
+        return value.value
+    if isinstance(value, (int, str)):
+        return value
+    return str(value)  # Decimal
+
+def _export_chunks(bind, branch_id: int, start: datetime, end: datetime, export_format: ExportFormat):
+    """Genera el export por bloques usando un cursor del lado del servidor.
+
+    Abre su propia sesión porque la de la request se cierra antes de que
+    empiece el streaming de la respuesta.
+    """
+    query = (
+        select(*EXPORT_COLUMNS)
+        .outerjoin(OrderItem, (OrderItem.order_id == Order.id) & (OrderItem.branch_id == branch_id))
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .where(Order.branch_id == branch_id, Order.created_at >= start, Order.created_at < end)
+        .order_by(Order.id, OrderItem.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    header = [column.key for column in EXPORT_COLUMNS]
+
+    with Session(bind) as session:
+        result = session.execute(query)
+        if export_format == ExportFormat.CSV:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            # El encabezado sale aunque el rango no tenga órdenes
+            writer.writerow(header)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            for rows in result.partitions():
+                writer.writerows([_export_value(value) for value in row] for row in rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        else:
+            for rows in result.partitions():
+                yield "".join(
+                    json.dumps(dict(zip(header, map(_export_value, row)))) + "\n"
+                    for row in rows
+                )
+
 @router.post("/", response_model=OrderSchema, status_code=status.HTTP_201_CREATED)
 async def create_order(
     order: OrderCreate,
@@ -21,64 +115,14 @@ async def create_order(
     current_user = Depends(get_current_user)
 ):
     """Crear una nueva orden."""
-    # Verificar que la mesa existe y está disponible
-    table = db.query(Table).filter(Table.id == order.table_id).first()
-    if not table:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Mesa no encontrada"
-        )
-    if table.status != "free":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Mesa no disponible"
-        )
+    if order_intake.running:
+        return await order_intake.submit(order, current_user.id, current_user.branch_id)
 
-    # Verificar que todos los productos existen y tienen stock
-    for item in order.items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if not product:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Producto {item.product_id} no encontrado"
-            )
-        if product.stock < item.quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Stock insuficiente para el producto {product.name}"
-            )
-
-    # Crear la orden
-    db_order = Order(
-        table_id=order.table_id,
-        user_id=current_user.id,
-        status=OrderStatus.PENDING,
-        notes=order.notes
-    )
-    db.add(db_order)
-    db.flush()  # Para obtener el ID de la orden
-
-    # Crear los items y actualizar stock
-    for item in order.items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        order_item = OrderItem(
-            order_id=db_order.id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            unit_price=product.price,
-            notes=item.notes
-        )
-        db.add(order_item)
-        product.stock -= item.quantity
-
-    # Actualizar estado de la mesa
-    table.status = "occupied"
+    db_order = place_order(db, order, current_user.id, current_user.branch_id)
 
     try:
-        db.commit()
-        db.refresh(db_order)
+        db.flush()
     except Exception as e:
-        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -86,78 +130,232 @@ async def create_order(
 
     return db_order
 
-@router.get("/", response_model=List[OrderSchema])
+@router.get("/", response_model=List[PartialOrder], response_class=ORJSONResponse)
 async def get_orders(
     status: Optional[OrderStatus] = Query(None, description="Filtrar por estado"),
     skip: int = 0,
     limit: int = 100,
+    fields: Fields = Depends(order_fields(LIST_SUMMARY_FIELDS)),
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin", "cashier", "cook"]))
+    principal=Depends(check_permissions(["admin", "cashier", "cook"]))
 ):
-    """Obtener todas las órdenes con filtros opcionales."""
-    query = db.query(Order)
+    """Obtener todas las órdenes con filtros opcionales (soporta fields= y view=summary)."""
+    branch_id = principal["branch_id"]
+    query = select_orders(Order.branch_id == branch_id, fields=fields)
 
     if status:
-        query = query.filter(Order.status == status)
+        query = query.where(Order.status == status)
+
+    orders = fetch_orders(
+        db, query.order_by(Order.id).offset(skip).limit(limit), branch_id,
+        items=fields is None or "items" in fields
+    )
+    return ORJSONResponse(orders)
+
+@router.get("/export")
+async def export_orders(
+    from_date: date = Query(..., alias="from", description="Fecha inicial (inclusive)"),
+    to_date: date = Query(..., alias="to", description="Fecha final (inclusive)"),
+    format: ExportFormat = Query(ExportFormat.CSV, description="Formato del export"),
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["admin"]))
+):
+    """Exportar órdenes e items (una fila por item) como CSV o NDJSON en streaming."""
+    if from_date > to_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El rango de fechas no es válido"
+        )
+
+    start = datetime.combine(from_date, time.min)
+    end = datetime.combine(to_date + timedelta(days=1), time.min)
+    media_type = "text/csv" if format == ExportFormat.CSV else "application/x-ndjson"
+    filename = f"orders_{from_date.isoformat()}_{to_date.isoformat()}.{format.value}"
+
+    return StreamingResponse(
+        _export_chunks(db.get_bind(), principal["branch_id"], start, end, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
-    orders = query.offset(skip).limit(limit).all()
-    return orders
+@router.get("/search", response_model=OrderSearchResult, response_class=ORJSONResponse)
+async def search_orders(
+    from_date: Optional[date] = Query(None, alias="from", description="Fecha inicial (inclusive)"),
+    to_date: Optional[date] = Query(None, alias="to", description="Fecha final (inclusive)"),
+    table_id: Optional[int] = Query(None, description="Filtrar por mesa"),
+    user_id: Optional[int] = Query(None, description="Filtrar por usuario que tomó la orden"),
+    order_status: Optional[OrderStatus] = Query(None, alias="status", description="Filtrar por estado"),
+    payment_status: Optional[PaymentStatus] = Query(None, description="Filtrar por estado del pago"),
+    min_amount: Optional[condecimal(ge=0)] = Query(None, description="Total mínimo"),
+    max_amount: Optional[condecimal(ge=0)] = Query(None, description="Total máximo"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    fields: Fields = Depends(order_fields(LIST_SUMMARY_FIELDS)),
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["admin", "cashier"]))
+):
+    """Buscar órdenes combinando filtros, las más recientes primero.
+
+    El total es exacto en resultados chicos y estimado en rangos grandes
+    (ver total_is_estimate). Soporta fields= y view=summary.
+    """
+    if from_date and to_date and from_date > to_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El rango de fechas no es válido"
+        )
+    if min_amount is not None and max_amount is not None and min_amount > max_amount:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El rango de montos no es válido"
+        )
+
+    branch_id = principal["branch_id"]
+    criteria = search_criteria(
+        branch_id,
+        start=datetime.combine(from_date, time.min) if from_date else None,
+        end=datetime.combine(to_date + timedelta(days=1), time.min) if to_date else None,
+        table_id=table_id,
+        user_id=user_id,
+        status=order_status,
+        payment_status=payment_status,
+        min_amount=min_amount,
+        max_amount=max_amount,
+    )
+    total, estimated = count_orders(db, criteria)
+    orders = []
+    if total:
+        query = select_orders(*criteria, fields=fields).order_by(Order.created_at.desc(), Order.id.desc())
+        orders = fetch_orders(
+            db, query.offset(skip).limit(limit), branch_id,
+            items=fields is None or "items" in fields
+        )
+    return ORJSONResponse({"total": total, "total_is_estimate": estimated, "orders": orders})
 
 @router.get("/{order_id}", response_model=OrderSchema)
 async def get_order(
     order_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin", "cashier", "cook"]))
+    principal=Depends(check_permissions(["admin", "cashier", "cook"]))
 ):
-    """Obtener una orden específica."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    """Obtener una orden específica (soporta If-None-Match / If-Modified-Since).
+
+    Las órdenes abiertas se sirven desde memoria.
+    """
+    entry = open_orders.get(db, principal["branch_id"], order_id)
+    if entry is not None:
+        etag = order_etag(order_id, entry.data["version"])
+        if is_not_modified(etag, if_none_match, entry.updated_at, if_modified_since):
+            return not_modified(etag, entry.updated_at)
+        return ORJSONResponse(entry.data, headers=validator_headers(etag, entry.updated_at))
+
+    if if_none_match or if_modified_since:
+        current = db.execute(
+            select(Order.version, Order.updated_at).where(
+                Order.id == order_id,
+                Order.branch_id == principal["branch_id"]
+            )
+        ).one_or_none()
+        if current is not None and current.updated_at is not None:
+            version, updated_at = current
+            etag = order_etag(order_id, version)
+            if is_not_modified(etag, if_none_match, updated_at, if_modified_since):
+                return not_modified(etag, updated_at)
+
+    order = queries.get_order(db, order_id, principal["branch_id"])
     if order is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Orden no encontrada"
         )
+    if order.updated_at is not None:
+        response.headers.update(
+            validator_headers(order_etag(order.id, order.version), order.updated_at)
+        )
     return order
 
+@router.get("/{order_id}/eta", response_model=OrderEta)
+async def get_order_eta(
+    order_id: int,
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["admin", "cashier", "cook"]))
+):
+    """Tiempo estimado hasta que la orden esté lista, según la cola de cocina."""
+    branch_id = principal["branch_id"]
+    order_status = db.execute(
+        select(Order.status).where(Order.id == order_id, Order.branch_id == branch_id)
+    ).scalar_one_or_none()
+    if order_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Orden no encontrada"
+        )
+
+    now = datetime.utcnow()
+    if order_status in KITCHEN_STATUSES:
+        eta = kitchen_scheduler.etas(db, branch_id, now).get(order_id)
+    elif order_status == OrderStatus.CANCELLED:
+        eta = None
+    else:
+        eta = 0
+    return {
+        "order_id": order_id,
+        "status": order_status,
+        "eta_seconds": round(eta) if eta is not None else None,
+        "ready_at": now + timedelta(seconds=eta) if eta is not None else None,
+    }
+
 @router.patch("/{order_id}", response_model=OrderSchema)
 async def update_order_status(
     order_id: int,
     order_update: OrderUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    expected_version: Optional[int] = Query(None, description="Versión que el cliente modificó"),
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin", "cashier", "cook"]))
+    principal=Depends(check_permissions(["admin", "cashier", "cook"]))
 ):
-    """Actualizar el estado de una orden."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    """Actualizar el estado de una orden (soporta If-Match / expected_version)."""
+    order = queries.get_order(db, order_id, principal["branch_id"])
     if order is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Orden no encontrada"
         )
+    check_version(order_etag(order.id, order.version), order.version, if_match, expected_version)
 
     if order_update.status:
+        previous_status = order.status
         order.status = order_update.status
+        if order.status == OrderStatus.IN_PREPARATION and previous_status != order.status:
+            order.started_at = datetime.utcnow()
+        rollups.on_status_change(db, order, previous_status)
+        kitchen_scheduler.set_status_on_commit(db, order)
+        if order.status != previous_status:
+            kitchen_metrics.transition_on_commit(db, order)
 
     if order_update.notes is not None:
         order.notes = order_update.notes
 
-    try:
-        db.commit()
-        db.refresh(order)
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
+    invalidate_on_commit(db, "orders")
+    # Hace flush: la versión nueva ya está disponible para el ETag
+    open_orders.track_on_commit(db, order)
 
+    response.headers["ETag"] = order_etag(order.id, order.version)
     return order
 
-@router.get("/kitchen/pending", response_model=List[OrderSchema])
+@router.get("/kitchen/pending", response_model=List[OrderSchema], response_class=ORJSONResponse)
 async def get_kitchen_orders(
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["cook"]))
+    principal=Depends(check_permissions(["cook"]))
 ):
     """Obtener órdenes pendientes para la cocina."""
-    orders = db.query(Order).filter(
-        Order.status.in_([OrderStatus.PENDING, OrderStatus.IN_PREPARATION])
-    ).all()
-    return orders
+    orders = sorted(
+        (entry.data for entry in open_orders.orders(db, principal["branch_id"])
+         if entry.data["status"] in KITCHEN_STATUSES),
+        key=lambda order: order["id"]
+    )
+    return ORJSONResponse(orders)
@@ -16,6 +16,14 @@ class PaymentStatus(str, Enum):
     FAILED = 'failed'
     REFUNDED = 'refunded'
 
+class ExportFormat(str, Enum):
+    CSV = 'csv'
+    NDJSON = 'ndjson'
+
+class OrderView(str, Enum):
+    SUMMARY = 'summary'
+    FULL = 'full'
+
 class OrderItemCreate(BaseModel):
     product_id: int
     quantity: int
@@ -33,11 +41,18 @@ class OrderCreate(BaseModel):
     table_id: int
     items: List[OrderItemCreate]
     notes: Optional[str] = None
+    is_takeaway: bool = False
 
 class OrderUpdate(BaseModel):
     status: Optional[OrderStatus] = None
     notes: Optional[str] = None
 
+class OrderEta(BaseModel):
+    order_id: int
+    status: OrderStatus
+    eta_seconds: Optional[int]  # None si la orden no pasa por cocina (cancelada)
+    ready_at: Optional[datetime]
+
 class Order(BaseModel):
     id: int
     table_id: int
@@ -46,8 +61,33 @@ class Order(BaseModel):
     total_amount: condecimal(decimal_places=2)
     payment_status: PaymentStatus
     notes: Optional[str]
+    is_takeaway: bool = False
     created_at: datetime
+    version: int = 1
     items: List[OrderItem]
 
     class Config:
         orm_mode = True
+
+class PartialOrder(BaseModel):
+    """Orden de los listados que aceptan fields= y view=summary.
+
+    Solo id viene siempre; el resto de los campos aparece si se pidió (sin
+    fields ni view=summary vienen todos, como en Order).
+    """
+    id: int
+    table_id: Optional[int]
+    user_id: Optional[int]
+    status: Optional[OrderStatus]
+    total_amount: Optional[condecimal(decimal_places=2)]
+    payment_status: Optional[PaymentStatus]
+    notes: Optional[str]
+    is_takeaway: Optional[bool]
+    created_at: Optional[datetime]
+    version: Optional[int]
+    items: Optional[List[OrderItem]]
+
+class OrderSearchResult(BaseModel):
+    total: int
+    total_is_estimate: bool  # En rangos grandes el total sale del planificador
+    orders: List[PartialOrder]
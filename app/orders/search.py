@@ -0,0 +1,82 @@
+"""Búsqueda de órdenes con filtros combinables y total estimado.
+
+Los filtros se resuelven con los índices ix_orders_search_* (ver
+alembic/versions/0009): rango de fechas solo, mesa + fechas o usuario +
+fechas, con el resto de las columnas filtrables incluidas en el índice.
+
+Contar exacto años de órdenes es caro, así que en PostgreSQL se cuenta
+exacto solo hasta EXACT_COUNT_LIMIT filas; si hay más, el total es la
+estimación del planificador (EXPLAIN) y se marca como estimado. En otros
+motores el conteo es siempre exacto. Solo se buscan órdenes vivas: los meses
+archivados quedan en orders_archive.
+"""
+import json
+import os
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..models import Order, OrderStatus, PaymentStatus
+
+# Filas que se cuentan exacto antes de pasar a la estimación
+EXACT_COUNT_LIMIT = int(os.getenv("ORDER_SEARCH_EXACT_COUNT_LIMIT", "1000"))
+
+
+def search_criteria(
+    branch_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    table_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    status: Optional[OrderStatus] = None,
+    payment_status: Optional[PaymentStatus] = None,
+    min_amount: Optional[Decimal] = None,
+    max_amount: Optional[Decimal] = None,
+) -> list:
+    """Condiciones de la búsqueda; end es exclusivo."""
+    criteria = [Order.branch_id == branch_id]
+    if start is not None:
+        criteria.append(Order.created_at >= start)
+    if end is not None:
+        criteria.append(Order.created_at < end)
+    if table_id is not None:
+        criteria.append(Order.table_id == table_id)
+    if user_id is not None:
+        criteria.append(Order.user_id == user_id)
+    if status is not None:
+        criteria.append(Order.status == status)
+    if payment_status is not None:
+        criteria.append(Order.payment_status == payment_status)
+    if min_amount is not None:
+        criteria.append(Order.total_amount >= min_amount)
+    if max_amount is not None:
+        criteria.append(Order.total_amount <= max_amount)
+    return criteria
+
+
+def _planner_rows(db: Session, query) -> int:
+    # Los valores van como literales: EXPLAIN no acepta parámetros. Son todos
+    # fechas, números y enums ya validados.
+    sql = query.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_orders(db: Session, criteria: list) -> Tuple[int, bool]:
+    """Devuelve (total, es_estimado) de las órdenes que cumplen criteria."""
+    matching = select(Order.id).where(*criteria)
+    if db.get_bind().dialect.name != "postgresql":
+        return db.execute(select(func.count()).select_from(matching.subquery())).scalar_one(), False
+
+    counted = db.execute(
+        select(func.count()).select_from(matching.limit(EXACT_COUNT_LIMIT + 1).subquery())
+    ).scalar_one()
+    if counted <= EXACT_COUNT_LIMIT:
+        return counted, False
+    # El planificador puede quedarse corto: nunca menos de lo ya contado
+    return max(counted, _planner_rows(db, matching)), True
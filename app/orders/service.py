@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from .. import queries
+from ..cache import invalidate_on_commit
+from ..kitchen.metrics import kitchen_metrics
+from ..kitchen.scheduler import kitchen_scheduler
+from ..kitchen.stations import route_to_stations
+from ..models import Order, OrderItem
+from .schemas import OrderCreate, OrderStatus
+from .store import open_orders
+
+
+def place_order(db: Session, order: OrderCreate, user_id: int, branch_id: int, **extra) -> Order:
+    """Valida y agrega a la sesión una orden nueva con sus items.
+
+    Descuenta stock y ocupa la mesa, pero no confirma la transacción: eso
+    queda a cargo de quien llama. Lanza HTTPException si la orden no es válida.
+    """
+    # Verificar que la mesa existe y está disponible
+    table = queries.get_table(db, order.table_id, branch_id)
+    if not table:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Mesa no encontrada"
+        )
+    if table.status != "free":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Mesa no disponible"
+        )
+
+    # Verificar que todos los productos existen y tienen stock
+    products = queries.get_products(db, (item.product_id for item in order.items), branch_id)
+    for item in order.items:
+        product = products.get(item.product_id)
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Producto {item.product_id} no encontrado"
+            )
+        if product.stock < item.quantity:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Stock insuficiente para el producto {product.name}"
+            )
+
+    # Crear la orden
+    db_order = Order(
+        table_id=order.table_id,
+        user_id=user_id,
+        branch_id=branch_id,
+        status=OrderStatus.PENDING,
+        total_amount=sum(
+            (products[item.product_id].price * item.quantity for item in order.items), Decimal("0")
+        ),
+        notes=order.notes,
+        is_takeaway=order.is_takeaway,
+        **extra
+    )
+    db.add(db_order)
+    db.flush()  # Para obtener el ID de la orden
+
+    # Crear los items y actualizar stock
+    kitchen_items, routed_items = [], []
+    for item in order.items:
+        product = products[item.product_id]
+        order_item = OrderItem(
+            order_id=db_order.id,
+            branch_id=branch_id,
+            product_id=item.product_id,
+            quantity=item.quantity,
+            unit_price=product.price,
+            notes=item.notes,
+            created_at=db_order.created_at  # Mismo mes/partición que la orden
+        )
+        db.add(order_item)
+        product.stock -= item.quantity
+        kitchen_items.append((item.product_id, product.category, item.quantity))
+        routed_items.append((order_item, product.category))
+    route_to_stations(db, db_order, routed_items)
+
+    # Actualizar estado de la mesa
+    table.status = "occupied"
+    invalidate_on_commit(db, "orders", "tables")
+    kitchen_scheduler.track_on_commit(db, db_order, kitchen_items, table.is_vip)
+    open_orders.track_on_commit(db, db_order)
+    kitchen_metrics.order_in_on_commit(db, db_order)
+
+    return db_order
@@ -0,0 +1,105 @@
+"""Órdenes abiertas en memoria.
+
+Las órdenes abiertas (de pendiente a entregada sin pagar, ver
+open_orders_clause) son una fracción mínima de orders. El store las guarda
+por sucursal, con sus items y con la forma del esquema Order, para servir
+la cola de cocina, el plano del salón y GET /orders/{id} sin leer la base.
+
+Cada sucursal se carga la primera vez que se consulta; después los routers
+escriben a través del store (track_on_commit) al confirmar cada cambio.
+Los cambios de otros workers llegan por el bus de invalidación y descartan
+lo cargado.
+"""
+from datetime import datetime
+from threading import Lock
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..cache import bus
+from ..database import run_after_commit
+from ..models import Order, OrderStatus, PaymentStatus
+from .reads import OPEN_ORDER_STATUSES, ORDER_COLUMNS, fetch_orders, open_orders_clause
+from .schemas import Order as OrderSchema
+
+
+class OpenOrder(NamedTuple):
+    data: dict  # Forma del esquema Order, lista para serializar
+    updated_at: datetime
+
+
+def is_open(status, payment_status) -> bool:
+    """Misma condición que open_orders_clause, en Python."""
+    return status in OPEN_ORDER_STATUSES or (
+        status == OrderStatus.DELIVERED and payment_status != PaymentStatus.COMPLETED
+    )
+
+
+class OpenOrderStore:
+    def __init__(self):
+        self._branches: Dict[int, Dict[int, OpenOrder]] = {}
+        self._generation = 0
+        self._lock = Lock()
+
+    def reset(self) -> None:
+        """Descarta todo; cada sucursal se recarga en la próxima consulta."""
+        with self._lock:
+            self._generation += 1
+            self._branches = {}
+
+    def _load(self, db: Session, branch_id: int) -> Dict[int, OpenOrder]:
+        query = select(*ORDER_COLUMNS, Order.updated_at).where(
+            Order.branch_id == branch_id, open_orders_clause()
+        )
+        orders = {}
+        for order in fetch_orders(db, query, branch_id):
+            updated_at = order.pop("updated_at")
+            orders[order["id"]] = OpenOrder(order, updated_at)
+        return orders
+
+    def _branch(self, db: Session, branch_id: int) -> Dict[int, OpenOrder]:
+        orders = self._branches.get(branch_id)
+        if orders is None:
+            generation = self._generation
+            orders = self._load(db, branch_id)
+            with self._lock:
+                # Si algo cambió mientras se cargaba, no se guarda lo leído
+                if generation == self._generation:
+                    self._branches[branch_id] = orders
+        return orders
+
+    def get(self, db: Session, branch_id: int, order_id: int) -> Optional[OpenOrder]:
+        """La orden si está abierta; None si no existe o ya se cerró."""
+        return self._branch(db, branch_id).get(order_id)
+
+    def orders(self, db: Session, branch_id: int) -> List[OpenOrder]:
+        orders = self._branch(db, branch_id)
+        with self._lock:
+            return list(orders.values())
+
+    def put(self, branch_id: int, entry: OpenOrder) -> None:
+        with self._lock:
+            self._generation += 1
+            orders = self._branches.get(branch_id)
+            if orders is None:
+                return
+            if is_open(entry.data["status"], entry.data["payment_status"]):
+                orders[entry.data["id"]] = entry
+            else:
+                orders.pop(entry.data["id"], None)
+
+    def track_on_commit(self, db: Session, order: Order) -> None:
+        """Refleja el estado de order en el store cuando se confirme la transacción."""
+        db.flush()
+        entry = OpenOrder(OrderSchema.from_orm(order).dict(), order.updated_at)
+        branch_id = order.branch_id
+        run_after_commit(db, lambda: self.put(branch_id, entry))
+
+    def on_remote_change(self, entities: Optional[set]) -> None:
+        if entities is None or "orders" in entities:
+            self.reset()
+
+
+open_orders = OpenOrderStore()
+bus.subscribe(open_orders.on_remote_change)
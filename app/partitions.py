@@ -0,0 +1,200 @@
+"""Particionado de orders y order_items en PostgreSQL.
+
+Estructura (ver alembic/versions/0003):
+
+    orders                      PARTITION BY LIST (branch_id)
+    ├── orders_b1               PARTITION BY RANGE (created_at)
+    │   ├── orders_b1_202610    un mes por partición
+    │   └── orders_b1_default   filas fuera de los meses creados
+    └── orders_default          sucursales sin partición propia
+
+order_items replica la misma estructura usando el created_at de su orden.
+Las particiones de meses archivados se mueven (DETACH/ATTACH, sin copiar
+filas) a orders_archive y order_items_archive, que tienen la misma forma.
+
+En otros motores (SQLite en los tests) no hay particiones: la creación es
+un no-op y el archivado mueve filas.
+"""
+from datetime import date, datetime
+from typing import List
+
+from sqlalchemy import delete, exists, insert, select, text
+from sqlalchemy.orm import Session
+
+from .models import (
+    Branch,
+    KitchenTicket,
+    Order,
+    OrderItem,
+    order_items_archive,
+    orders_archive,
+)
+from .orders.reads import open_orders_clause
+
+PARTITIONED_TABLES = ("orders", "order_items")
+
+# Meses hacia adelante que se mantienen creados
+MONTHS_AHEAD = 3
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def branch_partition_name(table_name: str, branch_id: int, archive: bool = False) -> str:
+    suffix = "_archive" if archive else ""
+    return f"{table_name}{suffix}_b{int(branch_id)}"
+
+
+def month_partition_name(table_name: str, branch_id: int, month: date) -> str:
+    return f"{table_name}_b{int(branch_id)}_{month:%Y%m}"
+
+
+def _is_postgres(db) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _children(db, parent: str) -> List[str]:
+    return list(db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent ORDER BY c.relname"
+    ), {"parent": parent}).scalars())
+
+
+def _partition_month(name: str):
+    suffix = name.rsplit("_", 1)[-1]
+    if len(suffix) == 6 and suffix.isdigit():
+        return date(int(suffix[:4]), int(suffix[4:]), 1)
+    return None
+
+
+def create_month_partitions(db, branch_id: int, first: date, last: date) -> List[str]:
+    """Crea las particiones mensuales de la sucursal entre first y last (inclusive)."""
+    created = []
+    month = month_start(first)
+    while month <= last:
+        for table_name in PARTITIONED_TABLES:
+            name = month_partition_name(table_name, branch_id, month)
+            result = db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+            if result is not None:
+                continue
+            db.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {branch_partition_name(table_name, branch_id)} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def create_branch_partitions(db, branch_id: int, first_month: date = None) -> None:
+    """Crea las particiones de la sucursal y sus meses hasta MONTHS_AHEAD."""
+    if not _is_postgres(db):
+        return
+    for table_name in PARTITIONED_TABLES:
+        parent = branch_partition_name(table_name, branch_id)
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {parent} PARTITION OF {table_name} "
+            f"FOR VALUES IN ({int(branch_id)}) PARTITION BY RANGE (created_at)"
+        ))
+        db.execute(text(f"CREATE TABLE IF NOT EXISTS {parent}_default PARTITION OF {parent} DEFAULT"))
+
+    current = month_start(datetime.utcnow())
+    create_month_partitions(db, branch_id, first_month or current, add_months(current, MONTHS_AHEAD))
+
+
+def ensure_future_partitions(db, months_ahead: int = MONTHS_AHEAD) -> List[str]:
+    """Crea los meses que falten hasta months_ahead para todas las sucursales."""
+    if not _is_postgres(db):
+        return []
+    current = month_start(datetime.utcnow())
+    created = []
+    for branch_id in db.execute(select(Branch.id)).scalars():
+        create_branch_partitions(db, branch_id)
+        created += create_month_partitions(db, branch_id, current, add_months(current, months_ahead))
+    return created
+
+
+def _archive_partitions(db, before: date) -> List[str]:
+    archived = []
+    for branch_id in db.execute(select(Branch.id)).scalars():
+        for name in _children(db, branch_partition_name("orders", branch_id)):
+            month = _partition_month(name)
+            if month is None or add_months(month, 1) > before:
+                continue
+            # Con la sucursal y el rango del mes el planificador solo lee esa partición
+            has_open_orders = db.execute(select(exists().where(
+                Order.branch_id == branch_id,
+                Order.created_at >= month,
+                Order.created_at < add_months(month, 1),
+                open_orders_clause(),
+            ))).scalar()
+            if has_open_orders:
+                continue
+
+            bounds = f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            for table_name in ("order_items", "orders"):
+                live_parent = branch_partition_name(table_name, branch_id)
+                archive_parent = branch_partition_name(table_name, branch_id, archive=True)
+                partition = month_partition_name(table_name, branch_id, month)
+                db.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {archive_parent} PARTITION OF {table_name}_archive "
+                    f"FOR VALUES IN ({int(branch_id)}) PARTITION BY RANGE (created_at)"
+                ))
+                db.execute(text(f"ALTER TABLE {live_parent} DETACH PARTITION {partition}"))
+                db.execute(text(f"ALTER TABLE {archive_parent} ATTACH PARTITION {partition} {bounds}"))
+            archived.append(name)
+    return archived
+
+
+def _archive_rows(db: Session, before: date) -> List[str]:
+    """Archivado fila a fila para motores sin particiones."""
+    cutoff = datetime.combine(before, datetime.min.time())
+    closed = (Order.created_at < cutoff) & ~open_orders_clause()
+    order_ids = select(Order.id).where(closed)
+
+    db.execute(insert(order_items_archive).from_select(
+        [c.name for c in order_items_archive.columns],
+        select(*[OrderItem.__table__.c[c.name] for c in order_items_archive.columns])
+        .where(OrderItem.order_id.in_(order_ids))
+    ))
+    db.execute(insert(orders_archive).from_select(
+        [c.name for c in orders_archive.columns],
+        select(*[Order.__table__.c[c.name] for c in orders_archive.columns]).where(closed)
+    ))
+    moved = db.execute(select(Order.id).where(closed)).scalars().all()
+    db.execute(delete(OrderItem).where(OrderItem.order_id.in_(moved)))
+    db.execute(delete(Order).where(Order.id.in_(moved)))
+    return [f"orders:{order_id}" for order_id in moved]
+
+
+def _purge_tickets(db, before: date) -> None:
+    """Borra los tickets de cocina de las órdenes que ya se archivaron."""
+    cutoff = datetime.combine(before, datetime.min.time())
+    db.execute(delete(KitchenTicket).where(
+        KitchenTicket.created_at < cutoff,
+        ~exists().where(Order.id == KitchenTicket.order_id, Order.branch_id == KitchenTicket.branch_id)
+    ))
+
+
+def archive_closed_orders(db, before: date) -> List[str]:
+    """Archiva los meses anteriores a before sin órdenes abiertas.
+
+    Abierta es lo mismo que en la mesa (open_orders_clause): en cocina, lista
+    o entregada sin pagar.
+
+    En PostgreSQL mueve particiones completas y devuelve sus nombres.
+    """
+    if _is_postgres(db):
+        archived = _archive_partitions(db, month_start(before))
+    else:
+        archived = _archive_rows(db, month_start(before))
+    _purge_tickets(db, month_start(before))
+    return archived
@@ -0,0 +1,141 @@
+"""Importación masiva del catálogo desde CSV.
+
+Las filas válidas se cargan en una tabla temporal (COPY en PostgreSQL,
+executemany en otros motores) y se aplican a products con
+INSERT ... SELECT ... ON CONFLICT DO UPDATE, dentro de la transacción del
+request. La clave de cada producto es nombre + categoría dentro de la
+sucursal (índice único ix_products_branch_name_category).
+"""
+import csv
+import io
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, ValidationError, condecimal, conint, constr
+from sqlalchemy import Column, DECIMAL, DateTime, Integer, MetaData, String, Table, Text, exists, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models import Product
+
+IMPORT_COLUMNS = ("name", "category", "price", "description", "stock")
+
+# Errores que se devuelven en el resumen; el resto solo se cuenta
+MAX_REPORTED_ERRORS = 100
+
+staging = Table(
+    "product_import", MetaData(),
+    Column("name", String(100), nullable=False),
+    Column("category", String(50), nullable=False),
+    Column("price", DECIMAL(10, 2), nullable=False),
+    Column("description", Text),
+    Column("stock", Integer),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
+class ProductImportRow(BaseModel):
+    name: constr(strip_whitespace=True, min_length=1, max_length=100)
+    category: constr(strip_whitespace=True, min_length=1, max_length=50)
+    price: condecimal(gt=0, max_digits=10, decimal_places=2)
+    description: Optional[str] = None
+    stock: Optional[conint(ge=0)] = None  # Vacío: se conserva el stock actual
+
+
+def parse_csv(content: str):
+    """Valida el CSV y devuelve (filas válidas, errores, cantidad de rechazadas).
+
+    Si un producto aparece más de una vez gana la última fila.
+    """
+    reader = csv.DictReader(io.StringIO(content))
+    missing = {"name", "category", "price"} - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"Faltan columnas en el CSV: {', '.join(sorted(missing))}")
+
+    rows, errors, rejected = {}, [], 0
+    for line, record in enumerate(reader, start=2):
+        values = {key: (record.get(key) or "").strip() or None for key in IMPORT_COLUMNS}
+        try:
+            row = ProductImportRow(**values)
+        except ValidationError as exc:
+            detail = "; ".join(f"{error['loc'][0]}: {error['msg']}" for error in exc.errors())
+        else:
+            key = (row.name, row.category)
+            previous = rows.get(key)
+            rows[key] = (line, row)
+            if previous is None:
+                continue
+            detail = f"Reemplazada por la línea {line}"
+            line = previous[0]
+        rejected += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line, "detail": detail})
+    return [row for _, row in rows.values()], errors, rejected
+
+
+def _load_staging(db: Session, rows: List[ProductImportRow]) -> None:
+    connection = db.connection()
+    staging.drop(connection, checkfirst=True)
+    staging.create(connection)
+    if not rows:
+        return
+
+    if connection.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row.name, row.category, row.price, row.description, row.stock])
+        buffer.seek(0)
+        with connection.connection.driver_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY product_import ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+    else:
+        connection.execute(insert(staging), [row.dict() for row in rows])
+
+
+def upsert_products(db: Session, branch_id: int, rows: List[ProductImportRow]) -> dict:
+    """Aplica las filas al catálogo de la sucursal; no confirma la transacción."""
+    _load_staging(db, rows)
+    now = datetime.utcnow()
+    products = Product.__table__
+
+    # Las filas que ya tienen producto son las que el upsert actualiza
+    updated = db.execute(
+        select(func.count()).select_from(staging).where(exists().where(
+            (products.c.branch_id == branch_id)
+            & (products.c.name == staging.c.name)
+            & (products.c.category == staging.c.category)
+        ))
+    ).scalar()
+
+    upsert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    # Un stock vacío en el CSV conserva el actual (y es 0 en los productos
+    # nuevos), así que esas filas van en un upsert aparte que no lo toca
+    for has_stock in (True, False):
+        stmt = upsert(products).from_select(
+            ["branch_id", "name", "category", "price", "description", "stock",
+             "is_active", "created_at", "updated_at"],
+            select(
+                literal(branch_id), staging.c.name, staging.c.category, staging.c.price,
+                staging.c.description, func.coalesce(staging.c.stock, 0),
+                literal(True), literal(now, DateTime), literal(now, DateTime),
+            ).where(staging.c.stock.is_not(None) if has_stock else staging.c.stock.is_(None))
+        )
+        values = {
+            "price": stmt.excluded.price,
+            "description": func.coalesce(stmt.excluded.description, products.c.description),
+            "is_active": True,
+            "updated_at": now,
+        }
+        if has_stock:
+            values["stock"] = stmt.excluded.stock
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["branch_id", "name", "category"], set_=values
+        ))
+
+    staging.drop(db.connection())
+    return {"inserted": len(rows) - updated, "updated": updated}
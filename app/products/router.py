@@ -1,29 +1,91 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, File, HTTPException, status, Query, UploadFile
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from .. import queries
 from ..database import get_db
 from ..models import Product as ProductModel
-from .schemas import Product, ProductCreate, ProductUpdate, ProductStockUpdate
+from .schemas import (
+    BulkStockResponse,
+    BulkStockUpdate,
+    Product,
+    ProductCreate,
+    ProductImportSummary,
+    ProductSearchResult,
+    ProductStockUpdate,
+    ProductUpdate,
+)
+from .importer import parse_csv, upsert_products
+from .search import search_products
+from .stock import apply_stock_counts
 from ..auth.middleware import check_permissions
+from ..cache import invalidate_on_commit
+from ..responses import ORJSONResponse
 
 router = APIRouter(
     prefix="/products",
     tags=["products"]
 )
 
+def _flush_product(db: Session) -> None:
+    # Nombre + categoría es único dentro de la sucursal (la clave de /products/import)
+    try:
+        db.flush()
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Ya existe un producto con ese nombre y categoría"
+        )
+
 @router.post("/", response_model=Product, status_code=status.HTTP_201_CREATED)
 async def create_product(
     product: ProductCreate,
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin"]))
+    principal=Depends(check_permissions(["admin"]))
 ):
-    """Crear un nuevo producto."""
-    db_product = ProductModel(**product.dict())
-    db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    """Crear un nuevo producto; si uno eliminado tenía el mismo nombre y categoría, se reactiva."""
+    db_product = db.execute(
+        select(ProductModel).where(
+            ProductModel.branch_id == principal["branch_id"],
+            ProductModel.name == product.name,
+            ProductModel.category == product.category,
+            ProductModel.is_active.is_(False)
+        )
+    ).scalar_one_or_none()
+    if db_product is None:
+        db_product = ProductModel(**product.dict(), branch_id=principal["branch_id"])
+        db.add(db_product)
+    else:
+        for key, value in product.dict().items():
+            setattr(db_product, key, value)
+        db_product.is_active = True
+    invalidate_on_commit(db, "products")
+    _flush_product(db)
     return db_product
 
+@router.post("/import", response_model=ProductImportSummary)
+async def import_products(
+    file: UploadFile = File(..., description="CSV con columnas name, category, price, description, stock"),
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["admin"]))
+):
+    """Crear o actualizar productos en lote desde un CSV (clave: nombre + categoría).
+
+    Las filas inválidas se informan y no impiden importar el resto.
+    """
+    try:
+        rows, errors, rejected = parse_csv((await file.read()).decode("utf-8-sig"))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"CSV inválido: {e}"
+        )
+
+    result = upsert_products(db, principal["branch_id"], rows)
+    invalidate_on_commit(db, "products")
+    return {**result, "rejected": rejected, "errors": errors}
+
 @router.get("/", response_model=List[Product])
 async def get_products(
     skip: int = 0,
@@ -31,10 +93,10 @@ async def get_products(
     category: Optional[str] = Query(None, description="Filtrar por categoría"),
     active_only: bool = Query(True, description="Solo mostrar productos activos"),
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin", "cashier", "cook"]))
+    principal=Depends(check_permissions(["admin", "cashier", "cook"]))
 ):
     """Obtener todos los productos con filtros opcionales."""
-    query = db.query(ProductModel)
+    query = db.query(ProductModel).filter(ProductModel.branch_id == principal["branch_id"])
 
     if active_only:
         query = query.filter(ProductModel.is_active == True)
@@ -48,20 +110,48 @@ async def get_products(
 @router.get("/categories")
 async def get_categories(
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin", "cashier", "cook"]))
+    principal=Depends(check_permissions(["admin", "cashier", "cook"]))
 ):
     """Obtener todas las categorías únicas."""
-    categories = db.query(ProductModel.category).distinct().all()
+    categories = db.query(ProductModel.category).filter(
+        ProductModel.branch_id == principal["branch_id"]
+    ).distinct().all()
     return [category[0] for category in categories]
 
+@router.get("/search", response_model=List[ProductSearchResult], response_class=ORJSONResponse)
+async def search_catalog(
+    q: str = Query(..., min_length=1, max_length=100, description="Texto a buscar"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["admin", "cashier", "cook"]))
+):
+    """Buscar productos activos por nombre, categoría o descripción, los más relevantes primero."""
+    return ORJSONResponse(search_products(db, principal["branch_id"], q, limit))
+
+@router.patch("/stock", response_model=BulkStockResponse)
+async def update_stock_bulk(
+    stock_update: BulkStockUpdate,
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["admin", "cook"]))
+):
+    """Cargar el conteo de stock de varios productos (stock contado o delta).
+
+    Los items inválidos se informan en el resultado y no impiden aplicar el resto.
+    """
+    results = apply_stock_counts(
+        db, principal["branch_id"], principal.get("sub"), stock_update.items, stock_update.reason
+    )
+    invalidate_on_commit(db, "products")
+    return {"results": results}
+
 @router.get("/{product_id}", response_model=Product)
 async def get_product(
     product_id: int,
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin", "cashier", "cook"]))
+    principal=Depends(check_permissions(["admin", "cashier", "cook"]))
 ):
     """Obtener un producto específico."""
-    product = db.query(ProductModel).filter(ProductModel.id == product_id).first()
+    product = queries.get_product(db, product_id, principal["branch_id"])
     if product is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     return product
@@ -71,10 +161,10 @@ async def update_product(
     product_id: int,
     product_update: ProductUpdate,
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin"]))
+    principal=Depends(check_permissions(["admin"]))
 ):
     """Actualizar un producto."""
-    db_product = db.query(ProductModel).filter(ProductModel.id == product_id).first()
+    db_product = queries.get_product(db, product_id, principal["branch_id"])
     if db_product is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
 
@@ -82,8 +172,8 @@ async def update_product(
     for key, value in update_data.items():
         setattr(db_product, key, value)
 
-    db.commit()
-    db.refresh(db_product)
+    invalidate_on_commit(db, "products")
+    _flush_product(db)
     return db_product
 
 @router.patch("/{product_id}/stock", response_model=Product)
@@ -91,29 +181,29 @@ async def update_product_stock(
     product_id: int,
     stock_update: ProductStockUpdate,
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin", "cook"]))
+    principal=Depends(check_permissions(["admin", "cook"]))
 ):
     """Actualizar el stock de un producto."""
-    db_product = db.query(ProductModel).filter(ProductModel.id == product_id).first()
+    db_product = queries.get_product(db, product_id, principal["branch_id"])
     if db_product is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
 
     db_product.stock = stock_update.stock
-    db.commit()
-    db.refresh(db_product)
+    invalidate_on_commit(db, "products")
+    db.flush()
     return db_product
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_product(
     product_id: int,
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin"]))
+    principal=Depends(check_permissions(["admin"]))
 ):
     """Eliminar un producto (desactivación lógica)."""
-    db_product = db.query(ProductModel).filter(ProductModel.id == product_id).first()
+    db_product = queries.get_product(db, product_id, principal["branch_id"])
     if db_product is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
 
     db_product.is_active = False
-    db.commit()
+    invalidate_on_commit(db, "products")
     return None
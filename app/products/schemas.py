@@ -1,6 +1,7 @@
-from pydantic import BaseModel, condecimal, conint
-from typing import Optional
+from pydantic import BaseModel, condecimal, conint, conlist, constr, root_validator
+from typing import List, Optional
 from datetime import datetime
+from enum import Enum
 
 class ProductBase(BaseModel):
     name: str
@@ -29,5 +30,53 @@ class Product(ProductBase):
     class Config:
         orm_mode = True
 
+class ProductSearchResult(BaseModel):
+    id: int
+    name: str
+    category: str
+    price: condecimal(decimal_places=2)
+    description: Optional[str] = None
+
+class ProductImportError(BaseModel):
+    line: int
+    detail: str
+
+class ProductImportSummary(BaseModel):
+    inserted: int
+    updated: int
+    rejected: int
+    errors: List[ProductImportError]  # Hasta 100, con el número de línea del CSV
+
 class ProductStockUpdate(BaseModel):
     stock: conint(ge=0)
+
+class StockCount(BaseModel):
+    product_id: int
+    stock: Optional[conint(ge=0)] = None  # Stock contado
+    delta: Optional[int] = None  # O diferencia a sumar al stock actual
+
+    @root_validator(skip_on_failure=True)
+    def check_stock_or_delta(cls, values):
+        if (values.get("stock") is None) == (values.get("delta") is None):
+            raise ValueError("Indicar stock o delta, no ambos")
+        return values
+
+class BulkStockUpdate(BaseModel):
+    items: conlist(StockCount, min_items=1, max_items=1000)
+    reason: Optional[constr(max_length=255)] = None
+
+class StockResultStatus(str, Enum):
+    UPDATED = 'updated'
+    NOT_FOUND = 'not_found'
+    INVALID = 'invalid'
+    DUPLICATE = 'duplicate'
+
+class StockResult(BaseModel):
+    product_id: int
+    status: StockResultStatus
+    previous_stock: Optional[int] = None
+    stock: Optional[int] = None
+    detail: Optional[str] = None
+
+class BulkStockResponse(BaseModel):
+    results: List[StockResult]
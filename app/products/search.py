@@ -0,0 +1,141 @@
+"""Búsqueda de productos por nombre, categoría y descripción.
+
+En PostgreSQL usa el índice GIN de pg_trgm (ver alembic/versions/0005):
+tolera errores de tipeo y ordena por similitud. En otros motores usa un
+índice de prefijos en memoria por sucursal, que se reconstruye cuando
+cambia algún producto.
+"""
+import heapq
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List
+
+from sqlalchemy import case, func, or_, select
+from sqlalchemy.orm import Session
+
+from ..cache import LocalCache
+from ..models import Product
+
+SEARCH_COLUMNS = (Product.id, Product.name, Product.category, Product.price, Product.description)
+
+# Similitud mínima de pg_trgm para considerar una coincidencia aproximada
+TRIGRAM_THRESHOLD = 0.3
+
+search_index_cache = LocalCache("product_search", depends_on=["products"])
+
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin acentos, para que "cafe" encuentre "Café"."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def tokens(text: str) -> List[str]:
+    return [token for token in "".join(
+        char if char.isalnum() else " " for char in normalize(text)
+    ).split() if token]
+
+
+def _like_pattern(q: str) -> str:
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class PrefixIndex:
+    """Tokens ordenados de los productos activos de una sucursal.
+
+    Cada token del texto buscado se resuelve con una búsqueda binaria del
+    rango de tokens que empiezan con él. Un producto coincide si cumple con
+    todos los tokens buscados.
+    """
+
+    # Peso según dónde aparece el token: nombre > categoría > descripción
+    WEIGHTS = {"name": 3, "category": 2, "description": 1}
+
+    def __init__(self, rows):
+        self.rows: Dict[int, dict] = {}
+        entries = []
+        for row in rows:
+            self.rows[row["id"]] = row
+            for field, weight in self.WEIGHTS.items():
+                for position, token in enumerate(tokens(row[field])):
+                    # Empezar el nombre con el texto buscado vale más
+                    bonus = 1 if field == "name" and position == 0 else 0
+                    entries.append((token, row["id"], weight + bonus))
+        entries.sort()
+        self.tokens = [entry[0] for entry in entries]
+        self.entries = entries
+
+    def _matches(self, prefix: str) -> Dict[int, int]:
+        matches = defaultdict(int)
+        position = bisect_left(self.tokens, prefix)
+        while position < len(self.entries) and self.tokens[position].startswith(prefix):
+            _, product_id, weight = self.entries[position]
+            matches[product_id] = max(matches[product_id], weight)
+            position += 1
+        return matches
+
+    def search(self, q: str, limit: int) -> List[dict]:
+        query_tokens = tokens(q)
+        if not query_tokens:
+            return []
+        scores = None
+        for prefix in query_tokens:
+            matches = self._matches(prefix)
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {product_id: score + matches[product_id]
+                          for product_id, score in scores.items() if product_id in matches}
+            if not scores:
+                return []
+        ranked = heapq.nsmallest(limit, scores.items(),
+                                 key=lambda item: (-item[1], self.rows[item[0]]["name"]))
+        return [self.rows[product_id] for product_id, _ in ranked]
+
+
+def _load_index(db: Session, branch_id: int) -> PrefixIndex:
+    rows = db.execute(select(*SEARCH_COLUMNS).where(
+        Product.branch_id == branch_id, Product.is_active == True
+    )).mappings()
+    return PrefixIndex([dict(row) for row in rows])
+
+
+def _search_postgres(db: Session, branch_id: int, q: str, limit: int) -> List[dict]:
+    pattern = _like_pattern(q)
+    # Umbral de %> solo para esta transacción
+    db.execute(select(func.set_config("pg_trgm.word_similarity_threshold", str(TRIGRAM_THRESHOLD), True)))
+    score = func.greatest(
+        func.word_similarity(q, Product.name),
+        func.similarity(Product.category, q) * 0.8,
+        func.word_similarity(q, func.coalesce(Product.description, "")) * 0.5,
+    )
+    query = (
+        select(*SEARCH_COLUMNS)
+        .where(
+            Product.branch_id == branch_id,
+            Product.is_active == True,
+            or_(
+                Product.name.ilike(pattern, escape="\\"),
+                Product.name.op("%>")(q),
+                Product.category.ilike(pattern, escape="\\"),
+                Product.description.ilike(pattern, escape="\\"),
+            )
+        )
+        .order_by(
+            case((Product.name.ilike(pattern[1:], escape="\\"), 0), else_=1),
+            score.desc(),
+            Product.name,
+        )
+        .limit(limit)
+    )
+    return [dict(row) for row in db.execute(query).mappings()]
+
+
+def search_products(db: Session, branch_id: int, q: str, limit: int = 20) -> List[dict]:
+    """Productos activos de la sucursal que coinciden con q, los mejores primero."""
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_postgres(db, branch_id, q, limit)
+    index = search_index_cache.get_or_load(branch_id, lambda: _load_index(db, branch_id))
+    return index.search(q, limit)
@@ -0,0 +1,75 @@
+"""Conteo de stock en lote (cierre de inventario).
+
+Lee el stock actual de todos los productos pedidos en una sola consulta
+(bloqueando las filas en PostgreSQL), calcula los valores nuevos y los
+aplica con un único UPDATE ... SET stock = CASE id ... END. Cada cambio queda
+registrado en stock_adjustments.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.orm import Session
+
+from ..models import Product, StockAdjustment, User
+from .schemas import StockCount, StockResultStatus
+
+
+def apply_stock_counts(
+    db: Session,
+    branch_id: int,
+    username: Optional[str],
+    items: List[StockCount],
+    reason: Optional[str] = None,
+) -> List[dict]:
+    """Aplica los conteos y devuelve un resultado por item; no confirma la transacción."""
+    ids = {item.product_id for item in items}
+    current = dict(db.execute(
+        select(Product.id, Product.stock)
+        .where(Product.id.in_(ids), Product.branch_id == branch_id)
+        .with_for_update()
+    ).all())
+
+    results, new_stock, seen = [], {}, set()
+    for item in items:
+        result = {"product_id": item.product_id}
+        results.append(result)
+        if item.product_id in seen:
+            result.update(status=StockResultStatus.DUPLICATE, detail="Producto repetido en el lote")
+            continue
+        seen.add(item.product_id)
+        if item.product_id not in current:
+            result.update(status=StockResultStatus.NOT_FOUND, detail="Producto no encontrado")
+            continue
+
+        previous = current[item.product_id] or 0
+        stock = item.stock if item.stock is not None else previous + item.delta
+        result["previous_stock"] = previous
+        if stock < 0:
+            result.update(status=StockResultStatus.INVALID, detail="El stock no puede quedar negativo")
+            continue
+        result.update(status=StockResultStatus.UPDATED, stock=stock)
+        new_stock[item.product_id] = stock
+
+    if new_stock:
+        now = datetime.utcnow()
+        db.execute(
+            update(Product)
+            .where(Product.id.in_(new_stock), Product.branch_id == branch_id)
+            .values(stock=case(new_stock, value=Product.id), updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        user_id = db.execute(select(User.id).where(User.username == username)).scalar()
+        db.execute(insert(StockAdjustment), [
+            {
+                "branch_id": branch_id,
+                "product_id": product_id,
+                "user_id": user_id,
+                "previous_stock": current[product_id] or 0,
+                "new_stock": stock,
+                "reason": reason,
+                "created_at": now,
+            }
+            for product_id, stock in new_stock.items()
+        ])
+    return results
@@ -0,0 +1,67 @@
+"""Consultas de los caminos más usados, construidas una sola vez.
+
+db.query(...).filter(...) arma el statement completo en cada request. Estos
+select() se construyen al importar el módulo con bindparam en lugar de los
+valores: cada ejecución solo calcula la clave de cache y reutiliza el SQL
+que SQLAlchemy ya compiló y guardó en el engine.
+
+psycopg2 no expone prepared statements del lado del servidor, así que la
+cache de compilación de SQLAlchemy es todo lo que se puede ahorrar sin
+cambiar de driver (ver benchmarks/bench_hot_queries.py).
+"""
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+
+from .models import Order, Product, Table, User
+
+ORDER_BY_ID = select(Order).where(
+    Order.id == bindparam("order_id"),
+    Order.branch_id == bindparam("branch_id")
+)
+
+# Para escrituras que dependen del estado de las filas hijas (tickets de cocina)
+ORDER_BY_ID_FOR_UPDATE = ORDER_BY_ID.with_for_update()
+
+PRODUCT_BY_ID = select(Product).where(
+    Product.id == bindparam("product_id"),
+    Product.branch_id == bindparam("branch_id")
+)
+
+PRODUCTS_BY_IDS = select(Product).where(
+    Product.id.in_(bindparam("product_ids", expanding=True)),
+    Product.branch_id == bindparam("branch_id")
+)
+
+TABLE_BY_ID = select(Table).where(
+    Table.id == bindparam("table_id"),
+    Table.branch_id == bindparam("branch_id")
+)
+
+USER_BY_USERNAME = select(User).where(User.username == bindparam("username"))
+
+
+def get_order(db: Session, order_id: int, branch_id: int, for_update: bool = False) -> Optional[Order]:
+    statement = ORDER_BY_ID_FOR_UPDATE if for_update else ORDER_BY_ID
+    return db.execute(statement, {"order_id": order_id, "branch_id": branch_id}).scalar_one_or_none()
+
+
+def get_product(db: Session, product_id: int, branch_id: int) -> Optional[Product]:
+    return db.execute(PRODUCT_BY_ID, {"product_id": product_id, "branch_id": branch_id}).scalar_one_or_none()
+
+
+def get_products(db: Session, product_ids: Iterable[int], branch_id: int) -> Dict[int, Product]:
+    """Productos de la sucursal por id, en una sola consulta."""
+    products = db.execute(
+        PRODUCTS_BY_IDS, {"product_ids": list(set(product_ids)), "branch_id": branch_id}
+    ).scalars()
+    return {product.id: product for product in products}
+
+
+def get_table(db: Session, table_id: int, branch_id: int) -> Optional[Table]:
+    return db.execute(TABLE_BY_ID, {"table_id": table_id, "branch_id": branch_id}).scalar_one_or_none()
+
+
+def get_user(db: Session, username: str) -> Optional[User]:
+    return db.execute(USER_BY_USERNAME, {"username": username}).scalars().first()
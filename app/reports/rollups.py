@@ -0,0 +1,181 @@
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import func, delete, select, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models import (
+    Order,
+    OrderItem,
+    OrderStatus,
+    Product,
+    SalesDailyCategory,
+    SalesHourlyProduct,
+    order_items_archive,
+    orders_archive,
+)
+
+
+def counts_as_sale(status) -> bool:
+    """Indica si una orden en este estado suma a los reportes de ventas."""
+    return status == OrderStatus.DELIVERED
+
+
+def _upsert_add(db: Session, model, keys: dict, quantity: int, revenue: Decimal, order_count: int):
+    """Inserta la fila de agregados o suma los valores si ya existe."""
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    table = model.__table__
+    stmt = insert(table).values(
+        **keys, quantity=quantity, revenue=revenue, order_count=order_count
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={
+            "quantity": table.c.quantity + stmt.excluded.quantity,
+            "revenue": table.c.revenue + stmt.excluded.revenue,
+            "order_count": table.c.order_count + stmt.excluded.order_count,
+        },
+    )
+    db.execute(stmt)
+
+
+def apply_order(db: Session, order: Order, sign: int = 1) -> None:
+    """Suma (sign=1) o resta (sign=-1) las líneas de una orden en los agregados.
+
+    Se ejecuta dentro de la transacción que cambia el estado de la orden.
+    """
+    if not order.items:
+        return
+
+    hour = order.created_at.replace(minute=0, second=0, microsecond=0)
+    product_ids = {item.product_id for item in order.items}
+    categories = dict(
+        db.execute(
+            select(Product.id, Product.category).where(Product.id.in_(product_ids))
+        ).all()
+    )
+
+    per_product = defaultdict(lambda: [0, Decimal("0")])
+    per_category = defaultdict(lambda: [0, Decimal("0")])
+    for item in order.items:
+        line_total = Decimal(item.unit_price) * item.quantity
+        for totals in (per_product[item.product_id], per_category[categories[item.product_id]]):
+            totals[0] += item.quantity
+            totals[1] += line_total
+
+    for product_id, (quantity, revenue) in per_product.items():
+        _upsert_add(
+            db, SalesHourlyProduct,
+            {"branch_id": order.branch_id, "bucket": hour, "product_id": product_id},
+            sign * quantity, sign * revenue, sign,
+        )
+    for category, (quantity, revenue) in per_category.items():
+        _upsert_add(
+            db, SalesDailyCategory,
+            {"branch_id": order.branch_id, "day": hour.date(), "category": category},
+            sign * quantity, sign * revenue, sign,
+        )
+
+
+def on_status_change(db: Session, order: Order, previous_status) -> None:
+    """Actualiza los agregados si el cambio de estado entra o sale de una venta."""
+    was_sale = counts_as_sale(previous_status)
+    is_sale = counts_as_sale(order.status)
+    if was_sale != is_sale:
+        apply_order(db, order, 1 if is_sale else -1)
+
+
+def _buckets(dialect: str, created_at):
+    """Expresiones de truncado a hora y a día según el motor."""
+    if dialect == "postgresql":
+        return func.date_trunc("hour", created_at), func.date(created_at)
+    return func.strftime("%Y-%m-%d %H:00:00", created_at), func.date(created_at)
+
+
+def _parse(value, parser):
+    # SQLite devuelve los buckets como texto
+    return parser(value) if isinstance(value, str) else value
+
+
+def _all_rows(live, archive, *names):
+    """Filas vivas y archivadas juntas (UNION ALL) con las columnas names."""
+    return union_all(
+        select(*[live.c[name] for name in names]),
+        select(*[archive.c[name] for name in names]),
+    ).subquery()
+
+
+def _sales_query(orders, items, *columns):
+    columns = (orders.c.branch_id, *columns)
+    return (
+        select(
+            *columns,
+            func.sum(items.c.quantity),
+            func.sum(items.c.quantity * items.c.unit_price),
+            func.count(func.distinct(orders.c.id)),
+        )
+        .join(items, (items.c.order_id == orders.c.id) & (items.c.branch_id == orders.c.branch_id))
+        .join(Product, Product.id == items.c.product_id)
+        .where(orders.c.status == OrderStatus.DELIVERED)
+        .group_by(*columns)
+    )
+
+
+def rebuild(db: Session) -> dict:
+    """Recalcula por completo las tablas de agregados desde las órdenes.
+
+    Lee orders/order_items junto con orders_archive/order_items_archive, así
+    que los meses archivados conservan sus agregados.
+    """
+    orders = _all_rows(Order.__table__, orders_archive, "id", "branch_id", "created_at", "status")
+    items = _all_rows(
+        OrderItem.__table__, order_items_archive, "order_id", "branch_id", "product_id", "quantity", "unit_price"
+    )
+    hour_bucket, day_bucket = _buckets(db.get_bind().dialect.name, orders.c.created_at)
+    hour_bucket, day_bucket = hour_bucket.label("bucket"), day_bucket.label("day")
+
+    hourly = [
+        {
+            "branch_id": branch_id,
+            "bucket": _parse(bucket, datetime.fromisoformat),
+            "product_id": product_id,
+            "quantity": quantity,
+            "revenue": Decimal(str(revenue)),
+            "order_count": order_count,
+        }
+        for branch_id, bucket, product_id, quantity, revenue, order_count
+        in db.execute(_sales_query(orders, items, hour_bucket, items.c.product_id)).all()
+    ]
+    daily = [
+        {
+            "branch_id": branch_id,
+            "day": _parse(day, date.fromisoformat),
+            "category": category,
+            "quantity": quantity,
+            "revenue": Decimal(str(revenue)),
+            "order_count": order_count,
+        }
+        for branch_id, day, category, quantity, revenue, order_count
+        in db.execute(_sales_query(orders, items, day_bucket, Product.category)).all()
+    ]
+
+    db.execute(delete(SalesHourlyProduct))
+    db.execute(delete(SalesDailyCategory))
+    if hourly:
+        db.execute(SalesHourlyProduct.__table__.insert(), hourly)
+    if daily:
+        db.execute(SalesDailyCategory.__table__.insert(), daily)
+
+    return {"hourly_rows": len(hourly), "daily_rows": len(daily)}
+
+
+if __name__ == "__main__":
+    from ..database import SessionLocal
+
+    with SessionLocal() as session:
+        result = rebuild(session)
+        session.commit()
+    print(f"Agregados reconstruidos: {result}")
@@ -0,0 +1,131 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from typing import List
+from datetime import date, datetime, time, timedelta
+
+from ..database import get_db
+from ..models import Product, SalesDailyCategory, SalesHourlyProduct, order_items_archive, orders_archive
+from ..orders.reads import ITEM_COLUMNS, ORDER_COLUMNS
+from ..orders.schemas import Order as OrderSchema
+from .schemas import SalesGroupBy, SalesRow
+from ..auth.middleware import check_permissions
+
+router = APIRouter(
+    prefix="/reports",
+    tags=["reports"]
+)
+
+def _totals(model):
+    return (
+        func.sum(model.quantity),
+        func.sum(model.revenue),
+        func.sum(model.order_count),
+    )
+
+@router.get("/sales", response_model=List[SalesRow])
+async def get_sales_report(
+    from_date: date = Query(..., alias="from", description="Fecha inicial (inclusive)"),
+    to_date: date = Query(..., alias="to", description="Fecha final (inclusive)"),
+    group_by: SalesGroupBy = Query(SalesGroupBy.DAY, description="Agrupación del reporte"),
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["admin"]))
+):
+    """Reporte de ventas entregadas leído de las tablas de agregados.
+
+    Las agrupaciones por hora y día suman el conteo de órdenes de cada
+    producto o categoría, por lo que una orden mixta cuenta más de una vez.
+    """
+    if from_date > to_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El rango de fechas no es válido"
+        )
+
+    if group_by in (SalesGroupBy.HOUR, SalesGroupBy.PRODUCT):
+        start = datetime.combine(from_date, time.min)
+        end = datetime.combine(to_date + timedelta(days=1), time.min)
+        if group_by == SalesGroupBy.HOUR:
+            key = SalesHourlyProduct.bucket
+            query = select(key, *_totals(SalesHourlyProduct))
+        else:
+            key = SalesHourlyProduct.product_id
+            query = select(key, Product.name, *_totals(SalesHourlyProduct)).join(
+                Product, Product.id == SalesHourlyProduct.product_id
+            ).group_by(Product.name)
+        query = query.where(
+            SalesHourlyProduct.branch_id == principal["branch_id"],
+            SalesHourlyProduct.bucket >= start,
+            SalesHourlyProduct.bucket < end
+        )
+    else:
+        key = SalesDailyCategory.day if group_by == SalesGroupBy.DAY else SalesDailyCategory.category
+        query = select(key, *_totals(SalesDailyCategory)).where(
+            SalesDailyCategory.branch_id == principal["branch_id"],
+            SalesDailyCategory.day >= from_date,
+            SalesDailyCategory.day <= to_date
+        )
+
+    rows = db.execute(query.group_by(key).order_by(key)).all()
+
+    report = []
+    for row in rows:
+        row_key, *rest = row
+        label = rest.pop(0) if group_by == SalesGroupBy.PRODUCT else None
+        quantity, revenue, order_count = rest
+        report.append({
+            "key": row_key.isoformat() if hasattr(row_key, "isoformat") else str(row_key),
+            "label": label,
+            "quantity": quantity,
+            "revenue": revenue,
+            "order_count": order_count,
+        })
+    return report
+
+@router.get("/archive/orders", response_model=List[OrderSchema])
+async def get_archived_orders(
+    from_date: date = Query(..., alias="from", description="Fecha inicial (inclusive)"),
+    to_date: date = Query(..., alias="to", description="Fecha final (inclusive)"),
+    skip: int = 0,
+    limit: int = Query(100, le=1000),
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["admin"]))
+):
+    """Órdenes de meses ya archivados (ver app/partitions.py)."""
+    if from_date > to_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El rango de fechas no es válido"
+        )
+
+    orders_table, items_table = orders_archive.c, order_items_archive.c
+    query = (
+        select(*[orders_table[column.key] for column in ORDER_COLUMNS])
+        .where(
+            orders_table.branch_id == principal["branch_id"],
+            orders_table.created_at >= datetime.combine(from_date, time.min),
+            orders_table.created_at < datetime.combine(to_date + timedelta(days=1), time.min)
+        )
+        .order_by(orders_table.created_at, orders_table.id)
+        .offset(skip)
+        .limit(limit)
+    )
+    orders = [dict(row) for row in db.execute(query).mappings()]
+    if not orders:
+        return orders
+
+    # Los items comparten el created_at de su orden: el filtro por rango
+    # limita la búsqueda a los mismos meses archivados
+    items_query = select(*[items_table[column.key] for column in ITEM_COLUMNS]).where(
+        items_table.branch_id == principal["branch_id"],
+        items_table.order_id.in_([order["id"] for order in orders]),
+        items_table.created_at >= orders[0]["created_at"],
+        items_table.created_at <= orders[-1]["created_at"]
+    ).order_by(items_table.id)
+    items_by_order = {order["id"]: [] for order in orders}
+    for item in db.execute(items_query).mappings():
+        item = dict(item)
+        items_by_order[item.pop("order_id")].append(item)
+    for order in orders:
+        order["items"] = items_by_order[order["id"]]
+    return orders
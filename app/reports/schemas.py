@@ -0,0 +1,16 @@
+from pydantic import BaseModel, condecimal
+from typing import Optional
+from enum import Enum
+
+class SalesGroupBy(str, Enum):
+    HOUR = 'hour'
+    DAY = 'day'
+    PRODUCT = 'product'
+    CATEGORY = 'category'
+
+class SalesRow(BaseModel):
+    key: str
+    label: Optional[str] = None
+    quantity: int
+    revenue: condecimal(decimal_places=2)
+    order_count: int
@@ -0,0 +1,23 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def _default(value: Any):
+    """Tipos que orjson no serializa de forma nativa."""
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+class ORJSONResponse(JSONResponse):
+    """Respuesta JSON serializada con orjson.
+
+    Pensada para datos leídos de la base que no necesitan pasar por la
+    validación de pydantic ni por jsonable_encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default)
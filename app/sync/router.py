@@ -0,0 +1,173 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from typing import Optional
+from datetime import datetime, timedelta
+
+from ..database import get_db
+from ..models import Order, OrderClientRef, Product, Table
+from ..orders.reads import fetch_orders, open_orders_clause, select_orders
+from ..orders.service import place_order
+from ..responses import ORJSONResponse
+from .schemas import (
+    SyncResponse,
+    SyncOrdersRequest,
+    SyncOrdersResponse,
+    SyncResultStatus,
+)
+from ..auth.middleware import check_permissions
+from ..auth.router import get_current_user
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["sync"]
+)
+
+EPOCH = datetime(1970, 1, 1)
+
+# Margen que se resta al token para no perder escrituras que se confirmaron
+# después de la consulta anterior con un updated_at previo. Los clientes
+# aplican los cambios por id, así que repetir filas no es un problema.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+TABLE_COLUMNS = (
+    Table.id, Table.capacity, Table.is_vip, Table.status, Table.is_active, Table.created_at, Table.version,
+)
+PRODUCT_COLUMNS = (
+    Product.id, Product.name, Product.price, Product.category, Product.description,
+    Product.stock, Product.is_active, Product.created_at, Product.updated_at,
+)
+
+def encode_token(moment: datetime) -> str:
+    return str((moment - EPOCH) // timedelta(microseconds=1))
+
+def decode_token(token: str) -> datetime:
+    try:
+        return EPOCH + timedelta(microseconds=int(token))
+    except (ValueError, OverflowError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Token de sincronización inválido"
+        )
+
+def _changed(db: Session, columns, model, branch_id: int, since: Optional[datetime]):
+    """Filas activas cambiadas y ids desactivados (tombstones) desde since."""
+    query = select(*columns).where(model.branch_id == branch_id)
+    if since is None:
+        return [dict(row) for row in db.execute(query.where(model.is_active == True)).mappings()], []
+
+    rows = [dict(row) for row in db.execute(query.where(model.updated_at >= since)).mappings()]
+    live = [row for row in rows if row["is_active"]]
+    deleted = [row["id"] for row in rows if not row["is_active"]]
+    return live, deleted
+
+@router.get("", response_model=SyncResponse, response_class=ORJSONResponse)
+async def get_changes(
+    since: Optional[str] = Query(None, description="Token devuelto por la sincronización anterior"),
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["admin", "cashier", "cook"]))
+):
+    """Cambios en mesas, productos y órdenes desde el token indicado.
+
+    Sin token devuelve el estado completo (solo órdenes abiertas).
+    """
+    now = datetime.utcnow()
+    cutoff = decode_token(since) - SYNC_OVERLAP if since else None
+
+    branch_id = principal["branch_id"]
+
+    tables, deleted_tables = _changed(db, TABLE_COLUMNS, Table, branch_id, cutoff)
+    products, deleted_products = _changed(db, PRODUCT_COLUMNS, Product, branch_id, cutoff)
+    orders_filter = open_orders_clause() if cutoff is None else Order.updated_at >= cutoff
+    orders = fetch_orders(
+        db, select_orders(Order.branch_id == branch_id, orders_filter).order_by(Order.id), branch_id
+    )
+
+    return ORJSONResponse({
+        "token": encode_token(now),
+        "full": cutoff is None,
+        "tables": tables,
+        "products": products,
+        "orders": orders,
+        "deleted": {"tables": deleted_tables, "products": deleted_products},
+    })
+
+@router.post("/orders", response_model=SyncOrdersResponse)
+async def sync_orders(
+    batch: SyncOrdersRequest,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Aplicar en una sola transacción las órdenes creadas sin conexión.
+
+    Cada orden se valida contra el estado que dejaron las anteriores del
+    lote; las que no se pueden aplicar se informan como conflicto y las
+    que ya se habían recibido (mismo client_ref) como duplicadas, también
+    si las confirmó otra sincronización concurrente.
+    """
+    refs = [order.client_ref for order in batch.orders]
+    known = dict(db.execute(
+        select(OrderClientRef.client_ref, OrderClientRef.order_id).where(
+            OrderClientRef.branch_id == current_user.branch_id,
+            OrderClientRef.client_ref.in_(refs)
+        )
+    ).all())
+
+    results = []
+    for order in batch.orders:
+        if order.client_ref in known:
+            results.append({
+                "client_ref": order.client_ref,
+                "status": SyncResultStatus.DUPLICATE,
+                "order_id": known[order.client_ref],
+            })
+            continue
+
+        savepoint = db.begin_nested()
+        try:
+            db_order = place_order(
+                db, order, current_user.id, current_user.branch_id, client_ref=order.client_ref
+            )
+            # La clave primaria de order_client_refs es la que impide duplicados
+            db.add(OrderClientRef(
+                branch_id=current_user.branch_id, client_ref=order.client_ref, order_id=db_order.id
+            ))
+            db.flush()
+            savepoint.commit()
+        except HTTPException as e:
+            savepoint.rollback()
+            results.append({
+                "client_ref": order.client_ref,
+                "status": SyncResultStatus.CONFLICT,
+                "detail": e.detail,
+            })
+            continue
+        except IntegrityError:
+            # Otra sincronización confirmó el mismo client_ref después de la
+            # consulta inicial
+            savepoint.rollback()
+            existing_id = db.execute(
+                select(OrderClientRef.order_id).where(
+                    OrderClientRef.branch_id == current_user.branch_id,
+                    OrderClientRef.client_ref == order.client_ref
+                )
+            ).scalar_one_or_none()
+            if existing_id is None:
+                raise
+            known[order.client_ref] = existing_id
+            results.append({
+                "client_ref": order.client_ref,
+                "status": SyncResultStatus.DUPLICATE,
+                "order_id": existing_id,
+            })
+            continue
+
+        known[order.client_ref] = db_order.id
+        results.append({
+            "client_ref": order.client_ref,
+            "status": SyncResultStatus.CREATED,
+            "order_id": db_order.id,
+        })
+
+    return {"results": results}
@@ -0,0 +1,39 @@
+from pydantic import BaseModel, constr
+from typing import List, Optional
+from enum import Enum
+
+from ..orders.schemas import OrderCreate, Order
+from ..products.schemas import Product
+from ..tables.schemas import Table
+
+class SyncDeleted(BaseModel):
+    tables: List[int]
+    products: List[int]
+
+class SyncResponse(BaseModel):
+    token: str
+    full: bool
+    tables: List[Table]
+    products: List[Product]
+    orders: List[Order]
+    deleted: SyncDeleted
+
+class SyncOrderCreate(OrderCreate):
+    client_ref: constr(min_length=1, max_length=64)
+
+class SyncOrdersRequest(BaseModel):
+    orders: List[SyncOrderCreate]
+
+class SyncResultStatus(str, Enum):
+    CREATED = 'created'
+    DUPLICATE = 'duplicate'
+    CONFLICT = 'conflict'
+
+class SyncOrderResult(BaseModel):
+    client_ref: str
+    status: SyncResultStatus
+    order_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class SyncOrdersResponse(BaseModel):
+    results: List[SyncOrderResult]
@@ -1,10 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import select
+from typing import List, Optional
+from datetime import datetime
+from decimal import Decimal
+from .. import queries
 from ..database import get_db
 from ..models import Table as TableModel
-from .schemas import Table, TableCreate, TableUpdate, TableStatusUpdate
+from .schemas import Table, TableCreate, TableUpdate, TableStatusUpdate, FloorTable
 from ..auth.middleware import check_permissions
+from ..cache import LocalCache, invalidate_on_commit
+from ..kitchen.scheduler import kitchen_scheduler
+from ..orders.store import open_orders
+from ..responses import ORJSONResponse
+from ..conditional import check_version, weak_etag, is_not_modified, not_modified
+
+# Mesas del plano del salón; las órdenes abiertas salen de open_orders
+floor_cache = LocalCache("floor", depends_on=["tables"], ttl=30)
+
+def _table_etag(table_id: int, version: int) -> str:
+    return weak_etag("table", table_id, version)
 
 router = APIRouter(
     prefix="/tables",
@@ -15,15 +30,17 @@ router = APIRouter(
 async def create_table(
     table: TableCreate,
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin", "cashier"]))
+    principal=Depends(check_permissions(["admin", "cashier"]))
 ):
     """Crear una nueva mesa."""
     db_table = TableModel(
-        capacity=table.capacity
+        capacity=table.capacity,
+        is_vip=table.is_vip,
+        branch_id=principal["branch_id"]
     )
     db.add(db_table)
-    db.commit()
-    db.refresh(db_table)
+    invalidate_on_commit(db, "tables")
+    db.flush()
     return db_table
 
 @router.get("/", response_model=List[Table])
@@ -31,72 +48,138 @@ async def get_tables(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin", "cashier", "cook"]))
+    principal=Depends(check_permissions(["admin", "cashier", "cook"]))
 ):
     """Obtener todas las mesas."""
-    tables = db.query(TableModel).offset(skip).limit(limit).all()
+    tables = db.query(TableModel).filter(
+        TableModel.branch_id == principal["branch_id"]
+    ).offset(skip).limit(limit).all()
     return tables
 
+def _load_floor_tables(db: Session, branch_id: int) -> List[dict]:
+    return [dict(row) for row in db.execute(
+        select(TableModel.id, TableModel.capacity, TableModel.status)
+        .where(TableModel.branch_id == branch_id, TableModel.is_active == True)
+        .order_by(TableModel.id)
+    ).mappings()]
+
+@router.get("/floor", response_model=List[FloorTable], response_class=ORJSONResponse)
+async def get_floor(
+    db: Session = Depends(get_db),
+    principal=Depends(check_permissions(["admin", "cashier"]))
+):
+    """Vista del salón: mesas activas con órdenes abiertas, items, total acumulado y ETA de cocina."""
+    branch_id = principal["branch_id"]
+    tables = floor_cache.get_or_load(branch_id, lambda: _load_floor_tables(db, branch_id))
+
+    orders_by_table = {}
+    for entry in open_orders.orders(db, branch_id):
+        orders_by_table.setdefault(entry.data["table_id"], []).append(entry.data)
+
+    now = datetime.utcnow()
+    etas = kitchen_scheduler.etas(db, branch_id, now)
+    floor = []
+    for table in tables:
+        orders = sorted(orders_by_table.get(table["id"], []), key=lambda order: (order["created_at"], order["id"]))
+        items = [item for order in orders for item in order["items"]]
+        seated_at = orders[0]["created_at"] if orders else None
+        table_etas = [etas[order["id"]] for order in orders if order["id"] in etas]
+        floor.append({
+            **table,
+            "open_order_ids": [order["id"] for order in orders],
+            "item_count": sum(item["quantity"] for item in items),
+            "running_total": sum((item["quantity"] * item["unit_price"] for item in items), Decimal("0")),
+            "seated_at": seated_at,
+            "seated_seconds": int((now - seated_at).total_seconds()) if seated_at else None,
+            "eta_seconds": round(max(table_etas)) if table_etas else None,
+        })
+    return ORJSONResponse(floor)
+
 @router.get("/{table_id}", response_model=Table)
 async def get_table(
     table_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin", "cashier", "cook"]))
+    principal=Depends(check_permissions(["admin", "cashier", "cook"]))
 ):
-    """Obtener una mesa específica."""
-    table = db.query(TableModel).filter(TableModel.id == table_id).first()
+    """Obtener una mesa específica (soporta If-None-Match)."""
+    if if_none_match:
+        version = db.execute(
+            select(TableModel.version).where(
+                TableModel.id == table_id,
+                TableModel.branch_id == principal["branch_id"]
+            )
+        ).scalar_one_or_none()
+        if version is not None:
+            etag = _table_etag(table_id, version)
+            if is_not_modified(etag, if_none_match):
+                return not_modified(etag)
+
+    table = queries.get_table(db, table_id, principal["branch_id"])
     if table is None:
         raise HTTPException(status_code=404, detail="Mesa no encontrada")
+    response.headers["ETag"] = _table_etag(table.id, table.version)
     return table
 
 @router.patch("/{table_id}", response_model=Table)
 async def update_table(
     table_id: int,
     table_update: TableUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    expected_version: Optional[int] = Query(None, description="Versión que el cliente modificó"),
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin", "cashier"]))
+    principal=Depends(check_permissions(["admin", "cashier"]))
 ):
-    """Actualizar una mesa."""
-    db_table = db.query(TableModel).filter(TableModel.id == table_id).first()
+    """Actualizar una mesa (soporta If-Match / expected_version)."""
+    db_table = queries.get_table(db, table_id, principal["branch_id"])
     if db_table is None:
         raise HTTPException(status_code=404, detail="Mesa no encontrada")
+    check_version(_table_etag(db_table.id, db_table.version), db_table.version, if_match, expected_version)
 
     update_data = table_update.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_table, key, value)
 
-    db.commit()
-    db.refresh(db_table)
+    invalidate_on_commit(db, "tables")
+    db.flush()
+    response.headers["ETag"] = _table_etag(db_table.id, db_table.version)
     return db_table
 
 @router.patch("/{table_id}/status", response_model=Table)
 async def update_table_status(
     table_id: int,
     status_update: TableStatusUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    expected_version: Optional[int] = Query(None, description="Versión que el cliente modificó"),
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin", "cashier"]))
+    principal=Depends(check_permissions(["admin", "cashier"]))
 ):
-    """Actualizar el estado de una mesa."""
-    db_table = db.query(TableModel).filter(TableModel.id == table_id).first()
+    """Actualizar el estado de una mesa (soporta If-Match / expected_version)."""
+    db_table = queries.get_table(db, table_id, principal["branch_id"])
     if db_table is None:
         raise HTTPException(status_code=404, detail="Mesa no encontrada")
+    check_version(_table_etag(db_table.id, db_table.version), db_table.version, if_match, expected_version)
 
     db_table.status = status_update.status
-    db.commit()
-    db.refresh(db_table)
+    invalidate_on_commit(db, "tables")
+    db.flush()
+    response.headers["ETag"] = _table_etag(db_table.id, db_table.version)
     return db_table
 
 @router.delete("/{table_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_table(
     table_id: int,
     db: Session = Depends(get_db),
-    _=Depends(check_permissions(["admin"]))
+    principal=Depends(check_permissions(["admin"]))
 ):
     """Eliminar una mesa (desactivación lógica)."""
-    db_table = db.query(TableModel).filter(TableModel.id == table_id).first()
+    db_table = queries.get_table(db, table_id, principal["branch_id"])
     if db_table is None:
         raise HTTPException(status_code=404, detail="Mesa no encontrada")
 
     db_table.is_active = False
-    db.commit()
+    invalidate_on_commit(db, "tables")
     return None
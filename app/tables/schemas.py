@@ -1,6 +1,6 @@
-from pydantic import BaseModel, conint
+from pydantic import BaseModel, conint, condecimal
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from enum import Enum
 
 class TableStatus(str, Enum):
@@ -10,12 +10,14 @@ class TableStatus(str, Enum):
 
 class TableBase(BaseModel):
     capacity: conint(gt=0)  # Debe ser mayor que 0
+    is_vip: bool = False
 
 class TableCreate(TableBase):
     pass
 
 class TableUpdate(TableBase):
     capacity: Optional[conint(gt=0)] = None
+    is_vip: Optional[bool] = None
     status: Optional[TableStatus] = None
     is_active: Optional[bool] = None
 
@@ -24,9 +26,21 @@ class Table(TableBase):
     status: TableStatus
     is_active: bool
     created_at: datetime
+    version: int
 
     class Config:
         orm_mode = True
 
 class TableStatusUpdate(BaseModel):
     status: TableStatus
+
+class FloorTable(BaseModel):
+    id: int
+    capacity: int
+    status: TableStatus
+    open_order_ids: List[int]
+    item_count: int
+    running_total: condecimal(decimal_places=2)
+    seated_at: Optional[datetime]
+    seated_seconds: Optional[int]
+    eta_seconds: Optional[int]  # Hasta que esté lista la última orden en cocina
@@ -0,0 +1,110 @@
+"""Compara db.query() armado en cada request con los select() de app/queries.py.
+
+Mide el costo por llamada de buscar una orden, un producto, una mesa y un
+usuario, y el de cargar los productos de una orden (una consulta por item,
+dos veces, contra una sola consulta con IN). SQLite en memoria: lo que se
+mide es casi todo overhead de Python, que es justamente lo que cambia.
+
+Uso:
+    python benchmarks/bench_hot_queries.py [llamadas]
+"""
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import queries
+from app.database import Base
+from app.models import Branch, Order, Product, Table, User, UserRole
+
+REPEAT = 5
+ITEMS_PER_ORDER = 4
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+Session = sessionmaker(bind=engine)
+
+
+def seed() -> None:
+    Base.metadata.create_all(bind=engine)
+    with Session() as db:
+        db.add(Branch(id=1, name="Principal"))
+        db.execute(User.__table__.insert(), [
+            {"username": f"usuario{i}", "password_hash": "x", "role": UserRole.CASHIER, "branch_id": 1}
+            for i in range(20)
+        ])
+        db.execute(Table.__table__.insert(), [{"capacity": 4, "branch_id": 1, "version": 1} for _ in range(20)])
+        db.execute(Product.__table__.insert(), [
+            {"name": f"Producto {i}", "price": Decimal("2.50"), "category": "Bench", "stock": 1000, "branch_id": 1}
+            for i in range(50)
+        ])
+        db.execute(Order.__table__.insert(), [
+            {"table_id": i % 20 + 1, "user_id": 1, "branch_id": 1, "version": 1} for i in range(100)
+        ])
+        db.commit()
+
+
+def legacy_products(db, product_ids):
+    # Como place_order antes: validar y después volver a leer cada producto
+    for _ in range(2):
+        for product_id in product_ids:
+            db.query(Product).filter(Product.id == product_id, Product.branch_id == 1).first()
+
+
+CASES = [
+    (
+        "orden por id",
+        lambda db: db.query(Order).filter(Order.id == 42, Order.branch_id == 1).first(),
+        lambda db: queries.get_order(db, 42, 1),
+    ),
+    (
+        "producto por id",
+        lambda db: db.query(Product).filter(Product.id == 7, Product.branch_id == 1).first(),
+        lambda db: queries.get_product(db, 7, 1),
+    ),
+    (
+        "mesa por id",
+        lambda db: db.query(Table).filter(Table.id == 3, Table.branch_id == 1).first(),
+        lambda db: queries.get_table(db, 3, 1),
+    ),
+    (
+        "usuario por username",
+        lambda db: db.query(User).filter(User.username == "usuario5").first(),
+        lambda db: queries.get_user(db, "usuario5"),
+    ),
+    (
+        f"productos de una orden ({ITEMS_PER_ORDER} items)",
+        lambda db: legacy_products(db, range(1, ITEMS_PER_ORDER + 1)),
+        lambda db: queries.get_products(db, range(1, ITEMS_PER_ORDER + 1), 1),
+    ),
+]
+
+
+def bench(name, legacy, prebuilt, calls):
+    results = {}
+    with Session() as db:
+        for label, fn in (("legacy", legacy), ("prebuilt", prebuilt)):
+            fn(db)  # Compila y cachea el SQL antes de medir
+            runs = timeit.repeat(lambda: fn(db), number=calls, repeat=REPEAT)
+            results[label] = min(runs) / calls * 1_000_000
+    print(
+        f"{name:<32} db.query {results['legacy']:8.1f} µs   "
+        f"select {results['prebuilt']:8.1f} µs   -{results['legacy'] - results['prebuilt']:.1f} µs"
+    )
+
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    seed()
+    print(f"µs por llamada, mejor de {REPEAT} corridas de {calls}")
+    for case in CASES:
+        bench(*case, calls)
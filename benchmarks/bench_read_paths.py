@@ -0,0 +1,110 @@
+"""Compara la serialización ORM + pydantic con el camino rápido de lectura.
+
+Uso:
+    python benchmarks/bench_read_paths.py [cantidad_de_ordenes]
+"""
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import parse_obj_as
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models import Order, OrderItem, OrderStatus, Product, Table
+from app.orders.reads import fetch_orders, select_orders
+from app.orders.schemas import Order as OrderSchema
+from app.responses import ORJSONResponse
+
+ITEMS_PER_ORDER = 3
+REPEAT = 20
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+Session = sessionmaker(bind=engine)
+
+
+def seed(order_count: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    statuses = [OrderStatus.PENDING, OrderStatus.IN_PREPARATION, OrderStatus.DELIVERED]
+    now = datetime.utcnow()
+    with Session() as db:
+        db.execute(Table.__table__.insert(), [{"capacity": 4} for _ in range(20)])
+        db.execute(Product.__table__.insert(), [
+            {"name": f"Producto {i}", "price": Decimal("2.50"), "category": "Bench", "stock": 1000}
+            for i in range(50)
+        ])
+        db.execute(Order.__table__.insert(), [
+            {
+                "table_id": i % 20 + 1,
+                "user_id": 1,
+                "status": statuses[i % len(statuses)],
+                "total_amount": Decimal("7.50"),
+                "created_at": now - timedelta(seconds=i),
+            }
+            for i in range(order_count)
+        ])
+        db.execute(OrderItem.__table__.insert(), [
+            {
+                "order_id": i // ITEMS_PER_ORDER + 1,
+                "product_id": i % 50 + 1,
+                "quantity": 1,
+                "unit_price": Decimal("2.50"),
+                "notes": "sin azúcar",
+            }
+            for i in range(order_count * ITEMS_PER_ORDER)
+        ])
+        db.commit()
+
+
+def legacy(criteria, order_by, limit):
+    """ORM -> validación orm_mode -> jsonable_encoder -> json.dumps."""
+    with Session() as db:
+        orders = db.query(Order).filter(*criteria).order_by(order_by).limit(limit).all()
+        validated = parse_obj_as(List[OrderSchema], orders)
+        return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def fast(criteria, order_by, limit):
+    """Tuplas de columnas -> dicts -> orjson."""
+    with Session() as db:
+        orders = fetch_orders(db, select_orders(*criteria).order_by(order_by).limit(limit))
+        return ORJSONResponse(orders).body
+
+
+def bench(name, criteria, order_by, limit):
+    assert json.loads(legacy(criteria, order_by, limit)) == json.loads(fast(criteria, order_by, limit))
+    results = {}
+    for label, fn in (("legacy", legacy), ("fast", fast)):
+        runs = timeit.repeat(lambda: fn(criteria, order_by, limit), number=1, repeat=REPEAT)
+        results[label] = min(runs) * 1000
+    print(
+        f"{name:<28} legacy {results['legacy']:8.2f} ms   "
+        f"fast {results['fast']:8.2f} ms   x{results['legacy'] / results['fast']:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    order_count = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    seed(order_count)
+    print(f"{order_count} órdenes, {ITEMS_PER_ORDER} items por orden, mejor de {REPEAT} corridas")
+    bench("GET /orders/?limit=100", (), Order.id, 100)
+    bench("GET /orders/?limit=1000", (), Order.id, 1000)
+    bench(
+        "GET /kitchen/orders/queue",
+        (Order.status.in_([OrderStatus.PENDING, OrderStatus.IN_PREPARATION]),),
+        Order.created_at.asc(),
+        None,
+    )
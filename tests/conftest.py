@@ -11,7 +11,14 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
-from app.database import Base, get_db
+from app.database import Base, get_db, unit_of_work
+from app.models import Branch, DEFAULT_BRANCH_ID
+from app import cache
+from app.admission import admission
+from app.kitchen.estimates import prep_times
+from app.kitchen.metrics import kitchen_metrics
+from app.kitchen.scheduler import kitchen_scheduler
+from app.orders.store import open_orders
 
 # Configuración de la base de datos de prueba
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -21,23 +28,29 @@ engine = create_engine(
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Sobreescribir la dependencia de la base de datos
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+async def override_get_db():
+    with unit_of_work(TestingSessionLocal) as db:
         yield db
-    finally:
-        db.close()
 
 app.dependency_overrides[get_db] = override_get_db
 
 @pytest.fixture(autouse=True)
 def setup_database():
     Base.metadata.create_all(bind=engine)
+    with TestingSessionLocal() as db:
+        db.add(Branch(id=DEFAULT_BRANCH_ID, name="Principal"))
+        db.commit()
     yield
     Base.metadata.drop_all(bind=engine)
+    cache.clear_all()
+    admission.reset()
+    kitchen_scheduler.reset()
+    prep_times.reset()
+    open_orders.reset()
+    kitchen_metrics.reset()
 
 @pytest.fixture(scope="module")
 def test_client():
@@ -46,7 +59,7 @@ def test_client():
 
 @pytest.fixture
 def admin_token(test_client):
-    # Crear usuario admin
+    # Crear usuario admin (el primero se registra sin token)
     response = test_client.post(
         "/auth/register",
         json={
@@ -70,10 +83,11 @@ def admin_token(test_client):
     return response.json()["access_token"]
 
 @pytest.fixture
-def cook_token(test_client):
-    # Crear usuario cocinero
+def cook_token(test_client, admin_token):
+    # Crear usuario cocinero (solo un admin puede registrar usuarios)
     response = test_client.post(
         "/auth/register",
+        headers={"Authorization": f"Bearer {admin_token}"},
         json={
             "username": "cook1",
             "password": "cook123",
@@ -95,10 +109,11 @@ def cook_token(test_client):
     return response.json()["access_token"]
 
 @pytest.fixture
-def cashier_token(test_client):
-    # Crear usuario cajero
+def cashier_token(test_client, admin_token):
+    # Crear usuario cajero (solo un admin puede registrar usuarios)
     response = test_client.post(
         "/auth/register",
+        headers={"Authorization": f"Bearer {admin_token}"},
         json={
             "username": "cashier1",
             "password": "cash123",
@@ -1,9 +1,10 @@
 import pytest
 from .conftest import test_client, admin_token, cashier_token
 
-def test_create_user(test_client):
+def test_create_user(test_client, admin_token, cashier_token):
     response = test_client.post(
         "/auth/register",
+        headers={"Authorization": f"Bearer {admin_token}"},
         json={
             "username": "testuser",
             "password": "test123",
@@ -15,6 +16,15 @@ def test_create_user(test_client):
     data = response.json()
     assert data["username"] == "testuser"
     assert data["role"] == "cashier"
+    assert data["branch_id"] == 1
+
+    # Sin token solo se registra el primer admin; los demás roles no registran
+    user = {"username": "intruso", "password": "x", "role": "admin"}
+    assert test_client.post("/auth/register", json=user).status_code == 401
+    response = test_client.post(
+        "/auth/register", headers={"Authorization": f"Bearer {cashier_token}"}, json=user
+    )
+    assert response.status_code == 403
 
 def test_create_table(test_client, admin_token):
     response = test_client.post(
@@ -44,6 +54,19 @@ def test_create_product(test_client, admin_token):
     assert data["name"] == "Test Coffee"
     assert float(data["price"]) == 2.50
 
+def test_recreate_deleted_product(test_client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    product = {"name": "Test Coffee", "price": 2.50, "category": "Bebidas Calientes", "stock": 10}
+    product_id = test_client.post("/products/", headers=headers, json=product).json()["id"]
+    assert test_client.post("/products/", headers=headers, json=product).status_code == 409
+
+    # Nombre + categoría es la clave: crear de nuevo uno eliminado lo reactiva
+    test_client.delete(f"/products/{product_id}", headers=headers)
+    response = test_client.post("/products/", headers=headers, json={**product, "price": 3.0, "stock": 4})
+    assert response.status_code == 201
+    data = response.json()
+    assert (data["id"], data["is_active"], float(data["price"]), data["stock"]) == (product_id, True, 3.0, 4)
+
 def test_get_tables(test_client, cashier_token):
     test_client.post(
         "/tables/",
@@ -100,10 +123,11 @@ def test_get_products_by_category(test_client, admin_token):
     assert len(data) > 0
     assert all(p["category"] == "Bebidas Calientes" for p in data)
 
-def test_token_generation(test_client):
+def test_token_generation(test_client, admin_token):
     # Registrar usuario
     test_client.post(
         "/auth/register",
+        headers={"Authorization": f"Bearer {admin_token}"},
         json={
             "username": "testuser2",
             "password": "test123",
@@ -124,3 +148,405 @@ def test_token_generation(test_client):
     data = response.json()
     assert "access_token" in data
     assert data["token_type"] == "bearer"
+
+def test_floor_view(test_client, admin_token, cashier_token):
+    table_id = test_client.post(
+        "/tables/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"capacity": 4}
+    ).json()["id"]
+    product_id = test_client.post(
+        "/products/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "name": "Test Floor Coffee",
+            "price": 2.50,
+            "category": "Bebidas Calientes",
+            "stock": 100
+        }
+    ).json()["id"]
+
+    response = test_client.get(
+        "/tables/floor",
+        headers={"Authorization": f"Bearer {cashier_token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()[0]["open_order_ids"] == []
+
+    order_id = test_client.post(
+        "/orders/",
+        headers={"Authorization": f"Bearer {cashier_token}"},
+        json={
+            "table_id": table_id,
+            "items": [{"product_id": product_id, "quantity": 3}]
+        }
+    ).json()["id"]
+
+    table = test_client.get(
+        "/tables/floor",
+        headers={"Authorization": f"Bearer {cashier_token}"}
+    ).json()[0]
+    assert table["status"] == "occupied"
+    assert table["open_order_ids"] == [order_id]
+    assert table["item_count"] == 3
+    assert float(table["running_total"]) == 7.5
+    assert table["seated_seconds"] >= 0
+
+    test_client.patch(
+        f"/orders/{order_id}",
+        headers={"Authorization": f"Bearer {cashier_token}"},
+        json={"status": "cancelled"}
+    )
+    table = test_client.get(
+        "/tables/floor",
+        headers={"Authorization": f"Bearer {cashier_token}"}
+    ).json()[0]
+    assert table["open_order_ids"] == []
+    assert table["seated_at"] is None
+
+def test_table_conditional_get(test_client, cashier_token):
+    table_id = test_client.post(
+        "/tables/",
+        headers={"Authorization": f"Bearer {cashier_token}"},
+        json={"capacity": 4}
+    ).json()["id"]
+
+    response = test_client.get(
+        f"/tables/{table_id}",
+        headers={"Authorization": f"Bearer {cashier_token}"}
+    )
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    assert response.json()["version"] == 1
+
+    response = test_client.get(
+        f"/tables/{table_id}",
+        headers={"Authorization": f"Bearer {cashier_token}", "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    test_client.patch(
+        f"/tables/{table_id}/status",
+        headers={"Authorization": f"Bearer {cashier_token}"},
+        json={"status": "occupied"}
+    )
+    response = test_client.get(
+        f"/tables/{table_id}",
+        headers={"Authorization": f"Bearer {cashier_token}", "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert response.headers["etag"] != etag
+
+def test_table_optimistic_concurrency(test_client, cashier_token):
+    headers = {"Authorization": f"Bearer {cashier_token}"}
+    table_id = test_client.post("/tables/", headers=headers, json={"capacity": 4}).json()["id"]
+    etag = test_client.get(f"/tables/{table_id}", headers=headers).headers["etag"]
+
+    response = test_client.patch(
+        f"/tables/{table_id}/status",
+        headers={**headers, "If-Match": etag},
+        json={"status": "occupied"}
+    )
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    new_etag = response.headers["etag"]
+
+    # Otro cajero con la versión vieja no pisa el cambio
+    response = test_client.patch(
+        f"/tables/{table_id}/status",
+        headers={**headers, "If-Match": etag},
+        json={"status": "free"}
+    )
+    assert response.status_code == 409
+    assert response.headers["etag"] == new_etag
+    response = test_client.patch(
+        f"/tables/{table_id}?expected_version=1", headers=headers, json={"capacity": 6}
+    )
+    assert response.status_code == 409
+
+    response = test_client.patch(
+        f"/tables/{table_id}?expected_version=2", headers=headers, json={"capacity": 6}
+    )
+    assert response.status_code == 200
+    assert response.json()["version"] == 3
+    assert response.json()["status"] == "occupied"
+
+def test_branch_isolation(test_client, admin_token):
+    response = test_client.post(
+        "/branches/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"name": "Sucursal Centro"}
+    )
+    assert response.status_code == 201
+    branch_id = response.json()["id"]
+
+    response = test_client.post(
+        "/auth/register",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "username": "admin_centro",
+            "password": "admin123",
+            "role": "admin",
+            "branch_id": branch_id
+        }
+    )
+    assert response.status_code == 201
+    assert response.json()["branch_id"] == branch_id
+    centro_admin = {"Authorization": "Bearer " + test_client.post(
+        "/auth/token",
+        json={"username": "admin_centro", "password": "admin123"}
+    ).json()["access_token"]}
+
+    # El admin de una sucursal registra en la suya y no en otras
+    cashier = {"username": "cashier_centro", "password": "cash123", "role": "cashier"}
+    response = test_client.post("/auth/register", headers=centro_admin, json={**cashier, "branch_id": 1})
+    assert response.status_code == 403
+    response = test_client.post("/auth/register", headers=centro_admin, json=cashier)
+    assert response.status_code == 201
+    assert response.json()["branch_id"] == branch_id
+    other_token = test_client.post(
+        "/auth/token",
+        json={"username": "cashier_centro", "password": "cash123"}
+    ).json()["access_token"]
+
+    table_id = test_client.post(
+        "/tables/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"capacity": 4}
+    ).json()["id"]
+
+    response = test_client.get(
+        "/tables/",
+        headers={"Authorization": f"Bearer {other_token}"}
+    )
+    assert response.json() == []
+    response = test_client.get(
+        f"/tables/{table_id}",
+        headers={"Authorization": f"Bearer {other_token}"}
+    )
+    assert response.status_code == 404
+    response = test_client.post(
+        "/orders/",
+        headers={"Authorization": f"Bearer {other_token}"},
+        json={"table_id": table_id, "items": []}
+    )
+    assert response.status_code == 404
+
+def test_register_unknown_branch(test_client, admin_token):
+    response = test_client.post(
+        "/auth/register",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "username": "nobranch",
+            "password": "test123",
+            "role": "cashier",
+            "branch_id": 999
+        }
+    )
+    assert response.status_code == 400
+
+def test_product_search(test_client, admin_token, cashier_token):
+    for name, category, description in [
+        ("Café con leche", "Bebidas Calientes", "Espresso con leche vaporizada"),
+        ("Cafecito", "Bebidas Calientes", None),
+        ("Tostado de jamón y queso", "Sandwiches", "Pan de molde"),
+        ("Licuado", "Bebidas Frías", "Con leche o agua"),
+    ]:
+        test_client.post(
+            "/products/",
+            headers={"Authorization": f"Bearer {admin_token}"},
+            json={"name": name, "price": 3.0, "category": category, "description": description}
+        )
+
+    def search(q):
+        response = test_client.get(
+            "/products/search", params={"q": q},
+            headers={"Authorization": f"Bearer {cashier_token}"}
+        )
+        assert response.status_code == 200
+        return [product["name"] for product in response.json()]
+
+    # Sin acentos, por prefijo y con el nombre antes que la descripción
+    assert search("cafe") == ["Cafecito", "Café con leche"]
+    assert search("leche") == ["Café con leche", "Licuado"]
+    assert search("caf lec") == ["Café con leche"]
+    assert search("sandw") == ["Tostado de jamón y queso"]
+    assert search("pizza") == []
+
+    # El índice se invalida con las escrituras de productos
+    product_id = test_client.post(
+        "/products/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"name": "Pizza muzzarella", "price": 9.0, "category": "Pizzas"}
+    ).json()["id"]
+    assert search("pizza") == ["Pizza muzzarella"]
+    test_client.delete(f"/products/{product_id}", headers={"Authorization": f"Bearer {admin_token}"})
+    assert search("pizza") == []
+
+def test_import_products_csv(test_client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    test_client.post(
+        "/products/",
+        headers=headers,
+        json={"name": "Café", "price": 2.0, "category": "Bebidas", "stock": 7}
+    )
+    content = (
+        "name,category,price,description,stock\n"
+        "Café,Bebidas,2.80,,\n"                   # Actualiza precio, conserva stock
+        "Medialuna,Panadería,1.20,De manteca,50\n"
+        "Sin precio,Panadería,,,\n"
+        "Tostado,Sandwiches,-3,,\n"
+        "Medialuna,Panadería,1.30,De manteca,60\n"  # Reemplaza la línea 3
+    )
+    response = test_client.post(
+        "/products/import",
+        headers=headers,
+        files={"file": ("menu.csv", content.encode(), "text/csv")}
+    )
+    assert response.status_code == 200
+    summary = response.json()
+    assert summary["inserted"] == 1
+    assert summary["updated"] == 1
+    assert summary["rejected"] == 3
+    assert sorted(error["line"] for error in summary["errors"]) == [3, 4, 5]
+
+    products = {
+        product["name"]: product
+        for product in test_client.get("/products/", headers=headers).json()
+    }
+    assert float(products["Café"]["price"]) == 2.8
+    assert products["Café"]["stock"] == 7
+    assert float(products["Medialuna"]["price"]) == 1.3
+    assert products["Medialuna"]["stock"] == 60
+
+    # Reimportar actualiza los mismos productos
+    response = test_client.post(
+        "/products/import",
+        headers=headers,
+        files={"file": ("menu.csv", content.encode(), "text/csv")}
+    )
+    assert (response.json()["inserted"], response.json()["updated"]) == (0, 2)
+    assert len(test_client.get("/products/", headers=headers).json()) == 2
+
+    response = test_client.post(
+        "/products/",
+        headers=headers,
+        json={"name": "Medialuna", "price": 1.0, "category": "Panadería"}
+    )
+    assert response.status_code == 409
+
+    response = test_client.post(
+        "/products/import",
+        headers=headers,
+        files={"file": ("menu.csv", b"nombre,precio\n", "text/csv")}
+    )
+    assert response.status_code == 400
+
+def test_bulk_stock_count(test_client, admin_token, cook_token, cashier_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    ids = [
+        test_client.post(
+            "/products/",
+            headers=headers,
+            json={"name": name, "price": 2.0, "category": "Bebidas", "stock": 10}
+        ).json()["id"]
+        for name in ("Café", "Té", "Jugo")
+    ]
+    payload = {
+        "reason": "Cierre del día",
+        "items": [
+            {"product_id": ids[0], "stock": 4},
+            {"product_id": ids[1], "delta": -3},
+            {"product_id": ids[2], "delta": -11},
+            {"product_id": 999, "stock": 1},
+            {"product_id": ids[0], "stock": 5},
+        ]
+    }
+    response = test_client.patch(
+        "/products/stock", headers={"Authorization": f"Bearer {cook_token}"}, json=payload
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == [
+        "updated", "updated", "invalid", "not_found", "duplicate"
+    ]
+    assert results[1]["previous_stock"] == 10 and results[1]["stock"] == 7
+
+    stock = {
+        product["id"]: product["stock"]
+        for product in test_client.get("/products/", headers=headers).json()
+    }
+    assert [stock[product_id] for product_id in ids] == [4, 7, 10]
+
+    response = test_client.patch(
+        "/products/stock",
+        headers=headers,
+        json={"items": [{"product_id": ids[0], "stock": 1, "delta": 1}]}
+    )
+    assert response.status_code == 422
+    response = test_client.patch(
+        "/products/stock", headers={"Authorization": f"Bearer {cashier_token}"}, json=payload
+    )
+    assert response.status_code == 403
+
+def test_unit_of_work(test_client, cashier_token):
+    from app.database import get_db, unit_of_work
+    from app.main import app
+    from app.models import Table
+    from .conftest import TestingSessionLocal, override_get_db
+
+    opened = []
+
+    def counting_factory():
+        opened.append(1)
+        return TestingSessionLocal()
+
+    async def counting_get_db():
+        with unit_of_work(counting_factory) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = counting_get_db
+    try:
+        headers = {"Authorization": f"Bearer {cashier_token}"}
+        # Rechazado por permisos: no llega a crear la sesión
+        response = test_client.patch("/products/stock", headers=headers, json={"items": [{"product_id": 1, "stock": 1}]})
+        assert response.status_code == 403
+        assert opened == []
+
+        response = test_client.post("/tables/", headers=headers, json={"capacity": 4})
+        assert response.status_code == 201
+        assert response.json()["id"] and opened == [1]
+    finally:
+        app.dependency_overrides[get_db] = override_get_db
+
+    # Si el handler falla no se confirma nada
+    with pytest.raises(RuntimeError):
+        with unit_of_work(TestingSessionLocal) as db:
+            db.add(Table(capacity=2))
+            raise RuntimeError("falla del handler")
+    with TestingSessionLocal() as session:
+        assert session.query(Table).count() == 1
+
+def test_commit_callbacks_run_on_event_loop(test_client, admin_token, monkeypatch):
+    import asyncio
+    from app import cache
+
+    # El commit de get_db corre en el loop: el estado en memoria no se toca
+    # desde los hilos del threadpool
+    on_loop = []
+    invalidate_local = cache._invalidate_local
+
+    def recording(entities):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        invalidate_local(entities)
+
+    monkeypatch.setattr(cache, "_invalidate_local", recording)
+    response = test_client.post("/tables/", headers={"Authorization": f"Bearer {admin_token}"}, json={"capacity": 4})
+    assert response.status_code == 201
+    assert on_loop == [True]
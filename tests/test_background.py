@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime, timedelta
+from .conftest import TestingSessionLocal
+from app.background import JobRunner, flush_last_login
+from app.models import User, UserRole
+
+def create_user(username):
+    with TestingSessionLocal() as db:
+        user = User(username=username, password_hash="x", role=UserRole.CASHIER)
+        db.add(user)
+        db.commit()
+        return user.id
+
+def test_batched_last_login_is_coalesced_and_drained():
+    user_id = create_user("runner1")
+    first = datetime.utcnow()
+    latest = first + timedelta(minutes=5)
+    runner = JobRunner(session_factory=TestingSessionLocal, flush_interval=0.01)
+    runner.register_batch("last_login", flush_last_login)
+
+    async def scenario():
+        await runner.start()
+        runner.submit_batched("last_login", user_id, first)
+        runner.submit_batched("last_login", user_id, latest)
+        await runner.stop()
+
+    asyncio.run(scenario())
+
+    metrics = runner.metrics()
+    assert metrics["coalesced"] == 1
+    assert metrics["completed"] == 1
+    assert metrics["running"] is False
+    with TestingSessionLocal() as db:
+        assert db.get(User, user_id).last_login == latest
+
+def test_jobs_run_in_order_and_full_queue_drops():
+    create_user("runner2")
+    runner = JobRunner(session_factory=TestingSessionLocal, maxsize=2, flush_interval=0.01)
+    seen = []
+
+    def failing_job(db):
+        raise RuntimeError("boom")
+
+    async def scenario():
+        await runner.start()
+        assert runner.submit(lambda db: seen.append(1))
+        assert runner.submit(failing_job)
+        assert not runner.submit(lambda db: seen.append(3))
+        await runner.stop()
+
+    asyncio.run(scenario())
+
+    metrics = runner.metrics()
+    assert seen == [1]
+    assert metrics["completed"] == 1
+    assert metrics["failed"] == 1
+    assert metrics["dropped"] == 1
+
+def test_worker_survives_failed_transaction():
+    user_id = create_user("runner3")
+    attempts = []
+
+    def flaky_factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("sin conexión")
+        return TestingSessionLocal()
+
+    at = datetime.utcnow()
+    runner = JobRunner(session_factory=flaky_factory, flush_interval=0.01)
+    runner.register_batch("last_login", flush_last_login)
+
+    async def scenario():
+        assert not runner.submit(lambda db: None)  # Todavía no arrancó
+        await runner.start()
+        runner.submit_batched("last_login", user_id, at)
+        await asyncio.sleep(0.1)
+        assert runner.running
+        await runner.stop()
+
+    asyncio.run(scenario())
+
+    metrics = runner.metrics()
+    assert metrics["retried"] == 1
+    assert metrics["completed"] == 1
+    with TestingSessionLocal() as db:
+        assert db.get(User, user_id).last_login == at
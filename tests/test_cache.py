@@ -0,0 +1,28 @@
+from app.cache import LocalCache, bus, invalidate
+
+def test_remote_invalidation_clears_dependent_caches():
+    floor = LocalCache("test_floor", depends_on=["tables"])
+    catalog = LocalCache("test_catalog", depends_on=["products"])
+    floor.get_or_load(1, lambda: "floor")
+    catalog.get_or_load(1, lambda: "catalog")
+
+    received = []
+    bus.subscribe(received.append)
+    try:
+        # Los mensajes propios ya se aplicaron al confirmar: se ignoran
+        bus.receive(bus.payload(["tables"]))
+        assert floor.get(1) == "floor"
+
+        remote = bus.payload(["tables"]).replace(bus.origin, "otro-worker")
+        bus.receive(remote)
+        assert floor.get(1) is None
+        assert catalog.get(1) == "catalog"
+        assert received == [{"tables"}]
+    finally:
+        bus.subscribers.remove(received.append)
+
+def test_invalidate_without_listener_is_local():
+    catalog = LocalCache("test_catalog_local", depends_on=["products"])
+    catalog.get_or_load(1, lambda: "catalog")
+    invalidate("products")
+    assert catalog.get(1) is None
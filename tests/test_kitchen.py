@@ -1,6 +1,8 @@
 import pytest
 from datetime import datetime, timedelta
 from .conftest import test_client, admin_token, cook_token
+from app.kitchen.estimates import PrepTimeEstimator, prep_times
+from app.kitchen.metrics import WINDOW_SECONDS, QuantileSketch, SlidingWindow
 
 def create_test_order(test_client, admin_token):
     """Helper function para crear una orden de prueba"""
@@ -12,12 +14,12 @@ def create_test_order(test_client, admin_token):
     )
     table_id = table_response.json()["id"]
 
-    # Crear producto
+    # Crear producto (nombre + categoría es único en la sucursal)
     product_response = test_client.post(
         "/products/",
         headers={"Authorization": f"Bearer {admin_token}"},
         json={
-            "name": "Test Kitchen Coffee",
+            "name": f"Test Kitchen Coffee {table_id}",
             "price": 2.50,
             "category": "Bebidas Calientes",
             "description": "Test description",
@@ -190,3 +192,255 @@ def test_unauthorized_access(test_client, admin_token):
         headers={"Authorization": f"Bearer {admin_token}"}
     )
     assert response.status_code == 403
+
+def test_queue_prioritizes_quick_and_vip_orders(test_client, admin_token, cook_token):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    cook = {"Authorization": f"Bearer {cook_token}"}
+    # La cola se carga vacía y después se actualiza con cada orden
+    assert test_client.get("/kitchen/orders/queue", headers=cook).json() == []
+
+    product_id = test_client.post(
+        "/products/",
+        headers=admin,
+        json={"name": "Espresso", "price": 1.50, "category": "Bebidas Calientes", "stock": 100}
+    ).json()["id"]
+
+    def place(quantity, is_vip=False):
+        table_id = test_client.post(
+            "/tables/", headers=admin, json={"capacity": 4, "is_vip": is_vip}
+        ).json()["id"]
+        return test_client.post(
+            "/orders/",
+            headers=admin,
+            json={"table_id": table_id, "items": [{"product_id": product_id, "quantity": quantity}]}
+        ).json()["id"]
+
+    big = place(10)
+    quick = place(1)
+    vip = place(1, is_vip=True)
+
+    queue = test_client.get("/kitchen/orders/queue", headers=cook).json()
+    assert [order["id"] for order in queue] == [vip, quick, big]
+    assert test_client.get("/kitchen/orders/next", headers=cook).json()["id"] == vip
+
+    test_client.post(f"/kitchen/orders/{vip}/start", headers=cook)
+    assert test_client.get("/kitchen/orders/next", headers=cook).json()["id"] == quick
+    queue = test_client.get("/kitchen/orders/queue", headers=cook).json()
+    assert [order["id"] for order in queue] == [vip, quick, big]
+    assert queue[0]["status"] == "in_preparation"
+
+def test_prep_time_ewma():
+    estimator = PrepTimeEstimator(alpha=0.5, default=60)
+    estimator.observe([(1, "Cafés", 2)], 100)
+    assert estimator.unit_seconds(1, "Cafés") == 50
+    estimator.observe([(1, "Cafés", 1)], 150)
+    assert estimator.unit_seconds(1, "Cafés") == 100
+    # Producto sin historial: promedio de su categoría, o el valor por defecto
+    assert estimator.unit_seconds(2, "Cafés") == 100
+    assert estimator.estimate([(2, "Tortas", 3)]) == 180
+
+def test_scheduler_scores_and_cached_ranking():
+    from calendar import timegm
+    from app.kitchen.scheduler import KitchenScheduler, _BranchQueue
+    from app.models import OrderStatus
+
+    scheduler = KitchenScheduler(estimator=lambda items: 0)
+    created_at = datetime(2026, 1, 1, 12, 0)
+    # created_at es UTC aunque el proceso corra en otra zona
+    assert scheduler.score(created_at, 0, False, False) == timegm(created_at.timetuple())
+
+    queue = scheduler._branches[1] = _BranchQueue()
+    queue.put(1, 20.0, OrderStatus.PENDING)
+    queue.put(2, 10.0, OrderStatus.PENDING)
+    ranked = scheduler.ranked(None, 1)
+    assert ranked == [2, 1]
+    assert scheduler.ranked(None, 1) is ranked  # Sin transiciones no se reordena
+    scheduler.set_status(1, 1, OrderStatus.IN_PREPARATION)
+    assert scheduler.ranked(None, 1) == [1, 2]
+    scheduler.set_status(1, 2, OrderStatus.CANCELLED)
+    assert scheduler.ranked(None, 1) == [1]
+
+def test_order_eta_and_floor(test_client, admin_token, cook_token):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    first = create_test_order(test_client, admin_token)
+    product_id = first["items"][0]["product_id"]
+    table_id = test_client.post("/tables/", headers=admin, json={"capacity": 2}).json()["id"]
+    second = test_client.post(
+        "/orders/",
+        headers=admin,
+        json={"table_id": table_id, "items": [{"product_id": product_id, "quantity": 2}]}
+    ).json()
+
+    # Una unidad por minuto sin historial: 60s la primera, 60s + 120s la segunda
+    response = test_client.get(f"/orders/{second['id']}/eta", headers=admin)
+    assert response.status_code == 200
+    assert response.json()["eta_seconds"] == 180
+    assert response.json()["status"] == "pending"
+
+    floor = {table["id"]: table for table in test_client.get("/tables/floor", headers=admin).json()}
+    assert floor[table_id]["eta_seconds"] == 180
+
+    cook = {"Authorization": f"Bearer {cook_token}"}
+    test_client.post(f"/kitchen/orders/{first['id']}/start", headers=cook)
+    test_client.post(f"/kitchen/orders/{first['id']}/complete", headers=cook)
+    assert product_id in prep_times.per_product
+    assert test_client.get(f"/orders/{first['id']}/eta", headers=admin).json()["eta_seconds"] == 0
+    assert test_client.get(f"/orders/{second['id']}/eta", headers=admin).json()["eta_seconds"] == 120
+
+def test_prep_time_measured_from_start(test_client, admin_token, cook_token, monkeypatch):
+    from app.models import Order
+    from .conftest import TestingSessionLocal
+
+    order = create_test_order(test_client, admin_token)
+    cook = {"Authorization": f"Bearer {cook_token}"}
+    test_client.post(f"/kitchen/orders/{order['id']}/start", headers=cook)
+    with TestingSessionLocal() as db:
+        db.get(Order, order["id"]).started_at = datetime.utcnow() - timedelta(minutes=10)
+        db.commit()
+
+    # Cambiar las notas actualiza updated_at pero no el inicio de la preparación
+    response = test_client.patch(f"/orders/{order['id']}", headers=cook, json={"notes": "Sin azúcar"})
+    assert response.status_code == 200
+
+    observed = []
+    monkeypatch.setattr(prep_times, "observe", lambda items, seconds: observed.append(seconds))
+    test_client.post(f"/kitchen/orders/{order['id']}/complete", headers=cook)
+    assert len(observed) == 1
+    assert observed[0] >= 600
+
+def test_station_routing(test_client, admin_token, cook_token):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    cook = {"Authorization": f"Bearer {cook_token}"}
+    bar = test_client.post(
+        "/kitchen/stations", headers=admin, json={"name": "Barra", "categories": ["Bebidas"]}
+    ).json()
+    grill = test_client.post(
+        "/kitchen/stations", headers=admin,
+        json={"name": "Cocina", "categories": ["Sandwiches"], "is_default": True}
+    ).json()
+    assert bar["categories"] == ["Bebidas"]
+
+    table_id = test_client.post("/tables/", headers=admin, json={"capacity": 4}).json()["id"]
+    products = [
+        test_client.post(
+            "/products/", headers=admin,
+            json={"name": name, "price": 3.0, "category": category, "stock": 10}
+        ).json()["id"]
+        for name, category in (("Café", "Bebidas"), ("Tostado", "Sandwiches"), ("Torta", "Postres"))
+    ]
+    order = test_client.post(
+        "/orders/", headers=admin,
+        json={"table_id": table_id, "items": [{"product_id": product_id, "quantity": 1} for product_id in products]}
+    ).json()
+
+    bar_queue = test_client.get(f"/kitchen/stations/{bar['id']}/queue", headers=cook).json()
+    grill_queue = test_client.get(f"/kitchen/stations/{grill['id']}/queue", headers=cook).json()
+    assert [item["product_id"] for item in bar_queue[0]["items"]] == [products[0]]
+    # Postres no tiene estación: va a la estación por defecto
+    assert [item["product_id"] for item in grill_queue[0]["items"]] == products[1:]
+
+    for ticket in (bar_queue[0], grill_queue[0]):
+        response = test_client.post(f"/kitchen/tickets/{ticket['id']}/start", headers=cook)
+        assert response.status_code == 200
+    assert test_client.get(f"/orders/{order['id']}", headers=admin).json()["status"] == "in_preparation"
+
+    response = test_client.post(f"/kitchen/tickets/{bar_queue[0]['id']}/complete", headers=cook)
+    assert response.json()["status"] == "done"
+    assert test_client.get(f"/kitchen/stations/{bar['id']}/queue", headers=cook).json() == []
+    assert test_client.get(f"/orders/{order['id']}", headers=admin).json()["status"] == "in_preparation"
+
+    test_client.post(f"/kitchen/tickets/{grill_queue[0]['id']}/complete", headers=cook)
+    assert test_client.get(f"/orders/{order['id']}", headers=admin).json()["status"] == "ready"
+    assert test_client.get(f"/kitchen/stations/{grill['id']}/queue", headers=cook).json() == []
+
+def test_concurrent_last_tickets_conflict(test_client, admin_token, cook_token):
+    from sqlalchemy.orm.exc import StaleDataError
+    from app.kitchen.router import _load_ticket
+    from app.kitchen.stations import complete_ticket
+    from app.models import DEFAULT_BRANCH_ID
+    from .conftest import TestingSessionLocal
+
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    cook = {"Authorization": f"Bearer {cook_token}"}
+    bar = test_client.post(
+        "/kitchen/stations", headers=admin, json={"name": "Barra", "categories": ["Bebidas"]}
+    ).json()
+    grill = test_client.post(
+        "/kitchen/stations", headers=admin,
+        json={"name": "Cocina", "categories": ["Sandwiches"], "is_default": True}
+    ).json()
+    table_id = test_client.post("/tables/", headers=admin, json={"capacity": 2}).json()["id"]
+    products = [
+        test_client.post(
+            "/products/", headers=admin,
+            json={"name": name, "price": 3.0, "category": category, "stock": 10}
+        ).json()["id"]
+        for name, category in (("Café", "Bebidas"), ("Tostado", "Sandwiches"))
+    ]
+    order = test_client.post(
+        "/orders/", headers=admin,
+        json={"table_id": table_id, "items": [{"product_id": product_id, "quantity": 1} for product_id in products]}
+    ).json()
+    tickets = [
+        test_client.get(f"/kitchen/stations/{station['id']}/queue", headers=cook).json()[0]["id"]
+        for station in (bar, grill)
+    ]
+    for ticket_id in tickets:
+        test_client.post(f"/kitchen/tickets/{ticket_id}/start", headers=cook)
+
+    # Las dos estaciones leen la orden antes de que la otra confirme
+    with TestingSessionLocal() as first, TestingSessionLocal() as second:
+        bar_ticket, first_order = _load_ticket(first, tickets[0], DEFAULT_BRANCH_ID)
+        grill_ticket, second_order = _load_ticket(second, tickets[1], DEFAULT_BRANCH_ID)
+        complete_ticket(first, bar_ticket, first_order)
+        first.commit()
+        complete_ticket(second, grill_ticket, second_order)
+        with pytest.raises(StaleDataError):
+            second.flush()
+        second.rollback()
+
+    assert test_client.get(f"/orders/{order['id']}", headers=admin).json()["status"] == "in_preparation"
+    # El reintento ve el ticket de la barra cerrado y deja la orden lista
+    response = test_client.post(f"/kitchen/tickets/{tickets[1]}/complete", headers=cook)
+    assert response.status_code == 200
+    assert test_client.get(f"/orders/{order['id']}", headers=admin).json()["status"] == "ready"
+
+def test_sliding_window_metrics():
+    now = [1_000_000.0]
+    window = SlidingWindow(clock=lambda: now[0])
+    for wait in range(1, 101):
+        window.order_in()
+        window.order_started(wait)
+    window.order_out(300)
+
+    snapshot = window.snapshot()
+    assert snapshot["orders_in"] == 100
+    assert snapshot["orders_out"] == 1
+    assert abs(snapshot["wait_p90_seconds"] - 90) <= 90 * 0.02
+    assert abs(snapshot["ready_p90_seconds"] - 300) <= 300 * 0.02
+
+    # Lo que sale de la ventana deja de contar, aunque el slot no se haya reutilizado
+    now[0] += WINDOW_SECONDS
+    snapshot = window.snapshot()
+    assert snapshot["orders_in"] == 0
+    assert snapshot["wait_p90_seconds"] is None
+
+    sketch = QuantileSketch()
+    for value in (0.2, 0.5, 1.0):
+        sketch.add(value)
+    assert sketch.quantile(0.9) == 1.0
+
+def test_live_metrics(test_client, admin_token, cook_token):
+    order = create_test_order(test_client, admin_token)
+    create_test_order(test_client, admin_token)
+    headers = {"Authorization": f"Bearer {cook_token}"}
+    test_client.post(f"/kitchen/orders/{order['id']}/start", headers=headers)
+    test_client.post(f"/kitchen/orders/{order['id']}/complete", headers=headers)
+
+    response = test_client.get("/kitchen/live-metrics?minutes=5", headers=headers)
+    assert response.status_code == 200
+    metrics = response.json()
+    assert metrics["window_minutes"] == 5
+    assert (metrics["orders_in"], metrics["orders_out"], metrics["backlog"]) == (2, 1, 1)
+    assert metrics["orders_in_per_minute"] == 0.4
+    assert metrics["wait_p90_seconds"] is not None
@@ -1,5 +1,16 @@
+import asyncio
+import json
 import pytest
-from .conftest import test_client, admin_token, cook_token, cashier_token
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import event
+from .conftest import TestingSessionLocal, engine, test_client, admin_token, cook_token, cashier_token
+from app.admission import admission
+from app.kitchen.scheduler import kitchen_scheduler
+from app.models import Order, User
+from app.orders.intake import OrderIntake
+from app.orders.reads import ORDER_FIELDS
+from app.orders.schemas import OrderCreate
 
 def test_create_order(test_client, admin_token):
     # Primero crear una mesa
@@ -177,3 +188,500 @@ def test_create_order_invalid_table(test_client, cashier_token):
     )
     assert response.status_code == 404
     assert "Mesa no encontrada" in response.json()["detail"]
+
+def test_export_orders_streaming(test_client, admin_token):
+    table_id = test_client.post(
+        "/tables/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"capacity": 4}
+    ).json()["id"]
+    product_id = test_client.post(
+        "/products/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "name": "Test Export Coffee",
+            "price": 2.50,
+            "category": "Bebidas Calientes",
+            "stock": 100
+        }
+    ).json()["id"]
+    order_id = test_client.post(
+        "/orders/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "table_id": table_id,
+            "items": [{"product_id": product_id, "quantity": 2}]
+        }
+    ).json()["id"]
+
+    today = datetime.utcnow().date().isoformat()
+    response = test_client.get(
+        f"/orders/export?from={today}&to={today}&format=csv",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.strip().splitlines()
+    assert lines[0].startswith("order_id,created_at")
+    assert len(lines) == 2
+    assert "Test Export Coffee" in lines[1]
+
+    response = test_client.get(
+        f"/orders/export?from={today}&to={today}&format=ndjson",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows[0]["order_id"] == order_id
+    assert rows[0]["quantity"] == 2
+    assert rows[0]["status"] == "pending"
+
+    # Rango sin órdenes: solo el encabezado
+    response = test_client.get(
+        "/orders/export?from=2000-01-01&to=2000-01-31&format=csv",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    assert response.text.strip().splitlines() == [lines[0]]
+
+def test_fast_list_matches_order_schema(test_client, admin_token):
+    table_id = test_client.post(
+        "/tables/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"capacity": 4}
+    ).json()["id"]
+    product_id = test_client.post(
+        "/products/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "name": "Test Fast Coffee",
+            "price": 2.50,
+            "category": "Bebidas Calientes",
+            "stock": 100
+        }
+    ).json()["id"]
+    order_id = test_client.post(
+        "/orders/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "table_id": table_id,
+            "items": [{"product_id": product_id, "quantity": 2, "notes": "Sin azúcar"}]
+        }
+    ).json()["id"]
+
+    listed = test_client.get(
+        "/orders/",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    ).json()
+    detail = test_client.get(
+        f"/orders/{order_id}",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    ).json()
+
+    assert listed == [detail]
+
+def test_order_conditional_get(test_client, admin_token, cook_token):
+    table_id = test_client.post(
+        "/tables/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"capacity": 4}
+    ).json()["id"]
+    product_id = test_client.post(
+        "/products/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "name": "Test ETag Coffee",
+            "price": 2.50,
+            "category": "Bebidas Calientes",
+            "stock": 100
+        }
+    ).json()["id"]
+    order_id = test_client.post(
+        "/orders/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "table_id": table_id,
+            "items": [{"product_id": product_id, "quantity": 1}]
+        }
+    ).json()["id"]
+
+    response = test_client.get(
+        f"/orders/{order_id}",
+        headers={"Authorization": f"Bearer {cook_token}"}
+    )
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+
+    response = test_client.get(
+        f"/orders/{order_id}",
+        headers={"Authorization": f"Bearer {cook_token}", "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    response = test_client.get(
+        f"/orders/{order_id}",
+        headers={"Authorization": f"Bearer {cook_token}", "If-Modified-Since": last_modified}
+    )
+    assert response.status_code == 304
+
+    test_client.post(
+        f"/kitchen/orders/{order_id}/start",
+        headers={"Authorization": f"Bearer {cook_token}"}
+    )
+    response = test_client.get(
+        f"/orders/{order_id}",
+        headers={"Authorization": f"Bearer {cook_token}", "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["status"] == "in_preparation"
+
+def test_order_optimistic_concurrency(test_client, admin_token, cook_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    table_id = test_client.post("/tables/", headers=headers, json={"capacity": 2}).json()["id"]
+    product_id = test_client.post(
+        "/products/",
+        headers=headers,
+        json={"name": "Cortado", "price": 2.0, "category": "Bebidas Calientes", "stock": 10}
+    ).json()["id"]
+    order = test_client.post(
+        "/orders/",
+        headers=headers,
+        json={"table_id": table_id, "items": [{"product_id": product_id, "quantity": 1}]}
+    ).json()
+    assert order["version"] == 1
+    etag = test_client.get(f"/orders/{order['id']}", headers=headers).headers["etag"]
+
+    response = test_client.patch(
+        f"/orders/{order['id']}", headers={**headers, "If-Match": etag}, json={"notes": "Sin azúcar"}
+    )
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+
+    # La cocina arranca una orden que ya cambió desde que la leyó
+    response = test_client.post(
+        f"/kitchen/orders/{order['id']}/start",
+        headers={"Authorization": f"Bearer {cook_token}", "If-Match": etag}
+    )
+    assert response.status_code == 409
+    response = test_client.patch(
+        f"/orders/{order['id']}?expected_version=1", headers=headers, json={"status": "cancelled"}
+    )
+    assert response.status_code == 409
+
+    response = test_client.post(
+        f"/kitchen/orders/{order['id']}/start?expected_version=2",
+        headers={"Authorization": f"Bearer {cook_token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["version"] == 3
+
+def test_admission_sheds_order_intake(test_client, admin_token, monkeypatch):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    order = {"table_id": 999, "items": [{"product_id": 1, "quantity": 1}]}
+
+    monkeypatch.setitem(admission.route_limits, ("POST", "/orders"), 0)
+    response = test_client.post("/orders/", headers=headers, json=order)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    monkeypatch.setitem(admission.route_limits, ("POST", "/orders"), 8)
+    monkeypatch.setattr(admission, "user_burst", 1)
+    monkeypatch.setattr(admission, "user_rate", 0.5)
+    assert test_client.post("/orders/", headers=headers, json=order).status_code == 404
+    response = test_client.post("/orders/", headers=headers, json=order)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert admission.in_flight == 0
+
+def test_admission_evicts_idle_buckets():
+    import time
+    from app.admission import AdmissionController
+    route = ("POST", "/orders")
+
+    def admit(controller, ip):
+        route_key, rejection = controller.admit("POST", "/orders", {}, (ip, 1))
+        assert rejection is None
+        controller.release(route_key)
+
+    # Se llenan en 1 ms: al rato ya no hace falta recordarlos
+    controller = AdmissionController(10, 0, {route: 10}, user_rate=1000, user_burst=1)
+    for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+        admit(controller, ip)
+    time.sleep(0.01)
+    admit(controller, "10.0.0.4")
+    assert list(controller.buckets) == ["ip:10.0.0.4"]
+
+    # Sin recarga solo aplica el máximo, descartando el menos usado
+    controller = AdmissionController(10, 0, {route: 10}, user_rate=0, user_burst=5, max_buckets=2)
+    for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.1", "10.0.0.3"):
+        admit(controller, ip)
+    assert list(controller.buckets) == ["ip:10.0.0.1", "ip:10.0.0.3"]
+
+def test_admission_queued_routes_skip_pool_capacity():
+    from app.admission import AdmissionController
+    route = ("POST", "/orders")
+
+    # Con el ingreso por lotes las órdenes esperan en su cola, no en el pool
+    controller = AdmissionController(2, 0, {route: 4}, user_rate=0, user_burst=10, queued_routes=frozenset({route}))
+    admitted = [controller.admit("POST", "/orders", {}, ("10.0.0.1", 1)) for _ in range(5)]
+    assert [rejection is None for _, rejection in admitted] == [True] * 4 + [False]
+    assert controller.in_flight == 0
+    assert controller.admit("GET", "/orders", {}, ("10.0.0.1", 1))[1] is None
+    for route_key, rejection in admitted[:4]:
+        controller.release(route_key)
+    assert (controller.in_flight, controller.route_in_flight[route]) == (1, 0)
+
+def test_admission_reserves_kitchen_capacity(test_client, admin_token, cook_token, monkeypatch):
+    monkeypatch.setattr(admission, "capacity", 1)
+    monkeypatch.setattr(admission, "kitchen_reserved", 1)
+
+    response = test_client.get("/orders/", headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 503
+    response = test_client.get("/kitchen/orders/queue", headers={"Authorization": f"Bearer {cook_token}"})
+    assert response.status_code == 200
+
+def test_order_intake_group_commit(test_client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    table_ids = [
+        test_client.post("/tables/", headers=headers, json={"capacity": 2}).json()["id"]
+        for _ in range(3)
+    ]
+    product_id = test_client.post(
+        "/products/",
+        headers=headers,
+        json={"name": "Lágrima", "price": 2.0, "category": "Bebidas Calientes", "stock": 10}
+    ).json()["id"]
+    with TestingSessionLocal() as db:
+        user_id = db.query(User.id).scalar()
+    # Conocer la cola antes, para comprobar que el lote la actualiza al confirmar
+    with TestingSessionLocal() as db:
+        kitchen_scheduler.ranked(db, 1)
+
+    orders = [
+        OrderCreate(table_id=table_ids[0], items=[{"product_id": product_id, "quantity": 1}]),
+        OrderCreate(table_id=table_ids[1], items=[{"product_id": product_id, "quantity": 99}]),
+        OrderCreate(table_id=table_ids[2], items=[{"product_id": product_id, "quantity": 2}]),
+    ]
+
+    async def run():
+        intake = OrderIntake(session_factory=TestingSessionLocal, window=0.05)
+        await intake.start()
+        results = await asyncio.gather(
+            *(intake.submit(order, user_id, 1) for order in orders), return_exceptions=True
+        )
+        await intake.stop()
+        return intake, results
+
+    intake, results = asyncio.run(run())
+    assert isinstance(results[1], HTTPException) and results[1].status_code == 400
+    assert [result["table_id"] for result in (results[0], results[2])] == [table_ids[0], table_ids[2]]
+    assert intake.metrics()["batches"] == 1
+    assert intake.metrics()["created"] == 2
+
+    with TestingSessionLocal() as db:
+        assert db.query(Order).count() == 2
+        assert kitchen_scheduler.ranked(db, 1) == [results[0]["id"], results[2]["id"]]
+    product = test_client.get(f"/products/{product_id}", headers=headers).json()
+    assert product["stock"] == 7
+
+def test_order_intake_failures_leave_no_phantoms(test_client, admin_token, monkeypatch):
+    from app.orders import intake as intake_module
+    from app.orders.store import open_orders
+
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    table_ids = [
+        test_client.post("/tables/", headers=headers, json={"capacity": 2}).json()["id"]
+        for _ in range(3)
+    ]
+    product_id = test_client.post(
+        "/products/",
+        headers=headers,
+        json={"name": "Cortado", "price": 2.0, "category": "Bebidas Calientes", "stock": 10}
+    ).json()["id"]
+    with TestingSessionLocal() as db:
+        user_id = db.query(User.id).scalar()
+        open_orders.orders(db, 1)
+        kitchen_scheduler.ranked(db, 1)
+
+    def request(table_id):
+        return OrderCreate(table_id=table_id, items=[{"product_id": product_id, "quantity": 1}]), user_id, 1
+
+    # Un error que no es de validación solo afecta a su orden
+    place_order = intake_module.place_order
+
+    def flaky_place_order(db, order, *args):
+        if order.table_id == table_ids[0]:
+            raise RuntimeError("falla inesperada")
+        return place_order(db, order, *args)
+
+    monkeypatch.setattr(intake_module, "place_order", flaky_place_order)
+    intake = OrderIntake(session_factory=TestingSessionLocal)
+    outcomes = intake._run([request(table_ids[0]), request(table_ids[1])])
+    assert outcomes[0].status_code == 500
+    created_id = outcomes[1]["id"]
+    assert (intake.metrics()["failed"], intake.metrics()["created"]) == (1, 1)
+    monkeypatch.setattr(intake_module, "place_order", place_order)
+
+    # Si falla el commit del lote, lo que registraron los savepoints se descarta
+    def failing_session():
+        db = TestingSessionLocal()
+
+        def commit():
+            raise RuntimeError("disk I/O error")
+        db.commit = commit
+        return db
+
+    outcomes = OrderIntake(session_factory=failing_session)._run([request(table_ids[2])])
+    assert outcomes[0].status_code == 500
+    # (pysqlite confirma el savepoint liberado por su cuenta; se revisa solo
+    # el estado en memoria)
+    with TestingSessionLocal() as db:
+        assert [entry.data["id"] for entry in open_orders.orders(db, 1)] == [created_id]
+        assert kitchen_scheduler.ranked(db, 1) == [created_id]
+
+def test_open_orders_served_from_memory(test_client, admin_token, cook_token, cashier_token):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    cook = {"Authorization": f"Bearer {cook_token}"}
+    cashier = {"Authorization": f"Bearer {cashier_token}"}
+    table_id = test_client.post("/tables/", headers=admin, json={"capacity": 2}).json()["id"]
+    product_id = test_client.post(
+        "/products/",
+        headers=admin,
+        json={"name": "Submarino", "price": 3.5, "category": "Bebidas Calientes", "stock": 10}
+    ).json()["id"]
+    order_id = test_client.post(
+        "/orders/",
+        headers=admin,
+        json={"table_id": table_id, "items": [{"product_id": product_id, "quantity": 2}]}
+    ).json()["id"]
+    test_client.get("/tables/floor", headers=cashier)  # Carga las mesas y las órdenes abiertas
+
+    statements = []
+    def count(*args):
+        statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        order = test_client.get(f"/orders/{order_id}", headers=cook).json()
+        queue = test_client.get("/kitchen/orders/queue", headers=cook).json()
+        floor = test_client.get("/tables/floor", headers=cashier).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert statements == []
+    assert order["items"][0]["quantity"] == 2
+    assert [order["id"] for order in queue] == [order_id]
+    assert floor[0]["open_order_ids"] == [order_id]
+    assert floor[0]["item_count"] == 2
+    assert floor[0]["running_total"] == 7.0
+
+    test_client.patch(f"/orders/{order_id}", headers=admin, json={"notes": "Bien caliente"})
+    test_client.post(f"/kitchen/orders/{order_id}/start", headers=cook)
+    order = test_client.get(f"/orders/{order_id}", headers=cook).json()
+    assert (order["status"], order["notes"], order["version"]) == ("in_preparation", "Bien caliente", 3)
+
+    test_client.patch(f"/orders/{order_id}", headers=admin, json={"status": "cancelled"})
+    assert test_client.get("/kitchen/orders/queue", headers=cook).json() == []
+    assert test_client.get("/tables/floor", headers=cashier).json()[0]["open_order_ids"] == []
+    assert test_client.get(f"/orders/{order_id}", headers=cook).json()["status"] == "cancelled"
+
+def test_order_sparse_fields(test_client, admin_token, cook_token):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    cook = {"Authorization": f"Bearer {cook_token}"}
+    table_id = test_client.post("/tables/", headers=admin, json={"capacity": 2}).json()["id"]
+    product_id = test_client.post("/products/", headers=admin, json={
+        "name": "Tostado", "price": 4.0, "category": "Comidas", "stock": 10
+    }).json()["id"]
+    order_id = test_client.post("/orders/", headers=admin, json={
+        "table_id": table_id, "items": [{"product_id": product_id, "quantity": 1}], "notes": "Sin manteca"
+    }).json()["id"]
+
+    statements = []
+    def count(*args):
+        statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        summary = test_client.get("/orders/?view=summary", headers=admin).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    # Sin items no se consulta order_items
+    assert not any("order_items" in statement for statement in statements)
+    assert summary[0]["id"] == order_id
+    assert "items" not in summary[0] and "notes" not in summary[0]
+
+    orders = test_client.get("/orders/?fields=status,items&view=summary", headers=admin).json()
+    assert set(orders[0]) == {"id", "status", "items"}
+    assert orders[0]["items"][0]["product_id"] == product_id
+    assert set(test_client.get("/orders/", headers=admin).json()[0]) >= {"payment_status", "items", "notes"}
+
+    queue = test_client.get("/kitchen/orders/queue?view=summary", headers=cook).json()
+    assert queue[0]["notes"] == "Sin manteca" and len(queue[0]["items"]) == 1
+    assert "payment_status" not in queue[0] and "total_amount" not in queue[0]
+    queue = test_client.get("/kitchen/orders/queue?fields=table_id", headers=cook).json()
+    assert queue == [{"id": order_id, "table_id": table_id}]
+
+    response = test_client.get("/orders/?fields=status,password", headers=admin)
+    assert response.status_code == 400
+
+    # El contrato de OpenAPI refleja que los listados pueden venir recortados
+    openapi = test_client.get("/openapi.json").json()
+    partial = openapi["components"]["schemas"]["PartialOrder"]
+    assert partial["required"] == ["id"]
+    assert tuple(partial["properties"]) == ORDER_FIELDS
+    for path in ("/orders/", "/kitchen/orders/queue"):
+        schema = openapi["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert schema["items"]["$ref"] == "#/components/schemas/PartialOrder"
+    assert openapi["components"]["schemas"]["OrderSearchResult"]["properties"]["orders"]["items"]["$ref"] == (
+        "#/components/schemas/PartialOrder"
+    )
+
+def test_search_orders(test_client, admin_token, cashier_token, cook_token):
+    from datetime import timedelta
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    cashier = {"Authorization": f"Bearer {cashier_token}"}
+    table_ids = [
+        test_client.post("/tables/", headers=admin, json={"capacity": 2}).json()["id"]
+        for _ in range(3)
+    ]
+    product_id = test_client.post("/products/", headers=admin, json={
+        "name": "Brunch", "price": 30.0, "category": "Comidas", "stock": 20
+    }).json()["id"]
+
+    def place(headers, table_id, quantity):
+        response = test_client.post("/orders/", headers=headers, json={
+            "table_id": table_id, "items": [{"product_id": product_id, "quantity": quantity}]
+        })
+        assert response.status_code == 201
+        return response.json()
+
+    big = place(cashier, table_ids[0], 2)
+    assert big["total_amount"] == 60.0
+    small = place(cashier, table_ids[1], 1)
+    old = place(admin, table_ids[2], 3)
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    with TestingSessionLocal() as db:
+        db.get(Order, old["id"]).created_at = yesterday
+        db.commit()
+
+    cashier_id = test_client.get("/auth/me", headers=cashier).json()["id"]
+    response = test_client.get(
+        f"/orders/search?user_id={cashier_id}&min_amount=50&view=summary", headers=admin
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["total"], result["total_is_estimate"]) == (1, False)
+    assert result["orders"][0]["id"] == big["id"] and "items" not in result["orders"][0]
+
+    day = yesterday.date().isoformat()
+    result = test_client.get(f"/orders/search?from={day}&to={day}", headers=cashier).json()
+    assert [order["id"] for order in result["orders"]] == [old["id"]]
+    assert result["orders"][0]["items"][0]["quantity"] == 3
+
+    # Las más recientes primero
+    result = test_client.get("/orders/search?status=pending&limit=2", headers=admin).json()
+    assert result["total"] == 3
+    assert [order["id"] for order in result["orders"]] == [small["id"], big["id"]]
+
+    result = test_client.get(f"/orders/search?table_id={table_ids[1]}&max_amount=10", headers=admin).json()
+    assert (result["total"], result["orders"]) == (0, [])
+
+    assert test_client.get("/orders/search?min_amount=20&max_amount=10", headers=admin).status_code == 400
+    assert test_client.get(f"/orders/search?from={day}&to=2000-01-01", headers=admin).status_code == 400
+    assert test_client.get("/orders/search", headers={"Authorization": f"Bearer {cook_token}"}).status_code == 403
@@ -0,0 +1,136 @@
+from datetime import datetime
+from sqlalchemy import update
+from .conftest import test_client, admin_token, TestingSessionLocal
+from app.models import Order, OrderItem, PaymentStatus
+from app.partitions import archive_closed_orders, month_start
+from app.reports import rollups
+
+def create_delivered_order(test_client, admin_token, quantity=2, name="Test Report Coffee"):
+    """Helper: crea una orden con un producto y la marca como entregada"""
+    table_id = test_client.post(
+        "/tables/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"capacity": 4}
+    ).json()["id"]
+    product_id = test_client.post(
+        "/products/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "name": name,
+            "price": 2.50,
+            "category": "Bebidas Calientes",
+            "stock": 100
+        }
+    ).json()["id"]
+    order = test_client.post(
+        "/orders/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "table_id": table_id,
+            "items": [{"product_id": product_id, "quantity": quantity}]
+        }
+    ).json()
+    response = test_client.patch(
+        f"/orders/{order['id']}",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"status": "delivered"}
+    )
+    assert response.status_code == 200
+    return order
+
+def get_sales(test_client, admin_token, group_by):
+    today = datetime.utcnow().date().isoformat()
+    response = test_client.get(
+        f"/reports/sales?from={today}&to={today}&group_by={group_by}",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    return response.json()
+
+def test_sales_rollup_on_delivery(test_client, admin_token):
+    create_delivered_order(test_client, admin_token, quantity=2)
+
+    by_category = get_sales(test_client, admin_token, "category")
+    assert len(by_category) == 1
+    assert by_category[0]["key"] == "Bebidas Calientes"
+    assert by_category[0]["quantity"] == 2
+    assert float(by_category[0]["revenue"]) == 5.0
+    assert by_category[0]["order_count"] == 1
+
+    by_product = get_sales(test_client, admin_token, "product")
+    assert by_product[0]["label"] == "Test Report Coffee"
+    assert float(by_product[0]["revenue"]) == 5.0
+
+def test_sales_rollup_reverted_on_cancel(test_client, admin_token):
+    order = create_delivered_order(test_client, admin_token)
+
+    test_client.patch(
+        f"/orders/{order['id']}",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"status": "cancelled"}
+    )
+
+    by_day = get_sales(test_client, admin_token, "day")
+    assert by_day[0]["quantity"] == 0
+    assert by_day[0]["order_count"] == 0
+
+def test_rebuild_matches_incremental(test_client, admin_token):
+    create_delivered_order(test_client, admin_token, quantity=3)
+    incremental = get_sales(test_client, admin_token, "hour")
+
+    with TestingSessionLocal() as db:
+        result = rollups.rebuild(db)
+        db.commit()
+    assert result == {"hourly_rows": 1, "daily_rows": 1}
+
+    assert get_sales(test_client, admin_token, "hour") == incremental
+
+def test_archive_moves_old_closed_orders(test_client, admin_token):
+    delivered = create_delivered_order(test_client, admin_token)
+    unpaid = create_delivered_order(test_client, admin_token, name="Test Report Tea")
+    open_order = test_client.post(
+        "/orders/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "table_id": test_client.post(
+                "/tables/",
+                headers={"Authorization": f"Bearer {admin_token}"},
+                json={"capacity": 2}
+            ).json()["id"],
+            "items": [{"product_id": delivered["items"][0]["product_id"], "quantity": 1}]
+        }
+    ).json()
+
+    old = datetime(2024, 3, 15, 12, 0)
+    with TestingSessionLocal() as db:
+        db.execute(update(Order).values(created_at=old))
+        db.execute(update(OrderItem).values(created_at=old))
+        db.execute(update(Order).where(Order.id == delivered["id"]).values(payment_status=PaymentStatus.COMPLETED))
+        archived = archive_closed_orders(db, month_start(datetime.utcnow()))
+        db.commit()
+    # La entregada sin pagar sigue abierta
+    assert archived == [f"orders:{delivered['id']}"]
+
+    live = test_client.get("/orders/", headers={"Authorization": f"Bearer {admin_token}"}).json()
+    assert [order["id"] for order in live] == [unpaid["id"], open_order["id"]]
+
+    response = test_client.get(
+        "/reports/archive/orders?from=2024-03-01&to=2024-03-31",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    orders = response.json()
+    assert [order["id"] for order in orders] == [delivered["id"]]
+    assert orders[0]["status"] == "delivered"
+    assert orders[0]["items"][0]["quantity"] == 2
+
+    # Reconstruir los agregados no pierde los meses archivados
+    with TestingSessionLocal() as db:
+        rollups.rebuild(db)
+        db.commit()
+    response = test_client.get(
+        "/reports/sales?from=2024-03-01&to=2024-03-31&group_by=day",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    assert [(row["quantity"], row["order_count"]) for row in response.json()] == [(4, 2)]
@@ -0,0 +1,172 @@
+from .conftest import test_client, admin_token, cashier_token
+
+def create_table_and_product(test_client, admin_token):
+    table_id = test_client.post(
+        "/tables/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"capacity": 4}
+    ).json()["id"]
+    product_id = test_client.post(
+        "/products/",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "name": "Test Sync Coffee",
+            "price": 2.50,
+            "category": "Bebidas Calientes",
+            "stock": 100
+        }
+    ).json()["id"]
+    return table_id, product_id
+
+def test_delta_sync_with_tombstones(test_client, admin_token, cashier_token):
+    table_id, product_id = create_table_and_product(test_client, admin_token)
+
+    response = test_client.get(
+        "/sync",
+        headers={"Authorization": f"Bearer {cashier_token}"}
+    )
+    assert response.status_code == 200
+    full = response.json()
+    assert full["full"] is True
+    assert [t["id"] for t in full["tables"]] == [table_id]
+    assert [p["id"] for p in full["products"]] == [product_id]
+
+    test_client.delete(
+        f"/products/{product_id}",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+
+    delta = test_client.get(
+        f"/sync?since={full['token']}",
+        headers={"Authorization": f"Bearer {cashier_token}"}
+    ).json()
+    assert delta["full"] is False
+    assert delta["products"] == []
+    assert delta["deleted"]["products"] == [product_id]
+
+    response = test_client.get(
+        "/sync?since=not-a-token",
+        headers={"Authorization": f"Bearer {cashier_token}"}
+    )
+    assert response.status_code == 400
+
+def test_sync_offline_orders(test_client, admin_token, cashier_token):
+    table_id, product_id = create_table_and_product(test_client, admin_token)
+    batch = {
+        "orders": [
+            {
+                "client_ref": "pos1-0001",
+                "table_id": table_id,
+                "items": [{"product_id": product_id, "quantity": 1}]
+            },
+            {
+                "client_ref": "pos2-0001",
+                "table_id": table_id,
+                "items": [{"product_id": product_id, "quantity": 1}]
+            }
+        ]
+    }
+
+    response = test_client.post(
+        "/sync/orders",
+        headers={"Authorization": f"Bearer {cashier_token}"},
+        json=batch
+    )
+    assert response.status_code == 200
+    created, conflict = response.json()["results"]
+    assert created["status"] == "created"
+    assert conflict["status"] == "conflict"
+    assert conflict["detail"] == "Mesa no disponible"
+
+    # Reintentar el mismo lote no duplica órdenes
+    retry = test_client.post(
+        "/sync/orders",
+        headers={"Authorization": f"Bearer {cashier_token}"},
+        json={"orders": batch["orders"][:1]}
+    ).json()["results"][0]
+    assert retry["status"] == "duplicate"
+    assert retry["order_id"] == created["order_id"]
+
+    orders = test_client.get(
+        "/orders/",
+        headers={"Authorization": f"Bearer {cashier_token}"}
+    ).json()
+    assert [o["id"] for o in orders] == [created["order_id"]]
+    assert orders[0]["items"][0]["quantity"] == 1
+
+def test_sync_concurrent_duplicate(test_client, admin_token, cashier_token, monkeypatch):
+    from app.models import Order, OrderClientRef
+    from app.sync import router as sync_router
+    from .conftest import TestingSessionLocal
+
+    table_id, product_id = create_table_and_product(test_client, admin_token)
+    other_table = test_client.post(
+        "/tables/", headers={"Authorization": f"Bearer {admin_token}"}, json={"capacity": 2}
+    ).json()["id"]
+    place_order = sync_router.place_order
+    concurrent = {}
+
+    def place_after_concurrent_sync(db, order, user_id, branch_id, **extra):
+        # Otra sincronización confirma el mismo client_ref entre la consulta
+        # inicial y la inserción. Sin client_ref en orders, como en PostgreSQL
+        # donde su restricción única incluye created_at: solo la tabla de
+        # client_refs lo detecta
+        if order.client_ref == "pos1-0002" and not concurrent:
+            with TestingSessionLocal() as other:
+                existing = Order(table_id=other_table, user_id=user_id, branch_id=branch_id)
+                other.add(existing)
+                other.flush()
+                other.add(OrderClientRef(branch_id=branch_id, client_ref="pos1-0002", order_id=existing.id))
+                other.commit()
+                concurrent["id"] = existing.id
+        return place_order(db, order, user_id, branch_id, **extra)
+
+    monkeypatch.setattr(sync_router, "place_order", place_after_concurrent_sync)
+    response = test_client.post(
+        "/sync/orders",
+        headers={"Authorization": f"Bearer {cashier_token}"},
+        json={"orders": [
+            {"client_ref": "pos1-0002", "table_id": table_id, "items": [{"product_id": product_id, "quantity": 1}]},
+            {"client_ref": "pos1-0003", "table_id": table_id, "items": [{"product_id": product_id, "quantity": 1}]},
+        ]}
+    )
+    assert response.status_code == 200
+    duplicate, created = response.json()["results"]
+    assert duplicate == {
+        "client_ref": "pos1-0002", "status": "duplicate", "order_id": concurrent["id"], "detail": None
+    }
+    assert created["status"] == "created"
+
+def test_sync_failure_leaves_no_phantom_orders(test_client, admin_token, cashier_token, monkeypatch):
+    import pytest
+    from app.kitchen.scheduler import kitchen_scheduler
+    from app.orders.store import open_orders
+    from app.sync import router as sync_router
+    from .conftest import TestingSessionLocal
+
+    table_id, product_id = create_table_and_product(test_client, admin_token)
+    with TestingSessionLocal() as db:
+        open_orders.orders(db, 1)
+        kitchen_scheduler.ranked(db, 1)
+    place_order = sync_router.place_order
+
+    def failing_place_order(db, order, *args, **extra):
+        if order.client_ref == "pos1-0005":
+            raise RuntimeError("falla inesperada")
+        return place_order(db, order, *args, **extra)
+
+    # La primera orden ya liberó su savepoint, pero el request no se confirma:
+    # sus callbacks no deben llegar al store ni a la cola de cocina
+    monkeypatch.setattr(sync_router, "place_order", failing_place_order)
+    with pytest.raises(RuntimeError):
+        test_client.post(
+            "/sync/orders",
+            headers={"Authorization": f"Bearer {cashier_token}"},
+            json={"orders": [
+                {"client_ref": "pos1-0004", "table_id": table_id, "items": [{"product_id": product_id, "quantity": 1}]},
+                {"client_ref": "pos1-0005", "table_id": table_id, "items": [{"product_id": product_id, "quantity": 1}]},
+            ]}
+        )
+    with TestingSessionLocal() as db:
+        assert open_orders.orders(db, 1) == []
+        assert kitchen_scheduler.ranked(db, 1) == []